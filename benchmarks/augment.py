@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the vectorized image augmentation against a naive per-image loop.
+
+Usage: python augment.py [number of images, default 10000] [batch size, default 128]
+"""
+from __future__ import absolute_import, print_function
+
+import sys
+import time
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import (ImageAugmentation, RandomCrop, RandomFlip, IntensityJitter, Cutout,
+                                         TrainingBatchDataFlow)
+
+NUM_IMAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+BATCH_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+PADDING, CUTOUT = 4, 8
+
+
+def naive_augment(images):
+    """Augment the images one by one, which is what a straightforward implementation would do."""
+    n, h, w, c = images.shape
+    ret = np.empty_like(images)
+    for i in range(n):
+        img = np.pad(images[i], ((PADDING, PADDING), (PADDING, PADDING), (0, 0)), mode='constant')
+        y, x = np.random.randint(0, 2 * PADDING + 1, size=2)
+        img = img[y: y + h, x: x + w]
+        if np.random.rand() < 0.5:
+            img = img[:, ::-1]
+        mean = np.mean(img)
+        img = (img - mean) * np.random.uniform(0.9, 1.1) + mean + np.random.uniform(-0.1, 0.1)
+        cy, cx = np.random.randint(0, h), np.random.randint(0, w)
+        img[max(cy - CUTOUT // 2, 0): cy + CUTOUT - CUTOUT // 2, max(cx - CUTOUT // 2, 0): cx + CUTOUT - CUTOUT // 2] = 0
+        ret[i] = img
+    return ret
+
+
+for name, shape in (('MNIST-like', (28, 28, 1)), ('CIFAR-like', (32, 32, 3))):
+    X = np.random.random((NUM_IMAGES,) + shape).astype(np.float32)
+    y = np.random.randint(0, 10, size=NUM_IMAGES).astype(np.int32)
+    flow = TrainingBatchDataFlow([X, y], BATCH_SIZE)
+    aug = ImageAugmentation([RandomCrop(shape[0], shape[1], padding=PADDING), RandomFlip(),
+                             IntensityJitter(), Cutout(CUTOUT)])
+    print('%s images %r, batch size %d:' % (name, shape, BATCH_SIZE))
+
+    start_time = time.time()
+    for bX, by in flow.iter_epoch():
+        pass
+    base_time = time.time() - start_time
+
+    for label, make_flow in (('naive loop', lambda: flow.batch_map(lambda a, b: (naive_augment(a), b))),
+                             ('vectorized', lambda: aug.apply_to(flow)),
+                             ('vectorized, 2 workers', lambda: aug.apply_to(flow, workers=2))):
+        f = make_flow()
+        start_time = time.time()
+        for bX, by in f.iter_epoch():
+            pass
+        elapsed = time.time() - start_time
+        if hasattr(f, 'close'):
+            f.close()
+        print('  %-22s: %10.1f images/sec (%.3f secs augmenting)' %
+              (label, NUM_IMAGES / elapsed, max(elapsed - base_time, 0.)))
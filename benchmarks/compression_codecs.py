@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the throughput and the compression ratio of the codecs for saving objects.
+
+The parameters are read from a checkpoint values file or a model file if specified, otherwise an MLP is trained
+for a few hundred steps on random data to produce them.  The parameters are then saved and loaded with each codec,
+and the throughputs (in MB/s of uncompressed data) and the compression ratios are reported.
+
+Usage: python compression_codecs.py [path of the parameters file]
+"""
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from ipwxlearn import glue, models, training
+from ipwxlearn.glue import G
+from ipwxlearn.training.trainers import LossTrainer
+from ipwxlearn.utils.arrayfile import ArrayFile, is_array_file
+from ipwxlearn.utils.io import load_object_compressed, save_object_compressed, ZlibCodec
+from ipwxlearn.utils.tempdir import TemporaryDirectory
+
+CODECS = ['none', 'gzip:1', 'gzip:6', 'gzip:9', 'lzma:1', 'lzma:6', ZlibCodec(1, threads=1), ZlibCodec(6, threads=1),
+          'zlib:1', 'zlib:6']
+DIM, TARGET_NUM, BATCH_SIZE = 784, 10, 64
+
+
+def train_params():
+    X = np.random.normal(size=[10000, DIM]).astype(glue.config.floatX)
+    y = np.random.randint(0, TARGET_NUM, size=len(X)).astype(np.int32)
+
+    graph = G.Graph()
+    with graph.as_default():
+        input_var = G.make_placeholder('inputs', shape=(None, DIM), dtype=glue.config.floatX)
+        label_var = G.make_placeholder('labels', shape=(None,), dtype=np.int32)
+        input_layer = G.layers.InputLayer(input_var, shape=(None, DIM))
+        mlp = models.MLP('mlp', input_layer, layer_units=[1024, 1024, 1024])
+        lr = models.LogisticRegression('logistic', mlp, target_num=TARGET_NUM)
+        trainer = LossTrainer(batch_size=BATCH_SIZE, early_stopping=False, verbose=False)
+        trainer.set_model(lr, input_var, label_var)
+
+    with G.Session(graph):
+        training.run_steps(G, trainer._train_fn, [X, y], batch_size=BATCH_SIZE, max_steps=500)
+        return G.utils.get_graph_state(graph)
+
+
+def read_params(path):
+    if is_array_file(path):
+        return {k: np.array(v) for k, v in ArrayFile(path).read().items()}
+    return load_object_compressed(path)
+
+
+def measure(params, codec, tmpdir):
+    path = os.path.join(tmpdir, 'params.bin')
+    size = sum(np.asarray(v).nbytes for v in params.values()) / 1048576.
+    start_time = time.time()
+    save_object_compressed(path, params, codec=codec)
+    save_time = time.time() - start_time
+    start_time = time.time()
+    load_object_compressed(path)
+    load_time = time.time() - start_time
+    ratio = os.path.getsize(path) / 1048576. / size
+    return size / save_time, size / load_time, ratio
+
+
+params = read_params(sys.argv[1]) if len(sys.argv) > 1 else train_params()
+print('Parameters: %.1f MB, CPU cores: %d.' % (sum(np.asarray(v).nbytes for v in params.values()) / 1048576.,
+                                              ZlibCodec().threads))
+print('%30s %12s %12s %8s' % ('codec', 'save MB/s', 'load MB/s', 'ratio'))
+with TemporaryDirectory() as tmpdir:
+    for codec in CODECS:
+        print('%30s %12.1f %12.1f %8.3f' % ((codec,) + measure(params, codec, tmpdir)))
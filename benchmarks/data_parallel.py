@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the scaling efficiency of data parallel training with 1/2/4/8 worker processes.
+
+The scaling efficiency of N workers is the training throughput (examples per second) of N workers,
+divided by N times the throughput of 1 worker.  It is recommended to set `OMP_NUM_THREADS=1`, so that
+the workers do not compete for the CPU cores with the BLAS threads.
+
+Usage: python data_parallel.py [number of steps, default 500] [batch size of each worker, default 64]
+"""
+from __future__ import absolute_import, print_function
+
+import sys
+import time
+
+import numpy as np
+
+from ipwxlearn import glue, models
+from ipwxlearn.glue import G
+from ipwxlearn.training.trainers import DataParallelTrainer
+
+NUM_STEPS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+BATCH_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+DIM, TARGET_NUM = 256, 10
+
+
+def measure(workers):
+    # each worker gets enough data for NUM_STEPS steps in one epoch.
+    X = np.random.normal(size=[BATCH_SIZE * NUM_STEPS * workers, DIM]).astype(glue.config.floatX)
+    y = np.random.randint(0, TARGET_NUM, size=len(X)).astype(np.int32)
+
+    graph = G.Graph()
+    with graph.as_default():
+        input_var = G.make_placeholder('inputs', shape=(None, DIM), dtype=glue.config.floatX)
+        label_var = G.make_placeholder('labels', shape=(None,), dtype=np.int32)
+        input_layer = G.layers.InputLayer(input_var, shape=(None, DIM))
+        mlp = models.MLP('mlp', input_layer, layer_units=[256, 256, TARGET_NUM])
+        lr = models.LogisticRegression('logistic', mlp, target_num=TARGET_NUM)
+        trainer = DataParallelTrainer(batch_size=BATCH_SIZE, max_epoch=1, early_stopping=False, verbose=False,
+                                      validation_steps=NUM_STEPS * 2, workers=workers)
+        trainer.set_model(lr, input_var, label_var)
+
+    with G.Session(graph):
+        start_time = time.time()
+        trainer.fit(X, y)
+        return BATCH_SIZE * workers * NUM_STEPS / (time.time() - start_time)
+
+
+print('%8s %14s %12s' % ('workers', 'examples/s', 'efficiency'))
+base = None
+for workers in (1, 2, 4, 8):
+    speed = measure(workers)
+    base = base or speed
+    print('%8d %14.1f %11.1f%%' % (workers, speed, 100. * speed / (workers * base)))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the training speed of running K steps in each call to the training function.
+
+The backend is selected by the environment variable TENSOR_BACKEND, so run this script once with
+TENSOR_BACKEND=theano and once with TENSOR_BACKEND=tensorflow to compare both backends.
+
+Usage: python fused_steps.py [number of steps, default 2000]
+"""
+from __future__ import absolute_import, print_function
+
+import sys
+import time
+
+import numpy as np
+
+from ipwxlearn import glue, models, training
+from ipwxlearn.glue import G
+from ipwxlearn.training.trainers import LossTrainer
+
+NUM_STEPS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+DIM, TARGET_NUM = 100, 10
+
+
+def measure(batch_size, steps_per_call):
+    X = np.random.normal(size=[batch_size * 100, DIM]).astype(glue.config.floatX)
+    y = np.random.randint(0, TARGET_NUM, size=len(X)).astype(np.int32)
+
+    graph = G.Graph()
+    with graph.as_default():
+        input_var = G.make_placeholder('inputs', shape=(None, DIM), dtype=glue.config.floatX)
+        label_var = G.make_placeholder('labels', shape=(None,), dtype=np.int32)
+        input_layer = G.layers.InputLayer(input_var, shape=(None, DIM))
+        mlp = models.MLP('mlp', input_layer, layer_units=[128, TARGET_NUM])
+        lr = models.LogisticRegression('logistic', mlp, target_num=TARGET_NUM)
+        trainer = LossTrainer(batch_size=batch_size, early_stopping=False, verbose=False,
+                              steps_per_call=steps_per_call)
+        trainer.set_model(lr, input_var, label_var)
+        flow = training.TrainingBatchDataFlow([X, y], batch_size=batch_size, reuse_buffers=True)
+
+    with G.Session(graph):
+        # the first call includes the warm-up of the backend, so it is excluded from the timing.
+        training.run_steps(G, trainer._train_fn, flow, batch_size=batch_size, max_steps=steps_per_call - 1,
+                           steps_per_call=steps_per_call)
+        start_time = time.time()
+        training.run_steps(G, trainer._train_fn, flow, batch_size=batch_size, max_steps=NUM_STEPS + steps_per_call,
+                           steps_per_call=steps_per_call)
+        return NUM_STEPS / (time.time() - start_time)
+
+
+print('Backend: %s, floatX: %s.' % (glue.config.backend, glue.config.floatX))
+print('%10s %14s %14s %14s' % ('batch size', 'K=1 steps/s', 'K=8 steps/s', 'K=32 steps/s'))
+for batch_size in (16, 32, 64, 128):
+    speeds = [measure(batch_size, k) for k in (1, 8, 32)]
+    print('%10d %14.1f %14.1f %14.1f' % ((batch_size,) + tuple(speeds)))
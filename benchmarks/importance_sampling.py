@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the validation loss against wall-clock time, with uniform and loss-driven importance sampling.
+
+The data is a softmax classification task where most examples are easy, and a small fraction of examples
+lie close to the decision boundaries, so that most of the uniformly drawn examples contribute little.
+
+Usage: python importance_sampling.py [max epoch, default 5] [batch size, default 64] [examples, default 500000]
+"""
+from __future__ import absolute_import, print_function
+
+import sys
+import time
+
+import numpy as np
+
+from ipwxlearn import glue, models, training
+from ipwxlearn.glue import G
+from ipwxlearn.training.trainers import LossTrainer
+
+MAX_EPOCH = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+BATCH_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+NUM_EXAMPLES = int(sys.argv[3]) if len(sys.argv) > 3 else 500000
+DIM, TARGET_NUM = 50, 5
+EVAL_STEPS = 50
+
+
+def make_data(rs):
+    W = rs.normal(size=[DIM, TARGET_NUM])
+    X = rs.normal(size=[NUM_EXAMPLES, DIM])
+    logits = np.dot(X, W)
+    # shrink 90% of the examples away from the boundaries, which makes them easy.
+    easy = rs.rand(NUM_EXAMPLES) < 0.9
+    X[easy] *= 5.
+    y = np.argmax(logits, axis=1).astype(np.int32)
+    return X.astype(glue.config.floatX), y
+
+
+class LossCurveMonitor(training.Monitor):
+    """Record the validation loss against wall-clock time every few steps."""
+
+    def __init__(self, valid_fn, valid_data):
+        self.valid_fn = valid_fn
+        self.valid_data = valid_data
+        self.curve = []
+        self._start_time = None
+        self._eval_time = 0.
+
+    def start_training(self, G, batch_size, steps_in_epoch, max_steps, initial_step=0):
+        self._start_time = time.time()
+
+    def end_step(self, step, loss):
+        if step % EVAL_STEPS == 0:
+            start = time.time()
+            loss = float(self.valid_fn(*self.valid_data))
+            self._eval_time += time.time() - start
+            # the time spent on evaluation is excluded from the training time.
+            self.curve.append((time.time() - self._start_time - self._eval_time, loss))
+
+
+def run(importance_sampling, train_data, valid_data):
+    graph = G.Graph()
+    with graph.as_default():
+        input_var = G.make_placeholder('inputs', shape=(None, DIM), dtype=glue.config.floatX)
+        label_var = G.make_placeholder('labels', shape=(None,), dtype=np.int32)
+        input_layer = G.layers.InputLayer(input_var, shape=(None, DIM))
+        lr = models.LogisticRegression('logistic', input_layer, target_num=TARGET_NUM)
+        valid_fn = G.make_function(inputs=[input_var, label_var],
+                                   outputs=G.op.mean(lr.get_loss_for(input_var, label_var)))
+        trainer = LossTrainer(batch_size=BATCH_SIZE, max_epoch=MAX_EPOCH, early_stopping=False,
+                              verbose=False, importance_sampling=importance_sampling)
+        trainer.set_model(lr, input_var, label_var)
+        monitor = LossCurveMonitor(valid_fn, valid_data)
+        trainer.add_monitor(monitor)
+
+    with G.Session(graph):
+        trainer.fit(*train_data)
+    return monitor.curve
+
+
+def time_to_reach(curve, target):
+    for t, loss in curve:
+        if loss <= target:
+            return t
+    return None
+
+
+rs = np.random.RandomState(1234)
+X, y = make_data(rs)
+# the training set should be large enough, so that the cost of updating the priorities would be visible.
+train_data, valid_data = (X[:-5000], y[:-5000]), (X[-5000:], y[-5000:])
+curves = {name: run(flag, train_data, valid_data) for name, flag in (('uniform', False), ('importance', True))}
+
+print('%10s %12s %12s' % ('time (s)', 'uniform', 'importance'))
+for (t1, l1), (t2, l2) in zip(curves['uniform'], curves['importance']):
+    print('%10.2f %12.6f %12.6f' % ((t1 + t2) / 2., l1, l2))
+
+target = min(l for _, l in curves['uniform']) * 1.1
+for name, curve in sorted(curves.items()):
+    t = time_to_reach(curve, target)
+    print('%-10s: reached validation loss %.6f after %s.' %
+          (name, target, '%.2f secs' % t if t is not None else 'never'))
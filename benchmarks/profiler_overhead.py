@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the overhead of profiling the training steps by :class:`~ipwxlearn.training.ProfilerMonitor`.
+
+Usage: python profiler_overhead.py [number of steps, default 5000] [trace file, default None]
+"""
+from __future__ import absolute_import, print_function
+
+import sys
+import time
+
+import numpy as np
+
+from ipwxlearn import glue, models, training
+from ipwxlearn.glue import G
+from ipwxlearn.training.trainers import LossTrainer
+
+NUM_STEPS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+TRACE_FILE = sys.argv[2] if len(sys.argv) > 2 else None
+BATCH_SIZE, DIM, TARGET_NUM = 64, 100, 10
+
+
+def measure(profiler):
+    monitors = [training.Monitor()] + ([profiler] if profiler is not None else [])
+    # each run uses a new session, since the global step is recorded in the session memo.
+    with G.Session(graph):
+        start_time = time.time()
+        training.run_steps(G, trainer._train_fn, flow, monitor=monitors, batch_size=BATCH_SIZE, max_steps=NUM_STEPS)
+        return (time.time() - start_time) / NUM_STEPS
+
+
+X = np.random.normal(size=[BATCH_SIZE * 100, DIM]).astype(glue.config.floatX)
+y = np.random.randint(0, TARGET_NUM, size=len(X)).astype(np.int32)
+graph = G.Graph()
+with graph.as_default():
+    input_var = G.make_placeholder('inputs', shape=(None, DIM), dtype=glue.config.floatX)
+    label_var = G.make_placeholder('labels', shape=(None,), dtype=np.int32)
+    input_layer = G.layers.InputLayer(input_var, shape=(None, DIM))
+    mlp = models.MLP('mlp', input_layer, layer_units=[128, TARGET_NUM])
+    lr = models.LogisticRegression('logistic', mlp, target_num=TARGET_NUM)
+    trainer = LossTrainer(batch_size=BATCH_SIZE, early_stopping=False, verbose=False)
+    trainer.set_model(lr, input_var, label_var)
+    flow = training.TrainingBatchDataFlow([X, y], batch_size=BATCH_SIZE, reuse_buffers=True)
+
+# warm up the backend, and then alternate the runs so that both see the same conditions.
+measure(None)
+plain, profiled = [], []
+for i in range(3):
+    plain.append(measure(None))
+    profiled.append(measure(training.ProfilerMonitor(sys.stdout if i == 2 else None, steps=NUM_STEPS,
+                                                     trace_file=TRACE_FILE if i == 2 else None)))
+
+plain, profiled = min(plain), min(profiled)
+print('Without profiler: %.3f ms/step; with profiler: %.3f ms/step; overhead %.2f%%.' %
+      (plain * 1e3, profiled * 1e3, 100. * (profiled - plain) / plain))
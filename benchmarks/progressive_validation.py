@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the cost of validation passes with and without progressive validation.
+
+A logistic regression is trained on random data with a validation every few steps, once with full validation
+passes and once with progressive validation.  The fraction of evaluated validation examples, the total time of
+training, and the best validation loss picked by each run are reported.
+
+Usage: python progressive_validation.py [number of steps, default 2000]
+"""
+from __future__ import absolute_import, print_function
+
+import sys
+import time
+
+import numpy as np
+
+from ipwxlearn import glue, models, training
+from ipwxlearn.glue import G
+from ipwxlearn.training.trainers import LossTrainer
+
+NUM_STEPS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+DIM, TARGET_NUM, BATCH_SIZE = 100, 10, 64
+
+np.random.seed(1234)
+W = np.random.normal(size=[DIM, TARGET_NUM])
+X = np.random.normal(size=[20000, DIM]).astype(glue.config.floatX)
+y = np.argmax(np.dot(X, W) + np.random.normal(scale=3., size=[len(X), TARGET_NUM]), axis=1).astype(np.int32)
+train_X, train_y, valid_X, valid_y = X[:10000], y[:10000], X[10000:], y[10000:]
+
+
+def measure(progressive):
+    np.random.seed(4321)
+    graph = G.Graph()
+    with graph.as_default():
+        input_var = G.make_placeholder('inputs', shape=(None, DIM), dtype=glue.config.floatX)
+        label_var = G.make_placeholder('labels', shape=(None,), dtype=np.int32)
+        input_layer = G.layers.InputLayer(input_var, shape=(None, DIM))
+        lr = models.LogisticRegression('logistic', input_layer, target_num=TARGET_NUM)
+        trainer = LossTrainer(batch_size=BATCH_SIZE, early_stopping=False, verbose=False)
+        trainer.set_model(lr, input_var, label_var)
+        valid_fn = G.make_function(inputs=[input_var, label_var], outputs=trainer._loss)
+
+    with G.Session(graph):
+        monitor = training.ValidationMonitor(valid_fn, [valid_X, valid_y], steps=20, validation_batch=500,
+                                             progressive_validation=progressive)
+        start_time = time.time()
+        training.run_steps(G, trainer._train_fn, [train_X, train_y], monitor=monitor, batch_size=BATCH_SIZE,
+                           max_steps=NUM_STEPS)
+        time_usage = time.time() - start_time
+        best_loss = valid_fn(valid_X, valid_y)
+    return monitor.validated_fraction, time_usage, best_loss
+
+
+print('Backend: %s, floatX: %s.' % (glue.config.backend, glue.config.floatX))
+print('%12s %20s %12s %16s' % ('mode', 'validated fraction', 'total secs', 'best valid loss'))
+for mode, progressive in (('full', False), ('progressive', True)):
+    print('%12s %20.3f %12.2f %16.6f' % ((mode,) + measure(progressive)))
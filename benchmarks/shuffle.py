@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the shuffling modes of `iterate_training_batches`.
+
+Usage: python shuffle.py [data size in MB, default 2048] [batch size, default 64]
+"""
+from __future__ import absolute_import, print_function
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import iterate_training_batches
+
+DATA_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+BATCH_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+FEATURE_DIM = 784
+
+num_examples = DATA_MB * 1024 * 1024 // (FEATURE_DIM * 4)
+X = np.random.random([num_examples, FEATURE_DIM]).astype(np.float32)
+y = np.random.randint(0, 10, size=num_examples).astype(np.int32)
+print('Data: %d examples, %.2f MB; batch size %d.' % (num_examples, (X.nbytes + y.nbytes) / 1048576., BATCH_SIZE))
+
+for name, shuffle, reuse_buffers in (('copy whole arrays', 'copy', False),
+                                     ('gather each batch', True, False),
+                                     ('gather into buffers', True, True)):
+    tracemalloc.start()
+    start_time = time.time()
+    first_batch_time = None
+    for i, (bX, by) in enumerate(iterate_training_batches([X, y], BATCH_SIZE, shuffle=shuffle,
+                                                          reuse_buffers=reuse_buffers)):
+        if i == 0:
+            first_batch_time = time.time() - start_time
+    epoch_time = time.time() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('%-20s: epoch %.2f secs, first batch after %.4f secs, peak extra memory %.2f MB.' %
+          (name, epoch_time, first_batch_time, peak / 1048576.))
@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import copy
 import os
 import re
+import sys
+import threading
 from collections import OrderedDict
 
+import numpy as np
 import six
 
+from ipwxlearn.utils.arrayfile import ArrayFile, is_array_file, save_array_file
 from ipwxlearn.utils.concurrent import ThreadLocalStack
 from ipwxlearn.utils.io import save_object_compressed, load_object_compressed
 from ipwxlearn.utils.misc import silent_try, DictProxy
@@ -19,8 +24,20 @@ __all__ = [
 ]
 
 
+def _save_array_file(path, values):
+    with open(path, 'wb') as f:
+        save_array_file(f, values)
+
+
 class CheckpointFile(object):
-    """Class to read/write on a single checkpoint file."""
+    """
+    Class to read/write on a single checkpoint file.
+
+    By default, the variable values are stored in an array file (see :class:`~ipwxlearn.utils.arrayfile.ArrayFile`),
+    so that they could be memory-mapped when restoring.  If a codec is specified, the values would be stored in
+    a compressed file instead.  The memo is always stored in a compressed file.  Both formats are detected when
+    reading the files, as well as the compressed files saved by earlier versions.
+    """
 
     def __init__(self, base_path, index):
         self.base_path = base_path
@@ -37,29 +54,48 @@ class CheckpointFile(object):
     def __repr__(self):
         return 'CheckpointFile(%s,%d)' % (self.base_path, self.index)
 
-    def read_values(self):
+    def read_values(self, names=None):
+        """
+        Read the variable values.
+
+        :param names: Full names of the variables to read.  If not specified, will read all the variables.
+        :return: Dict from full names to values, or None if the values file does not exist.
+        """
         if os.path.isfile(self._values_path):
-            return load_object_compressed(self._values_path)
+            if is_array_file(self._values_path):
+                return ArrayFile(self._values_path).read(names)
+            values = load_object_compressed(self._values_path)
+            if names is not None:
+                values = {n: values[n] for n in names if n in values}
+            return values
 
     def read_memo(self):
         if os.path.isfile(self._memo_path):
             return load_object_compressed(self._memo_path)
 
     @staticmethod
-    def _safe_write(path, obj):
+    def _safe_write(path, obj, fsync=False, save=save_object_compressed):
         p = ''.join((path, '.tmp'))
         try:
-            save_object_compressed(p, obj)
+            save(p, obj)
+            if fsync:
+                with open(p, 'rb') as f:
+                    os.fsync(f.fileno())
             os.rename(p, path)
         except:
             silent_try(os.remove, p)
             raise
 
-    def write_values(self, values):
-        self._safe_write(self._values_path, values)
+    def write_values(self, values, fsync=False, codec=None):
+        if codec is None:
+            self._safe_write(self._values_path, values, fsync=fsync, save=_save_array_file)
+        else:
+            self._safe_write(self._values_path, values, fsync=fsync,
+                             save=lambda p, o: save_object_compressed(p, o, codec=codec))
 
-    def write_memo(self, memo):
-        self._safe_write(self._memo_path, memo)
+    def write_memo(self, memo, fsync=False, codec=None):
+        self._safe_write(self._memo_path, memo, fsync=fsync,
+                         save=lambda p, o: save_object_compressed(p, o, codec=codec))
 
     def purge_values(self):
         if os.path.isfile(self._values_path):
@@ -104,6 +140,12 @@ class SessionMemo(DictProxy):
     def clear_new(self):
         self._new_items.clear()
 
+    def mark_new(self, keys):
+        """Mark the items of specified keys as new, e.g., when they failed to be saved."""
+        for k in keys:
+            if k in self._proxied and k not in self._new_items:
+                self._new_items[k] = self._proxied[k]
+
     def with_prefix(self, prefix):
         """Get a dict-like object to read/write session memo, with a prefix."""
         return SessionMemoWithPrefix(prefix, self)
@@ -160,18 +202,24 @@ class BaseSession(object):
     :param init_variables: If True, will re-init the variables not specified in :param:`feed_values` with
                            corresponding initializers.  If False, will restore the values saved from last
                            session.
+    :param max_checkpoints: Maximum number of checkpoint files to keep.  (Default 10)
+    :param checkpoint_codec: Codec object or name for compressing the checkpoint files.
+                             See :func:`~ipwxlearn.utils.io.get_codec` for more details.
+                             If not specified, the variable values would be stored uncompressed, so as to be
+                             memory-mapped when restoring, while the memo would be compressed by the default codec.
     """
 
     #: Indicate whether or not the session has been entered.
     _has_entered_ = False
 
     def __init__(self, graph=None, feed_values=None, init_variables=False, checkpoint_file=None,
-                 max_checkpoints=10):
+                 max_checkpoints=10, checkpoint_codec=None):
         self.graph = graph or current_graph()
         self.feed_values = feed_values
         self.init_variables = init_variables
         self.checkpoint_file = checkpoint_file
         self.max_checkpoints = max_checkpoints
+        self.checkpoint_codec = checkpoint_codec
 
         # graph context object
         self._graph_ctx = None
@@ -179,6 +227,10 @@ class BaseSession(object):
         # apart from the graph variable values, we also provide a session-wide resumable memo.
         self.memo = SessionMemo()
 
+        # the thread writing checkpoint in background, and the error info of the last background checkpoint.
+        self._checkpoint_thread = None
+        self._checkpoint_error = None
+
         # We preserve more than one checkpoint file in the whole session.
         #
         # The maximum number of checkpoint files is controlled by 'max_checkpoints',
@@ -189,9 +241,11 @@ class BaseSession(object):
         if self._checkpoint_files:
             self._next_checkpoint = self._checkpoint_files[-1].index + 1
 
-            # variable values should only be read from the latest checkpoint file.
+            # variable values should only be read from the latest checkpoint file, and only the resumable
+            # variables of the graph are required.
             self.feed_values = self.feed_values or {}
-            chk_values = self._checkpoint_files[-1].read_values()
+            names = [self.graph.get_variable_info(v).full_name for v in self.graph.get_variables(resumable=True)]
+            chk_values = self._checkpoint_files[-1].read_values(names)
             if chk_values:
                 for k, v in six.iteritems(chk_values):
                     self.feed_values.setdefault(k, v)
@@ -215,35 +269,85 @@ class BaseSession(object):
             for chk in purge_files:
                 silent_try(chk.purge_values)
 
-    def checkpoint(self):
-        """Make a checkpoint."""
+    def checkpoint(self, background=False):
+        """
+        Make a checkpoint.
+
+        :param background: Whether or not to write the checkpoint files in a background thread? (Default False)
+                           If True, the variable values and the new memo items are copied in memory, and then
+                           written, compressed and synchronized to disk in background.  At most one checkpoint
+                           would be written in background, so this method would wait for the previous one.
+                           The errors in background would be raised by the next call to this method or to
+                           :method:`wait_checkpoint`.
+        """
         if not self.checkpoint_file:
             raise ValueError('Checkpoint file is not specified.')
+        self.wait_checkpoint()
 
-        # write the checkpoint files
+        # gather the checkpoint values.  The session returns copies of the variable values, while the memo items
+        # are copied in case they would be modified before being written in background.
         var_dict = self.get_variable_values_dict(self.graph.get_variables(resumable=True))
         values = {
             self.graph.get_variable_info(var).full_name: value
             for var, value in six.iteritems(var_dict)
         }
+        new_memo = self.memo.get_new()
         chk = CheckpointFile(self.checkpoint_file, self._next_checkpoint)
+
+        if not background:
+            self._write_checkpoint(chk, values, new_memo)
+            self.memo.clear_new()
+        else:
+            new_memo = copy.deepcopy(new_memo)
+            self._next_checkpoint += 1
+            self.memo.clear_new()
+            self._checkpoint_thread = threading.Thread(target=self._write_checkpoint_in_background,
+                                                       args=(chk, values, new_memo))
+            self._checkpoint_thread.start()
+
+    def _write_checkpoint(self, chk, values, new_memo, fsync=False):
+        """Write the checkpoint files, and purge the stale ones."""
         try:
-            chk.write_values(values)
-            new_memo = self.memo.get_new()
+            chk.write_values(values, fsync=fsync, codec=self.checkpoint_codec)
             if new_memo:
-                chk.write_memo(new_memo)
+                chk.write_memo(new_memo, fsync=fsync, codec=self.checkpoint_codec)
         except:
             chk.purge_values()
             raise
         self._checkpoint_files.append(chk)
 
         # increase the counter for next checkpoint.
-        self._next_checkpoint += 1
-        self.memo.clear_new()
+        self._next_checkpoint = max(self._next_checkpoint, chk.index + 1)
 
         # purge stale checkpoints.
         self._purge_stale_checkpoints()
 
+    def _write_checkpoint_in_background(self, chk, values, new_memo):
+        try:
+            self._write_checkpoint(chk, values, new_memo, fsync=True)
+        except Exception:
+            self._checkpoint_error = (sys.exc_info(), list(new_memo))
+
+    def wait_checkpoint(self, timeout=None):
+        """
+        Wait for the checkpoint being written in background, and raise its error if it fails.
+        The memo items which failed to be saved would be saved by the next checkpoint.
+
+        :param timeout: If specified, wait for at most this number of seconds.
+        :return: Whether or not there is no checkpoint being written in background.
+        """
+        if self._checkpoint_thread is not None:
+            self._checkpoint_thread.join(timeout)
+            if self._checkpoint_thread.is_alive():
+                return False
+            self._checkpoint_thread = None
+        if self._checkpoint_error is not None:
+            exc_info, memo_keys = self._checkpoint_error
+            self._checkpoint_error = None
+            self.memo.mark_new(memo_keys)
+            six.reraise(*exc_info)
+        return True
+
     @property
     def next_checkpoint_index(self):
         """Get the index of next checkpoint."""
@@ -295,9 +399,11 @@ class BaseSession(object):
             last_values = self._exit(self.graph.get_persistent_variables())
             self.graph.set_last_values(last_values)
 
-            # rethrow the exception.
+            # rethrow the exception, after waiting for the checkpoint being written in background.
             if exc_type is not None:
+                silent_try(self.wait_checkpoint)
                 six.reraise(exc_type, exc_val, exc_tb)
+            self.wait_checkpoint()
 
         finally:
             # exit the session context.
@@ -346,6 +452,17 @@ class BaseSession(object):
         """
         raise NotImplementedError()
 
+    def copy_variable_values(self, vars, buffers):
+        """
+        Copy the values of specified variables into preallocated numpy arrays.
+        Derived classes might override this to avoid allocating the intermediate arrays.
+
+        :param vars: iterable backend variable objects.
+        :param buffers: iterable numpy arrays, one for each variable, with the same shapes as the variables.
+        """
+        for buf, value in zip(buffers, self.get_variable_values(list(vars))):
+            np.copyto(buf, value)
+
     def get_variable_values_dict(self, vars):
         """
         Get the values of specified variables as dict.
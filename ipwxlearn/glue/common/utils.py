@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import six
 
+from ipwxlearn.utils.arrayfile import ArrayFile, is_array_file, save_array_file
+from ipwxlearn.utils.io import is_compressed_file, load_object_compressed, save_object_compressed
 from .graph import VariableTags
 from .session import iter_sessions
 
@@ -64,28 +66,33 @@ def get_graph_state(graph, **tags):
     return get_graph_state_by_vars(graph, vars)
 
 
-def save_graph_state_by_vars(graph, persist_file, full_names_or_vars):
+def _save_graph_state(persist_file, state, codec):
+    if codec is None:
+        save_array_file(persist_file, state)
+    else:
+        save_object_compressed(persist_file, state, codec=codec)
+
+
+def save_graph_state_by_vars(graph, persist_file, full_names_or_vars, codec=None):
     """
     Save graph state to persistent file.
+
+    By default, the state is saved as an array file (see :class:`~ipwxlearn.utils.arrayfile.ArrayFile`),
+    which could be memory-mapped by :method:`restore_graph_state`.
     See :method:`get_graph_state_by_vars` for more details about arguments.
+
+    :param codec: Codec object or name, see :func:`~ipwxlearn.utils.io.get_codec`.
+                  If specified, will save the state as a compressed file instead of an array file.
     """
-    if isinstance(persist_file, six.string_types):
-        with open(persist_file, 'wb') as f:
-            save_graph_state_by_vars(graph, f, full_names_or_vars)
-    else:
-        pkl.dump(get_graph_state_by_vars(graph, full_names_or_vars), persist_file, protocol=pkl.HIGHEST_PROTOCOL)
+    _save_graph_state(persist_file, get_graph_state_by_vars(graph, full_names_or_vars), codec)
 
 
-def save_graph_state(graph, persist_file, **tags):
+def save_graph_state(graph, persist_file, codec=None, **tags):
     """
     Save graph state to persistent file.
-    See :method:`get_graph_state` for more details about arguments.
+    See :method:`save_graph_state_by_vars` and :method:`get_graph_state` for more details about arguments.
     """
-    if isinstance(persist_file, six.string_types):
-        with open(persist_file, 'wb') as f:
-            save_graph_state(graph, f, **tags)
-    else:
-        pkl.dump(get_graph_state(graph, **tags), persist_file, protocol=pkl.HIGHEST_PROTOCOL)
+    _save_graph_state(persist_file, get_graph_state(graph, **tags), codec)
 
 
 def set_graph_state(graph, state):
@@ -105,13 +112,37 @@ def set_graph_state(graph, state):
         graph.set_last_values(state)
 
 
-def restore_graph_state(graph, persist_file):
+def _load_graph_state(persist_file, names):
+    if is_array_file(persist_file):
+        return ArrayFile(persist_file).read(names)
+    if is_compressed_file(persist_file):
+        state = load_object_compressed(persist_file)
+    elif isinstance(persist_file, six.string_types):
+        # fallback to the pickle files saved by earlier versions.
+        with open(persist_file, 'rb') as f:
+            state = pkl.load(f)
+    else:
+        state = pkl.load(persist_file)
+    if names is not None:
+        state = {n: state[n] for n in names if n in state}
+    return state
+
+
+def restore_graph_state(graph, persist_file, full_names_or_vars=None):
     """
     Restore graph state from persistent file.
-    See :method:`set_graph_state` for more details about arguments.
+
+    If the file is an array file and is specified by path, the variable values would be memory-mapped
+    instead of being read into memory, so that only the values of requested variables would be loaded.
+    The compressed files, as well as the pickle files saved by earlier versions, could also be restored.
+
+    :param graph: Graph object.
+    :param persist_file: Path of the persistent file, or a seekable file object.
+    :param full_names_or_vars: Iterable full names or backend variable objects, whose values should be restored.
+                               The variables absent from the file would be ignored.
+                               If not specified, will restore all the variables in the file.
     """
-    if isinstance(persist_file, six.string_types):
-        with open(persist_file, 'rb') as f:
-            restore_graph_state(graph, f)
-    else:
-        set_graph_state(graph, pkl.load(persist_file))
+    names = None
+    if full_names_or_vars is not None:
+        names = [graph.get_variable_info(v).full_name for v in full_names_or_vars]
+    set_graph_state(graph, _load_graph_state(persist_file, names))
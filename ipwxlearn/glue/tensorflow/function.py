@@ -6,12 +6,13 @@ from collections import OrderedDict
 import six
 import tensorflow as tf
 
+from ipwxlearn import glue
 from ipwxlearn.glue import current_session
 from ipwxlearn.utils.misc import ensure_list_sealed
 from .utils import merge_updates
 from ..common.function import BaseFunction
 
-__all__ = ['Function', 'make_function']
+__all__ = ['Function', 'make_function', 'make_multi_step_function']
 
 
 class Function(BaseFunction):
@@ -71,3 +72,40 @@ class Function(BaseFunction):
 
 
 make_function = Function
+
+
+def make_multi_step_function(inputs, step_fn, output_dtypes=None):
+    """
+    Make a function that runs several training steps in one call.
+
+    The compiled function accepts the stacked inputs of K steps, each with shape (K,) + shape of the input,
+    and runs :param:`step_fn` K times in one backend loop, with the updates of each step applied before
+    the next step.  It returns the outputs of all the steps, each stacked into shape (K,).
+
+    Note that :param:`step_fn` is called inside a `tf.while_loop`, where no variable could be created.
+    Thus the optimizers with state variables (e.g., the slots of Adam) cannot be used in :param:`step_fn`.
+
+    :param inputs: Placeholder, or list of placeholders for the inputs of each step.
+    :param step_fn: Callable function, which accepts the input tensors of a step as unnamed arguments, and returns
+                    (outputs, updates), where the outputs are a list of scalar tensors.
+    :param output_dtypes: Data types of the outputs.  If not specified, will assume one output of floatX.
+
+    :rtype: :class:`Function`
+    """
+    inputs = ensure_list_sealed(inputs)
+    if output_dtypes is None:
+        output_dtypes = [glue.config.floatX]
+    stacked = [tf.placeholder(v.dtype, shape=[None] + v.get_shape().as_list(),
+                              name=v.op.name + '_steps' if v.op.name else None)
+               for v in inputs]
+    steps = tf.shape(stacked[0])[0]
+
+    def body(i, *arrays):
+        outputs, updates = step_fn(*(x[i] for x in stacked))
+        with tf.control_dependencies(merge_updates(ensure_list_sealed(updates))):
+            return (i + 1,) + tuple(a.write(i, tf.identity(o)) for a, o in zip(arrays, ensure_list_sealed(outputs)))
+
+    arrays = [tf.TensorArray(tf.as_dtype(dtype), size=steps) for dtype in output_dtypes]
+    # the steps must be run one after another, since each step depends on the updates of the previous one.
+    results = tf.while_loop(lambda i, *a: i < steps, body, [tf.constant(0)] + arrays, parallel_iterations=1)
+    return Function(inputs=stacked, outputs=[a.stack() for a in results[1:]])
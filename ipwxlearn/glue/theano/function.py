@@ -5,12 +5,13 @@ from collections import OrderedDict
 
 import six
 import theano
+from theano import tensor as T
 
-from ipwxlearn.utils.misc import ensure_list_sealed
+from ipwxlearn.utils.misc import ensure_list_sealed, maybe_iterable_to_list
 from .summary import SummaryObject
 from ..common.function import BaseFunction
 
-__all__ = ['Function', 'make_function']
+__all__ = ['Function', 'make_function', 'make_multi_step_function']
 
 
 class Function(BaseFunction):
@@ -66,13 +67,46 @@ class Function(BaseFunction):
 
     def _merge_updates(self, updates):
         """Merge several updates into one update, for the backend."""
-        if isinstance(updates, (dict, OrderedDict)):
-            return OrderedDict(updates)
-        ret = OrderedDict()
-        for u in updates:
-            for k, v in six.iteritems(u):
-                ret[k] = v
-        return ret
+        return _merge_updates(updates)
+
+
+def _merge_updates(updates):
+    if isinstance(updates, (dict, OrderedDict)):
+        return OrderedDict(updates)
+    ret = OrderedDict()
+    for u in updates:
+        for k, v in six.iteritems(u):
+            ret[k] = v
+    return ret
 
 
 make_function = Function
+
+
+def make_multi_step_function(inputs, step_fn, output_dtypes=None):
+    """
+    Make a function that runs several training steps in one call.
+
+    The compiled function accepts the stacked inputs of K steps, each with shape (K,) + shape of the input,
+    and runs :param:`step_fn` K times in one backend loop, with the updates of each step applied before
+    the next step.  It returns the outputs of all the steps, each stacked into shape (K,).
+
+    :param inputs: Placeholder, or list of placeholders for the inputs of each step.
+    :param step_fn: Callable function, which accepts the input tensors of a step as unnamed arguments, and returns
+                    (outputs, updates), where the outputs are a list of scalar tensors.
+    :param output_dtypes: Data types of the outputs.  Ignored by Theano backend.
+
+    :rtype: :class:`Function`
+    """
+    inputs = ensure_list_sealed(inputs)
+    stacked = [T.TensorType(v.dtype, (False,) * (v.ndim + 1))(v.name + '_steps' if v.name else None)
+               for v in inputs]
+
+    def inner(*args):
+        outputs, updates = step_fn(*args)
+        return ensure_list_sealed(outputs), _merge_updates(
+            maybe_iterable_to_list(updates, exclude_types=(dict, OrderedDict)))
+
+    # the shared variables updated in the inner function would be carried from one step to the next by scan.
+    outputs, updates = theano.scan(inner, sequences=stacked)
+    return Function(inputs=stacked, outputs=ensure_list_sealed(outputs), updates=updates)
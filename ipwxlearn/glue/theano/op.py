@@ -112,6 +112,17 @@ def transpose(x, axes=None):
     return T.transpose(x, axes=axes)
 
 
+def gradients(loss, params):
+    """
+    Compute the gradients of :param:`loss` with respect to :param:`params`.
+
+    :param loss: Scalar loss expression.
+    :param params: List of backend variables.
+    :return: List of gradient expressions, one for each parameter.
+    """
+    return T.grad(loss, list(params))
+
+
 # Operations that change the values of variables.
 def assign(target, value):
     ret = OrderedDict()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import numpy as np
 import six
 
 from ipwxlearn.utils.misc import maybe_iterable_to_list
@@ -36,3 +37,8 @@ class Session(BaseSession):
     def set_variable_values(self, vars_values):
         for var, value in six.iteritems(vars_values):
             var.set_value(value, borrow=False)
+
+    def copy_variable_values(self, vars, buffers):
+        for var, buf in zip(vars, buffers):
+            # borrowing the storage of the variable avoids an intermediate copy.
+            np.copyto(buf, var.get_value(borrow=True))
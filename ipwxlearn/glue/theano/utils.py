@@ -15,9 +15,11 @@ __all__ = [
     'is_variable',
     'make_placeholder',
     'make_placeholder_for',
+    'replace_placeholders',
     'get_variable_values',
     'set_variable_values',
     'get_variable_name',
+    'get_variable_shape',
     'get_graph_state',
     'get_graph_state_by_vars',
     'set_graph_state',
@@ -167,6 +169,17 @@ def make_placeholder_for(name, data, dtype=None, **tags):
     return make_placeholder(name, shape=(None,) + data.shape[1:], dtype=dtype or data.dtype, **tags)
 
 
+def replace_placeholders(outputs, replace):
+    """
+    Get copies of the expressions, with some placeholders replaced by other tensors.
+
+    :param outputs: Expression, or list of expressions.
+    :param replace: Dict of {placeholder: tensor}.
+    :return: The copied expression, or list of expressions.
+    """
+    return theano.clone(outputs, replace=replace)
+
+
 def maybe_extract_scalar(v):
     """Maybe extract scalar from numpy 0-dimensional array."""
     return np.asarray([v], dtype=v.dtype)[0] if v.shape == () else v
@@ -193,3 +206,8 @@ def get_variable_name(var):
     Might return None if the variable does not have a name.
     """
     return var.name
+
+
+def get_variable_shape(var):
+    """Get the shape of specified backend variable, as a tuple of integers."""
+    return var.get_value(borrow=True).shape
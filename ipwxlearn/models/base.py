@@ -20,27 +20,31 @@ class BaseModel(G.layers.Layer):
                  in this model.  Some models may accept empty name.
     """
 
-    def save(self, path, include_inputs=True):
+    def save(self, path, include_inputs=True, codec=None):
         """
         Save the parameters of this model to external file.
 
         :param path: Path of the persistent file.
         :param include_inputs: Whether or not to include parameters from all ancestor layers?
                                (Default True)
+        :param codec: Codec object or name for compressing the file, see :func:`~ipwxlearn.utils.io.get_codec`.
+                      If not specified, the parameters would be stored uncompressed.
         """
         if include_inputs:
             params = G.layers.get_all_params(self, persistent=True)
         else:
             params = self.get_params(persistent=True)
-        G.utils.save_graph_state_by_vars(self.graph, path, params)
+        G.utils.save_graph_state_by_vars(self.graph, path, params, codec=codec)
 
     def load(self, path):
         """
         Load the parameters of this model from external file.
 
+        Only the parameters of this model and its ancestor layers would be loaded.
+
         :param path: Path of the persistent file.
         """
-        G.utils.restore_graph_state(self.graph, path)
+        G.utils.restore_graph_state(self.graph, path, G.layers.get_all_params(self, persistent=True))
 
     @contextlib.contextmanager
     def with_scope(self):
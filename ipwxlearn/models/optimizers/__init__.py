@@ -12,7 +12,25 @@ __all__ = [
 
 
 class Optimizer(object):
-    """Base class for all optimizers."""
+    """
+    Base class for all optimizers.
+
+    Derived classes should implement :method:`_derive_updates`, which accepts either the loss or the list of
+    pre-computed gradients, so as to support both :method:`minimize` and :method:`apply_gradients`.
+    """
+
+    #: Whether or not this optimizer creates state variables (e.g., the moments of gradients) for the parameters?
+    has_state = True
+
+    def _derive_updates(self, loss_or_grads, params):
+        """
+        Derivate the update to :param:`params` from the loss, or from the pre-computed gradients.
+
+        :param loss_or_grads: Tensor expression representing the loss, or a list of gradients of the params.
+        :param params: Tuple/list of parameters that should be minimized.
+        :return: Update object to the parameters.
+        """
+        raise NotImplementedError()
 
     def minimize(self, loss, params):
         """
@@ -22,7 +40,20 @@ class Optimizer(object):
         :param params: Tuple/list of parameters that should be minimized.
         :return: Update object to the parameters.
         """
-        raise NotImplementedError()
+        return self._derive_updates(loss, params)
+
+    def apply_gradients(self, grads, params):
+        """
+        Derivate the update to :param:`params` from the pre-computed gradients of the loss to be minimized.
+
+        :param grads: Tuple/list of gradient expressions, one for each parameter.
+        :param params: Tuple/list of parameters that should be minimized.
+        :return: Update object to the parameters.
+        """
+        grads, params = list(grads), list(params)
+        if len(grads) != len(params):
+            raise ValueError('Got %r gradients, but there are %r parameters.' % (len(grads), len(params)))
+        return self._derive_updates(grads, params)
 
     def maximize(self, loss, params):
         """
@@ -38,11 +69,13 @@ class Optimizer(object):
 class SGDOptimizer(Optimizer):
     """Stochastic gradient descent optimizer."""
 
+    has_state = False
+
     def __init__(self, learning_rate=0.01):
         self.learning_rate = learning_rate
 
-    def minimize(self, loss, params):
-        return G.updates.sgd(loss, params, learning_rate=self.learning_rate)
+    def _derive_updates(self, loss_or_grads, params):
+        return G.updates.sgd(loss_or_grads, params, learning_rate=self.learning_rate)
 
 
 class MomentumOptimizer(Optimizer):
@@ -52,8 +85,8 @@ class MomentumOptimizer(Optimizer):
         self.learning_rate = learning_rate
         self.momentum = momentum
 
-    def minimize(self, loss, params):
-        return G.updates.momentum(loss, params, learning_rate=self.learning_rate, momentum=self.momentum)
+    def _derive_updates(self, loss_or_grads, params):
+        return G.updates.momentum(loss_or_grads, params, learning_rate=self.learning_rate, momentum=self.momentum)
 
 
 class AdamOptimizer(Optimizer):
@@ -65,6 +98,6 @@ class AdamOptimizer(Optimizer):
         self.beta2 = beta2
         self.epsilon = epsilon
 
-    def minimize(self, loss, params):
-        return G.updates.adam(loss, params, learning_rate=self.learning_rate, beta1=self.beta1, beta2=self.beta2,
-                              epsilon=self.epsilon)
+    def _derive_updates(self, loss_or_grads, params):
+        return G.updates.adam(loss_or_grads, params, learning_rate=self.learning_rate, beta1=self.beta1,
+                              beta2=self.beta2, epsilon=self.epsilon)
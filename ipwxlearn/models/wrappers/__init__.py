@@ -45,7 +45,7 @@ class BaseEstimator(object):
         self.predict_batch_size = predict_batch_size
         self.predict_fn = G.make_function(inputs=[input_var], outputs=self.output)
 
-    def save(self, path):
+    def save(self, path, codec=None):
         """
         Save the parameters of the model to external file.
 
@@ -53,12 +53,14 @@ class BaseEstimator(object):
         will be saved to file.
 
         :param path: Path of the persistent file.
+        :param codec: Codec object or name for compressing the file, see :func:`~ipwxlearn.utils.io.get_codec`.
+                      If not specified, the parameters would be stored uncompressed.
         """
         if self.output_layer is None:
-            G.utils.save_graph_state(self.graph, path, persistent=True)
+            G.utils.save_graph_state(self.graph, path, codec=codec, persistent=True)
         else:
             params = G.layers.get_all_params(self.output_layer, persistent=True)
-            G.utils.save_graph_state_by_vars(self.graph, path, params)
+            G.utils.save_graph_state_by_vars(self.graph, path, params, codec=codec)
 
     def load(self, path):
         """
@@ -66,7 +68,11 @@ class BaseEstimator(object):
 
         :param path: Path of the persistent file.
         """
-        G.utils.restore_graph_state(self.graph, path)
+        if self.output_layer is None:
+            G.utils.restore_graph_state(self.graph, path, self.graph.get_variables(persistent=True))
+        else:
+            params = G.layers.get_all_params(self.output_layer, persistent=True)
+            G.utils.restore_graph_state(self.graph, path, params)
 
     def _make_session(self):
         try:
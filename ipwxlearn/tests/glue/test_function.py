@@ -94,3 +94,24 @@ class FunctionTestCase(unittest.TestCase):
             fn = G.make_function(inputs=[a, b], updates=updates)
             fn(3, 7)
             self.assertEquals(G.get_variable_values([c, d]), (10, 21), msg='Should merge updates.')
+
+    def test_multi_step_function(self):
+        """Test running several training steps in one call."""
+        graph = G.Graph()
+        with graph.as_default():
+            a = G.make_placeholder('a', shape=(None,), dtype=np.float32)
+            c = G.make_variable('c', shape=(), init=0., dtype=np.float32, persistent=True)
+            loss = G.op.mean(a) + c
+
+            def step_fn(x):
+                step_loss = G.utils.replace_placeholders(loss, {a: x})
+                return [step_loss], G.op.assign(c, c + 1.)
+            fn = G.make_multi_step_function(a, step_fn, output_dtypes=[np.float32])
+
+        with G.Session(graph):
+            data = np.arange(12, dtype=np.float32).reshape([4, 3])
+            losses = fn(data)[0]
+            # the update of each step should be visible to the next step.
+            np.testing.assert_allclose(losses, np.mean(data, axis=1) + np.arange(4))
+            self.assertEqual(G.get_variable_values(c), 4.)
+            np.testing.assert_allclose(fn(data[:2])[0], np.mean(data[:2], axis=1) + [4., 5.])
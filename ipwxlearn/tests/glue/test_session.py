@@ -5,6 +5,8 @@ import unittest
 import numpy as np
 
 from ipwxlearn.glue import G
+from ipwxlearn.utils.arrayfile import is_array_file
+from ipwxlearn.utils.io import is_compressed_file
 from ipwxlearn.utils.misc import assert_raises_message
 from ipwxlearn.utils.tempdir import TemporaryDirectory
 
@@ -165,3 +167,77 @@ class SessionTestCase(unittest.TestCase):
                 self.assertEqual(sess.next_checkpoint_index, 6)
                 self.assertEqual(G.get_variable_values([a, b, c, d]), (13, 23, 33, 4))
                 self.assertEqual((sess.memo['a'], sess.memo['b']), (101, 999))
+
+    def test_background_checkpoint(self):
+        graph = G.Graph()
+
+        with graph.as_default():
+            a = G.make_variable('a', (), 1, dtype=np.int32, resumable=True)
+
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'checkpoint.pkl')
+
+            with G.Session(graph, checkpoint_file=path, max_checkpoints=2) as sess:
+                arr = np.arange(3)
+                sess.memo['arr'] = arr
+                G.set_variable_values({a: 10})
+                sess.checkpoint(background=True)
+                self.assertEqual(sess.next_checkpoint_index, 2)
+                # the values and memo items should have been copied when scheduling the checkpoint.
+                arr[:] = 0
+                G.set_variable_values({a: 11})
+                # the previous checkpoint should be completed before the next one is scheduled.
+                sess.checkpoint(background=True)
+                sess.checkpoint(background=True)
+                self.assertTrue(sess.wait_checkpoint())
+                self.assertEqual(sess.next_checkpoint_index, 4)
+                self.assertFalse(os.path.isfile('%s.v1' % path))
+                self.assertTrue(os.path.isfile('%s.v2' % path))
+                self.assertTrue(os.path.isfile('%s.v3' % path))
+                self.assertTrue(os.path.isfile('%s.m1' % path))
+                self.assertFalse(os.path.isfile('%s.m2' % path))
+
+            with G.Session(graph, checkpoint_file=path) as sess:
+                self.assertEqual(G.get_variable_values(a), 11)
+                np.testing.assert_array_equal(sess.memo['arr'], [0, 1, 2])
+
+            # the failed checkpoint should be reported, and its memo items would be saved by the next one.
+            with G.Session(graph, checkpoint_file=path) as sess:
+                sess.memo['b'] = 1
+                sess.checkpoint_file = os.path.join(tmpdir, 'not-exist', 'checkpoint.pkl')
+                sess.checkpoint(background=True)
+                with self.assertRaises(IOError):
+                    sess.wait_checkpoint()
+                self.assertIn('b', sess.memo.get_new())
+                sess.checkpoint_file = path
+                sess.checkpoint(background=True)
+
+            with G.Session(graph, checkpoint_file=path) as sess:
+                self.assertEqual(sess.memo['b'], 1)
+
+    def test_checkpoint_codec(self):
+        graph = G.Graph()
+
+        with graph.as_default():
+            a = G.make_variable('a', (), 1, dtype=np.int32, resumable=True)
+
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'checkpoint.pkl')
+
+            with G.Session(graph, checkpoint_file=path, checkpoint_codec='gzip:1') as sess:
+                G.set_variable_values({a: 10})
+                sess.memo['a'] = 100
+                sess.checkpoint()
+                self.assertTrue(is_compressed_file('%s.v1' % path))
+                self.assertFalse(is_array_file('%s.v1' % path))
+
+            # the checkpoint files should be read without knowing the codec.
+            with G.Session(graph, checkpoint_file=path) as sess:
+                self.assertEqual(G.get_variable_values(a), 10)
+                self.assertEqual(sess.memo['a'], 100)
+                G.set_variable_values({a: 11})
+                sess.checkpoint()
+                self.assertTrue(is_array_file('%s.v2' % path))
+
+            with G.Session(graph, checkpoint_file=path) as sess:
+                self.assertEqual(G.get_variable_values(a), 11)
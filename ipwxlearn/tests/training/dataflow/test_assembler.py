@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import BatchAssembler, TestingBatchDataFlow, TrainingBatchDataFlow
+
+
+class _Placeholder(object):
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+
+
+class BatchAssemblerTestCase(unittest.TestCase):
+
+    def test_assembler(self):
+        """Test assembling mini-batches into preallocated buffers."""
+        X = np.arange(20, dtype=np.float64).reshape([10, 2])
+        y = np.arange(10, dtype=np.uint8)
+        assembler = BatchAssembler([X, y], batch_size=4, dtypes=[np.float32, _Placeholder('int32')])
+        self.assertEqual(assembler.conversion_count, 2)
+        self.assertEqual([a.dtype for a in assembler.arrays], [np.float32, np.int32])
+
+        bX, by = assembler.take([3, 1, 7, 0])
+        self.assertEqual(assembler.allocation_count, 4)
+        self.assertTrue(bX.flags.c_contiguous)
+        np.testing.assert_array_equal(by, [3, 1, 7, 0])
+        np.testing.assert_array_equal(bX, X[[3, 1, 7, 0]])
+
+        for i in range(10):
+            bX, by = assembler.take([i, (i + 1) % 10])
+            np.testing.assert_array_equal(by, [i, (i + 1) % 10])
+        self.assertEqual(assembler.allocation_count, 4)
+        self.assertEqual(assembler.batch_count, 11)
+
+        with self.assertRaises(IndexError):
+            assembler.take([10])
+        with self.assertRaises(ValueError):
+            assembler.take(np.arange(5))
+
+        # slices of C-contiguous arrays should not be copied.
+        bX, by = assembler.slice(2, 6)
+        self.assertIs(bX.base, assembler.arrays[0])
+
+        # slices of non-contiguous arrays should be copied into buffers.
+        assembler = BatchAssembler([X[:, 0], X[:, 1]], batch_size=4)
+        a, b = assembler.slice(8, 10)
+        self.assertTrue(a.flags.c_contiguous)
+        np.testing.assert_array_equal(a, [16, 18])
+        np.testing.assert_array_equal(b, [17, 19])
+        self.assertEqual(assembler.allocation_count, 4)
+
+    def test_data_flows(self):
+        """Test the data flows with batch assemblers."""
+        X = np.arange(200, dtype=np.float64).reshape([100, 2])
+        y = np.arange(100, dtype=np.uint8)
+
+        flow = TrainingBatchDataFlow([X, y], batch_size=10, reuse_buffers=True, dtypes=['float32', 'int32'])
+        for epoch in range(3):
+            for bX, by in flow.iter_epoch():
+                self.assertEqual((bX.dtype, by.dtype), (np.float32, np.int32))
+                np.testing.assert_array_equal(bX[:, 0] // 2, by)
+        self.assertEqual(flow.assembler.allocation_count, 4)
+        self.assertEqual(flow.assembler.batch_count, 30)
+
+        flow = TestingBatchDataFlow([X, y], batch_size=30, dtypes=['float32', 'int32'])
+        batches = list(flow.iter_epoch())
+        self.assertEqual([len(b[1]) for b in batches], [30, 30, 30, 10])
+        self.assertEqual(batches[0][1].dtype, np.int32)
+        self.assertEqual(flow.assembler.allocation_count, 0)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import (ImageOp, ImageAugmentation, RandomCrop, RandomTranslation, RandomFlip,
+                                         IntensityJitter, Cutout, TestingBatchDataFlow)
+
+
+class _Negate(ImageOp):
+
+    def __call__(self, images, random_state):
+        return -images
+
+
+class ImageAugmentationTestCase(unittest.TestCase):
+
+    def _make_images(self, n=16, h=8, w=10, c=3):
+        return np.arange(n * h * w * c, dtype=np.float32).reshape([n, h, w, c])
+
+    def test_crop_and_translation(self):
+        """Test the random crop and translation."""
+        rs = np.random.RandomState(1234)
+        X = self._make_images()
+        out = RandomCrop(6, 7)(X, rs)
+        self.assertEqual(out.shape, (16, 6, 7, 3))
+        for i in range(len(X)):
+            # each crop should be a window of the corresponding image.
+            found = any(np.array_equal(out[i], X[i, y: y + 6, x: x + 7]) for y in range(3) for x in range(4))
+            self.assertTrue(found)
+
+        out = RandomTranslation(2, 3)(X, rs)
+        self.assertEqual(out.shape, X.shape)
+        padded = np.pad(X, ((0, 0), (2, 2), (3, 3), (0, 0)), mode='constant')
+        for i in range(len(X)):
+            found = any(np.array_equal(out[i], padded[i, y: y + 8, x: x + 10]) for y in range(5) for x in range(7))
+            self.assertTrue(found)
+
+        with self.assertRaises(ValueError):
+            RandomCrop(9, 10)(X, rs)
+        with self.assertRaises(ValueError):
+            RandomCrop(2, 2)(X[0], rs)
+
+    def test_flip_jitter_cutout(self):
+        """Test the random flip, intensity jitter and cutout."""
+        rs = np.random.RandomState(1234)
+        X = self._make_images(n=64)
+        out = RandomFlip(horizontal=True, vertical=True)(X, rs)
+        for i in range(len(X)):
+            self.assertTrue(any(np.array_equal(out[i], f) for f in (X[i], X[i, :, ::-1], X[i, ::-1], X[i, ::-1, ::-1])))
+        self.assertFalse(np.array_equal(out, X))
+
+        out = IntensityJitter(brightness=0., contrast=0.)(X, rs)
+        np.testing.assert_allclose(out, X, rtol=1e-5)
+        images = np.full([4, 2, 2, 1], 250, dtype=np.uint8)
+        out = IntensityJitter(brightness=20., contrast=0.)(images, rs)
+        self.assertEqual(out.dtype, np.uint8)
+        self.assertTrue(np.all(out >= 230))
+
+        out = Cutout(3)(np.ones([32, 8, 8, 2], dtype=np.float32), rs)
+        masked = np.sum(out[..., 0] == 0, axis=(1, 2))
+        self.assertTrue(np.all(masked > 0))
+        self.assertTrue(np.all(masked <= 9))
+        np.testing.assert_array_equal(out[..., 0], out[..., 1])
+
+    def test_augmentation(self):
+        """Test applying the augmentation to a data flow."""
+        X = self._make_images()
+        y = np.arange(16, dtype=np.int32)
+        aug = ImageAugmentation([RandomCrop(8, 10, padding=2), RandomFlip()], random_state=np.random.RandomState(0))
+        flow = aug.apply_to(TestingBatchDataFlow([X, y], batch_size=5))
+        batches = list(flow.iter_epoch())
+        self.assertEqual([len(b[0]) for b in batches], [5, 5, 5, 1])
+        self.assertEqual(batches[0][0].shape[1:], X.shape[1:])
+        np.testing.assert_array_equal(np.concatenate([b[1] for b in batches]), y)
+
+    def test_custom_op(self):
+        """Test applying a custom augmentation operation."""
+        X = self._make_images()
+        aug = ImageAugmentation([_Negate(), RandomFlip(probability=0.)])
+        np.testing.assert_array_equal(aug.augment(X), -X)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import iterate_training_batches, iterate_testing_batches, TrainingBatchDataFlow
+
+
+class BatchIterationTestCase(unittest.TestCase):
+
+    def test_training_batches(self):
+        """Test iterating training batches with various shuffling modes."""
+        X = np.arange(103 * 2, dtype=np.float32).reshape([103, 2])
+        y = np.arange(103, dtype=np.int32)
+
+        batches = list(iterate_training_batches([X, y], 10, shuffle=False))
+        self.assertEqual(len(batches), 10)
+        np.testing.assert_array_equal(np.concatenate([b[1] for b in batches]), y[:100])
+
+        np.random.seed(1234)
+        for shuffle, reuse_buffers in ((True, False), (True, True), ('copy', False)):
+            seen = []
+            for bX, by in iterate_training_batches([X, y], 10, shuffle=shuffle, reuse_buffers=reuse_buffers):
+                self.assertEqual(bX.shape, (10, 2))
+                self.assertEqual(bX.dtype, np.float32)
+                np.testing.assert_array_equal(bX[:, 0] // 2, by)
+                seen.append(np.copy(by))
+            seen = np.concatenate(seen)
+            self.assertEqual(len(np.unique(seen)), 100)
+            self.assertFalse(np.all(seen == y[:100]))
+
+        # buffers should be reused if required.
+        it = iterate_training_batches(X, 10, shuffle=True, reuse_buffers=True)
+        self.assertIs(next(it), next(it))
+        it = iterate_training_batches(X, 10, shuffle=True)
+        self.assertIsNot(next(it), next(it))
+
+        with self.assertRaises(ValueError):
+            list(iterate_training_batches(X, 10, shuffle='unknown'))
+
+    def test_testing_batches(self):
+        """Test iterating testing batches."""
+        y = np.arange(103, dtype=np.int32)
+        batches = list(iterate_testing_batches(y, 10))
+        self.assertEqual([len(b) for b in batches], [10] * 10 + [3])
+        np.testing.assert_array_equal(np.concatenate(batches), y)
+
+    def test_resume_training_batches(self):
+        """Test resuming the training data flow in the middle of an epoch."""
+        y = np.arange(103, dtype=np.int32)
+        for shuffle in (True, False, 'lazy'):
+            flow = TrainingBatchDataFlow(y, 10, shuffle=shuffle)
+            self.assertEqual(flow.get_state(), {'epoch': -1, 'seed': None, 'offset': 0, 'num_examples': 103,
+                                                'batch_size': 10})
+            list(flow.iter_epoch())
+            it = flow.iter_epoch()
+            head = [np.copy(next(it)) for _ in range(4)]
+            state = flow.get_state()
+            self.assertEqual(state['epoch'], 1)
+            self.assertEqual(state['offset'], 4)
+            tail = list(it)
+
+            # a new data flow restored from the state should yield exactly the remaining mini-batches.
+            flow2 = TrainingBatchDataFlow(y, 10, shuffle=shuffle)
+            flow2.set_state(state)
+            resumed = list(flow2.iter_epoch())
+            self.assertEqual(len(resumed), 6)
+            for a, b in zip(resumed, tail):
+                np.testing.assert_array_equal(a, b)
+            np.testing.assert_array_equal(np.sort(np.concatenate(head + resumed)), np.sort(np.concatenate(head + tail)))
+            self.assertEqual(flow2.get_state()['epoch'], 1)
+            list(flow2.iter_epoch())
+            self.assertEqual(flow2.get_state(), {'epoch': 2, 'seed': flow2.get_state()['seed'], 'offset': 10,
+                                                 'num_examples': 103, 'batch_size': 10})
+
+            # resuming from a completed epoch should start the next epoch.
+            flow2.set_state(flow2.get_state())
+            self.assertEqual(len(list(flow2.iter_epoch())), 10)
+            self.assertEqual(flow2.get_state()['epoch'], 3)
+
+            # the state of a data flow with different batch size or number of examples should be rejected.
+            with self.assertRaises(ValueError):
+                TrainingBatchDataFlow(y, 5, shuffle=shuffle).set_state(state)
+            with self.assertRaises(ValueError):
+                TrainingBatchDataFlow(y[:100], 10, shuffle=shuffle).set_state(state)
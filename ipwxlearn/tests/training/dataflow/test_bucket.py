@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import BucketedSequenceDataFlow, tune_bucket_boundaries
+
+
+class BucketedSequenceDataFlowTestCase(unittest.TestCase):
+
+    def test_tune_boundaries(self):
+        """Test tuning bucket boundaries from sequence lengths."""
+        self.assertEqual(tune_bucket_boundaries([5, 5, 5]), [5])
+        self.assertEqual(tune_bucket_boundaries([1, 10], max_pad_fraction=0.1), [1, 10])
+        self.assertEqual(tune_bucket_boundaries([9, 10], max_pad_fraction=0.1), [10])
+        self.assertEqual(tune_bucket_boundaries([10, 9, 1, 2], max_pad_fraction=0.3), [2, 10])
+
+    def test_bucketed_flow(self):
+        """Test iterating bucketed sequences."""
+        np.random.seed(1234)
+        lengths = np.random.randint(1, 50, size=500)
+        sequences = [np.arange(n, dtype=np.int32) + i for i, n in enumerate(lengths)]
+        labels = np.arange(500)
+
+        flow = BucketedSequenceDataFlow(sequences, batch_size=16, arrays=labels, max_pad_fraction=0.1)
+        self.assertEqual(flow.num_examples, 500)
+        self.assertEqual(flow.array_count, 3)
+        self.assertLessEqual(flow.pad_fraction, 0.1)
+        self.assertGreater(len(flow.boundaries), 1)
+
+        seen = []
+        for padded, lens, y in flow.iter_epoch():
+            self.assertEqual(padded.dtype, np.int32)
+            self.assertEqual(padded.shape, (len(y), np.max(lens)))
+            np.testing.assert_array_equal(lens, lengths[y])
+            for row, n, i in zip(padded, lens, y):
+                np.testing.assert_array_equal(row[: n], sequences[i])
+                self.assertTrue(np.all(row[n:] == 0))
+            seen.append(y)
+        self.assertEqual(sorted(np.concatenate(seen)), list(range(500)))
+
+        # test with mask output and specified boundaries.
+        flow = BucketedSequenceDataFlow(sequences, batch_size=16, boundaries=[10, 20], output_mask=True,
+                                        pad_value=-1, ignore_tail=True, shuffle=False)
+        self.assertEqual(flow.boundaries, [10, 20, int(np.max(lengths))])
+        for padded, mask in flow.iter_epoch():
+            self.assertEqual(len(padded), 16)
+            self.assertEqual(mask.shape, padded.shape)
+            self.assertTrue(np.all(padded[~mask] == -1))
+            self.assertTrue(np.all(padded[mask] >= 0))
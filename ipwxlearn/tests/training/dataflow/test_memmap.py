@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import MemmapDataFlow
+from ipwxlearn.utils.tempdir import TemporaryDirectory
+
+
+class MemmapDataFlowTestCase(unittest.TestCase):
+
+    def test_memmap(self):
+        """Test iterating memory-mapped arrays in blocks."""
+        X = np.arange(203 * 3, dtype=np.float32).reshape([203, 3])
+        y = np.arange(203, dtype=np.int32)
+
+        with TemporaryDirectory() as tmpdir:
+            np.save(os.path.join(tmpdir, '0_X.npy'), X)
+            np.save(os.path.join(tmpdir, '1_y.npy'), y)
+
+            # test reading without shuffling.
+            flow = MemmapDataFlow(tmpdir, batch_size=10, shuffle=False, block_size=32, ignore_tail=False)
+            self.assertEqual(flow.num_examples, 203)
+            self.assertEqual(flow.array_count, 2)
+            self.assertIsInstance(flow.arrays[0], np.memmap)
+            batches = list(flow.iter_epoch())
+            self.assertEqual([len(b[0]) for b in batches], [10] * 20 + [3])
+            np.testing.assert_array_equal(np.concatenate([b[0] for b in batches]), X)
+            np.testing.assert_array_equal(np.concatenate([b[1] for b in batches]), y)
+
+            # test reading with shuffling.
+            flow = MemmapDataFlow([os.path.join(tmpdir, '0_X.npy'), y], batch_size=10, block_size=32)
+            batches = list(flow.iter_epoch())
+            self.assertEqual([len(b[0]) for b in batches], [10] * 20)
+            X2 = np.concatenate([b[0] for b in batches])
+            y2 = np.concatenate([b[1] for b in batches])
+            np.testing.assert_array_equal(X2[:, 0] // 3, y2)
+            self.assertEqual(len(np.unique(y2)), 200)
+
+            # test splitting training and validation data flow.
+            train_flow, valid_flow = flow.split(validation_split=0.2, valid_batch_size=50)
+            self.assertEqual(train_flow.num_examples, 162)
+            self.assertEqual(valid_flow.num_examples, 41)
+            self.assertIs(train_flow.arrays[0], flow.arrays[0])
+            train_y = np.concatenate([b[1] for b in train_flow.iter_epoch()])
+            valid_y = np.concatenate([b[1] for b in valid_flow.iter_epoch()])
+            self.assertEqual(len(train_y), 160)
+            self.assertEqual(len(valid_y), 41)
+            self.assertFalse(set(train_y) & set(valid_y))
+
+            train_flow, valid_flow = flow.split(valid_size=40, shuffle=False)
+            self.assertEqual(valid_flow.ranges, [(163, 203)])
+            self.assertEqual(train_flow.ranges, [(0, 163)])
+            del flow, train_flow, valid_flow, batches
+
+    def test_resume(self):
+        """Test resuming the memory-mapped data flow in the middle of an epoch."""
+        X = np.arange(203 * 3, dtype=np.float32).reshape([203, 3])
+        y = np.arange(203, dtype=np.int32)
+
+        for shuffle, ignore_tail in ((True, True), (True, False), (False, False)):
+            flow = MemmapDataFlow([X, y], batch_size=10, shuffle=shuffle, block_size=32, ignore_tail=ignore_tail)
+            list(flow.iter_epoch())
+            it = flow.iter_epoch()
+            head = [next(it) for _ in range(7)]
+            state = flow.get_state()
+            self.assertEqual(state['epoch'], 1)
+            self.assertEqual(state['offset'], 7)
+            tail = list(it)
+            self.assertTrue(flow.is_epoch_completed(flow.get_state()))
+
+            # a new data flow restored from the state should yield exactly the remaining mini-batches.
+            flow2 = MemmapDataFlow([X, y], batch_size=10, shuffle=shuffle, block_size=32, ignore_tail=ignore_tail)
+            flow2.set_state(state)
+            resumed = list(flow2.iter_epoch())
+            self.assertEqual(len(resumed), len(tail))
+            for a, b in zip(resumed, tail):
+                np.testing.assert_array_equal(a[0], b[0])
+                np.testing.assert_array_equal(a[1], b[1])
+            y2 = np.concatenate([b[1] for b in head + resumed])
+            self.assertEqual(len(np.unique(y2)), 203 if not ignore_tail else 200)
+
+            # resuming from a completed epoch should start the next epoch.
+            flow2.set_state(flow2.get_state())
+            self.assertEqual(len(list(flow2.iter_epoch())), len(head) + len(tail))
+            self.assertEqual(flow2.get_state()['epoch'], 2)
+
+            # the state of a data flow with different batch size should be rejected.
+            with self.assertRaises(ValueError):
+                MemmapDataFlow([X, y], batch_size=20, shuffle=shuffle, block_size=32).set_state(state)
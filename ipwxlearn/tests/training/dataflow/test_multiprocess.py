@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import MultiProcessDataFlow, PrefetchDataFlow, TestingBatchDataFlow, \
+    TrainingBatchDataFlow
+
+
+def _add_noise(X, y):
+    return X + np.random.randint(0, 1000, size=X.shape), y
+
+
+_PARENT_PID = os.getpid()
+
+
+def _exit_in_worker(X, y):
+    # kill the worker process without reporting, as if it were killed by the OOM killer.
+    if os.getpid() != _PARENT_PID:
+        os._exit(1)
+    return X, y
+
+
+class MultiProcessDataFlowTestCase(unittest.TestCase):
+
+    def test_ordering(self):
+        """Test the order of mini-batches produced by worker processes."""
+        X = np.arange(100, dtype=np.int64).reshape([50, 2])
+        y = np.arange(50, dtype=np.int32)
+        flow = TestingBatchDataFlow([X, y], batch_size=8)
+        expected = list(flow.iter_epoch())
+
+        for workers in (1, 3):
+            with MultiProcessDataFlow(flow, workers=workers, buffers=2) as mp_flow:
+                self.assertEqual(mp_flow.num_examples, 50)
+                self.assertEqual(mp_flow.array_count, 2)
+                for epoch in range(2):
+                    batches = [tuple(np.copy(a) for a in b) for b in mp_flow.iter_epoch()]
+                    self.assertEqual(len(batches), len(expected))
+                    for b, e in zip(batches, expected):
+                        np.testing.assert_array_equal(b[0], e[0])
+                        np.testing.assert_array_equal(b[1], e[1])
+
+                # the consumer should be able to stop in the middle of an epoch.
+                for i, _ in enumerate(mp_flow.iter_epoch()):
+                    if i >= 2:
+                        break
+                self.assertEqual(len(list(mp_flow.iter_epoch())), len(expected))
+
+    def test_prefetch(self):
+        """Test prefetching the mini-batches held in the shared memory buffers."""
+        X = np.arange(100, dtype=np.int64).reshape([50, 2])
+        y = np.arange(50, dtype=np.int32)
+        flow = TestingBatchDataFlow([X, y], batch_size=8)
+        expected = list(flow.iter_epoch())
+
+        with MultiProcessDataFlow(flow, workers=2, buffers=1) as mp_flow:
+            batches = []
+            for b in PrefetchDataFlow(mp_flow, depth=4).iter_epoch():
+                # a slow consumer, so that the queue would be filled up before the batch is taken.
+                time.sleep(0.01)
+                batches.append(b)
+            self.assertEqual(len(batches), len(expected))
+            for b, e in zip(batches, expected):
+                np.testing.assert_array_equal(b[0], e[0])
+                np.testing.assert_array_equal(b[1], e[1])
+
+    def test_deterministic(self):
+        """Test the mini-batches are deterministic given the seed."""
+        X = np.arange(64, dtype=np.int64).reshape([32, 2])
+        y = np.arange(32, dtype=np.int32)
+        flow = TrainingBatchDataFlow([X, y], batch_size=4)
+
+        def collect(workers):
+            with MultiProcessDataFlow(flow, fn=_add_noise, workers=workers, seed=1234) as mp_flow:
+                return [[tuple(np.copy(a) for a in b) for b in mp_flow.iter_epoch()] for _ in range(2)]
+
+        a, b = collect(1), collect(4)
+        for epoch_a, epoch_b in zip(a, b):
+            self.assertEqual(len(epoch_a), 8)
+            for x, y in zip(epoch_a, epoch_b):
+                np.testing.assert_array_equal(x[0], y[0])
+                np.testing.assert_array_equal(x[1], y[1])
+
+    def test_resume(self):
+        """Test resuming the mini-batches of a data flow in the middle of an epoch."""
+        X = np.arange(64, dtype=np.int64).reshape([32, 2])
+        y = np.arange(32, dtype=np.int32)
+
+        with MultiProcessDataFlow(TrainingBatchDataFlow([X, y], batch_size=4), fn=_add_noise, workers=2,
+                                  seed=1234) as mp_flow:
+            list(mp_flow.iter_epoch())
+            it = mp_flow.iter_epoch()
+            for _ in range(3):
+                next(it)
+            state = mp_flow.get_state()
+            self.assertEqual(state['offset'], 3)
+            self.assertEqual(state['source']['offset'], 3)
+            tail = [tuple(np.copy(a) for a in b) for b in it]
+            self.assertTrue(mp_flow.is_epoch_completed(mp_flow.get_state()))
+
+        # a new data flow restored from the state should yield exactly the remaining mini-batches.
+        with MultiProcessDataFlow(TrainingBatchDataFlow([X, y], batch_size=4), fn=_add_noise, workers=3,
+                                  seed=4321) as mp_flow:
+            mp_flow.set_state(state)
+            resumed = [tuple(np.copy(a) for a in b) for b in mp_flow.iter_epoch()]
+            self.assertEqual(len(resumed), 5)
+            for a, b in zip(resumed, tail):
+                np.testing.assert_array_equal(a[0], b[0])
+                np.testing.assert_array_equal(a[1], b[1])
+
+            # resuming from a completed epoch should start the next epoch.
+            mp_flow.set_state(mp_flow.get_state())
+            self.assertEqual(len(list(mp_flow.iter_epoch())), 8)
+
+    def test_worker_died(self):
+        """Test the death of a worker process is reported instead of blocking forever."""
+        X = np.arange(64, dtype=np.int64).reshape([32, 2])
+        y = np.arange(32, dtype=np.int32)
+        flow = TestingBatchDataFlow([X, y], batch_size=4)
+        with MultiProcessDataFlow(flow, fn=_exit_in_worker, workers=2) as mp_flow:
+            with self.assertRaises(RuntimeError):
+                list(mp_flow.iter_epoch())
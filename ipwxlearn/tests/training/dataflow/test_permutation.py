@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import FeistelPermutation, iterate_training_batches
+
+
+class FeistelPermutationTestCase(unittest.TestCase):
+
+    def test_bijection(self):
+        """Test the permutation is a bijection over [0, n)."""
+        for n in (1, 2, 3, 7, 64, 1000, 12345):
+            perm = FeistelPermutation(n, seed=n)
+            self.assertEqual(len(perm), n)
+            values = perm[:]
+            self.assertEqual(values.dtype, np.int64)
+            np.testing.assert_array_equal(np.sort(values), np.arange(n))
+            self.assertEqual(list(perm), list(values))
+            self.assertEqual(perm[n - 1], values[-1])
+            self.assertEqual(perm[-1], values[-1])
+            np.testing.assert_array_equal(perm[[0, n - 1]], values[[0, n - 1]])
+
+        with self.assertRaises(IndexError):
+            FeistelPermutation(10)[10]
+
+    def test_seed(self):
+        """Test the permutation is determined by the seed."""
+        a = FeistelPermutation(1000, seed=1)
+        b = FeistelPermutation(1000, seed=1)
+        c = FeistelPermutation(1000, seed=2)
+        np.testing.assert_array_equal(a[:], b[:])
+        self.assertFalse(np.all(a[:] == c[:]))
+        self.assertFalse(np.all(a[:] == np.arange(1000)))
+        a.reseed(2)
+        np.testing.assert_array_equal(a[:], c[:])
+
+    def test_iter_batches(self):
+        """Test iterating the permutation in mini-batches."""
+        perm = FeistelPermutation(103, seed=0)
+        batches = list(perm.iter_batches(10))
+        self.assertEqual(len(batches), 10)
+        np.testing.assert_array_equal(np.concatenate(batches), perm[:100])
+
+        # resume from the middle of the permutation.
+        resumed = list(perm.iter_batches(10, start=70, ignore_tail=False))
+        self.assertEqual([len(b) for b in resumed], [10, 10, 10, 3])
+        np.testing.assert_array_equal(np.concatenate(resumed), perm[70:])
+
+        # lazy shuffling for training batches.
+        y = np.arange(103)
+        seen = np.concatenate(list(iterate_training_batches(y, 10, shuffle='lazy')))
+        self.assertEqual(len(np.unique(seen)), 100)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import CachedDataFlow, PipelineDataFlow, TestingBatchDataFlow
+from ipwxlearn.utils.tempdir import TemporaryDirectory
+
+
+class PipelineDataFlowTestCase(unittest.TestCase):
+
+    def test_pipeline(self):
+        """Test chaining lazy transformations."""
+        X = np.arange(20, dtype=np.int32)
+        y = X % 3
+        flow = TestingBatchDataFlow([X, y], batch_size=6)
+
+        calls = []
+
+        def add_one(x, y):
+            calls.append(x)
+            return x + 1, y
+
+        pipeline = flow.map(add_one).map(lambda x, y: (x * 2, y)).batch_map(lambda x, y: (x, y, x + y), array_count=3)
+        pipeline = pipeline.filter(lambda x, y, z: y != 0)
+        self.assertIsInstance(pipeline, PipelineDataFlow)
+        self.assertIs(pipeline.source, flow)
+        self.assertEqual(len(pipeline.stages), 4)
+        self.assertEqual(pipeline.array_count, 3)
+        self.assertEqual(pipeline.num_examples, 20)
+        self.assertEqual(calls, [])
+
+        batches = list(pipeline.iter_epoch())
+        self.assertEqual(len(calls), 20)
+        mask = y != 0
+        np.testing.assert_array_equal(np.concatenate([b[0] for b in batches]), ((X + 1) * 2)[mask])
+        np.testing.assert_array_equal(np.concatenate([b[2] for b in batches]), ((X + 1) * 2 + y)[mask])
+
+        # mini-batches with no example left should not be yielded.
+        self.assertEqual(list(flow.filter(lambda x, y: x < 0).iter_epoch()), [])
+
+    def test_cache(self):
+        """Test caching the mini-batches."""
+        X = np.arange(20, dtype=np.int32)
+        counter = []
+
+        def count(x):
+            counter.append(len(x))
+            return x * 2
+
+        with TemporaryDirectory() as tmpdir:
+            for path in (None, os.path.join(tmpdir, 'cache.npy')):
+                del counter[:]
+                flow = TestingBatchDataFlow(X, batch_size=6).batch_map(count).cache(path=path)
+                self.assertIsInstance(flow, CachedDataFlow)
+
+                # partial epoch should not be cached.
+                next(iter(flow.iter_epoch()))
+                self.assertFalse(flow.is_cached)
+
+                for epoch in range(3):
+                    batches = list(flow.iter_epoch())
+                    np.testing.assert_array_equal(np.concatenate([b[0] for b in batches]), X * 2)
+                self.assertTrue(flow.is_cached)
+                self.assertEqual(sum(counter), 20 + 6)
+                if path is not None:
+                    self.assertTrue(os.path.isfile(path))
+
+                # test shuffling the cached mini-batches.
+                flow.shuffle = True
+                batches = list(flow.iter_epoch())
+                np.testing.assert_array_equal(np.sort(np.concatenate([b[0] for b in batches])), X * 2)
+
+                flow.clear_cache()
+                self.assertFalse(flow.is_cached)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import DataFlow, PrefetchDataFlow, TestingBatchDataFlow, TrainingBatchDataFlow
+
+
+class _BrokenDataFlow(DataFlow):
+
+    def iter_epoch(self):
+        yield (np.arange(3),)
+        raise RuntimeError('broken data flow')
+
+    @property
+    def num_examples(self):
+        return 3
+
+    @property
+    def array_count(self):
+        return 1
+
+
+class PrefetchDataFlowTestCase(unittest.TestCase):
+
+    def test_prefetch(self):
+        """Test prefetching mini-batches in background threads."""
+        X = np.arange(100, dtype=np.int32)
+        y = -X
+        flow = TestingBatchDataFlow([X, y], batch_size=7)
+        expected = list(flow.iter_epoch())
+
+        for depth, workers in ((1, 1), (2, 1), (3, 4)):
+            prefetch = PrefetchDataFlow(flow, depth=depth, workers=workers)
+            self.assertEqual(prefetch.num_examples, 100)
+            self.assertEqual(prefetch.array_count, 2)
+            for epoch in range(2):
+                batches = list(prefetch.iter_epoch())
+                self.assertEqual(len(batches), len(expected))
+                for b, e in zip(batches, expected):
+                    np.testing.assert_array_equal(b[0], e[0])
+                    np.testing.assert_array_equal(b[1], e[1])
+            self.assertEqual(prefetch.wait_count, len(expected) * 2)
+            self.assertGreaterEqual(prefetch.wait_time, prefetch.epoch_wait_time)
+
+            # the consumer should be able to stop in the middle of an epoch.
+            for i, _ in enumerate(prefetch.iter_epoch()):
+                if i >= 3:
+                    break
+
+    def test_reused_buffers(self):
+        """Test prefetching mini-batches of a data flow which reuses its buffers."""
+        flow = TrainingBatchDataFlow(np.arange(100), batch_size=10, shuffle=True, reuse_buffers=True)
+        prefetch = PrefetchDataFlow(flow, depth=4)
+        seen = []
+        for batch in prefetch.iter_epoch():
+            # a slow consumer, so that the queue would be filled up before the batch is taken.
+            time.sleep(0.01)
+            seen.append(batch[0])
+        self.assertEqual(len(seen), 10)
+        np.testing.assert_array_equal(np.sort(np.concatenate(seen)), np.arange(100))
+
+    def test_no_copy(self):
+        """Test the mini-batches of a data flow which does not reuse its buffers are not copied."""
+        flow = TestingBatchDataFlow(np.arange(100), batch_size=10)
+        expected = list(flow.iter_epoch())
+        for batch, e in zip(PrefetchDataFlow(flow, depth=4).iter_epoch(), expected):
+            self.assertTrue(np.may_share_memory(batch[0], flow.arrays[0]))
+            np.testing.assert_array_equal(batch[0], e[0])
+
+    def test_resume(self):
+        """Test the state of prefetching data flow describes the consumed mini-batches."""
+        X = np.arange(100)
+        prefetch = PrefetchDataFlow(TrainingBatchDataFlow(X, batch_size=10, reuse_buffers=True), depth=4)
+        self.assertEqual(prefetch.get_state()['seed'], None)
+        it = prefetch.iter_epoch()
+        head = [next(it) for _ in range(3)]
+        # the wrapped data flow has read ahead, but the state should be that of the consumed mini-batches.
+        time.sleep(0.1)
+        self.assertGreater(prefetch.flow.get_state()['offset'], 3)
+        state = prefetch.get_state()
+        self.assertEqual(state['offset'], 3)
+        tail = list(it)
+        self.assertTrue(prefetch.is_epoch_completed(prefetch.get_state()))
+
+        # a new data flow restored from the state should yield exactly the remaining mini-batches.
+        prefetch2 = PrefetchDataFlow(TrainingBatchDataFlow(X, batch_size=10, reuse_buffers=True), depth=4)
+        prefetch2.set_state(state)
+        resumed = list(prefetch2.iter_epoch())
+        self.assertEqual(len(resumed), 7)
+        for a, b in zip(resumed, tail):
+            np.testing.assert_array_equal(a[0], b[0])
+        np.testing.assert_array_equal(np.sort(np.concatenate([b[0] for b in head + resumed])), X)
+
+    def test_error(self):
+        """Test errors raised in the background threads."""
+        prefetch = PrefetchDataFlow(_BrokenDataFlow())
+        with self.assertRaises(RuntimeError):
+            list(prefetch.iter_epoch())
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+
+import numpy as np
+
+from ipwxlearn.training.dataflow import AliasSampler, ImportanceSamplingDataFlow, SumTreeSampler, \
+    WeightedSamplingDataFlow, build_alias_table
+
+
+def _alias_probabilities(prob, alias):
+    """Get the exact distribution represented by an alias table."""
+    n = len(prob)
+    return (prob + np.bincount(alias, weights=1. - prob, minlength=n)) / n
+
+
+class AliasSamplerTestCase(unittest.TestCase):
+
+    def test_build_alias_table(self):
+        """Test building the alias tables."""
+        rs = np.random.RandomState(1234)
+        for weights in (rs.random_sample(1000), rs.random_sample(1000) ** 8, np.r_[1000., np.ones(999)],
+                        np.r_[np.zeros(10), 1., np.zeros(10)], [1.]):
+            weights = np.asarray(weights)
+            prob, alias = build_alias_table(weights)
+            np.testing.assert_allclose(_alias_probabilities(prob, alias), weights / np.sum(weights), atol=1e-12)
+
+        for weights in ([], [0., 0.], [-1., 2.], [np.nan]):
+            with self.assertRaises(ValueError):
+                build_alias_table(weights)
+
+    def test_build_near_uniform_alias_table(self):
+        """Test building the alias tables of large near-uniform distributions in bounded time."""
+        weights = np.ones(1 << 20)
+        weights[7] = 0.5
+        start_time = time.time()
+        prob, alias = build_alias_table(weights)
+        self.assertLess(time.time() - start_time, 2.)
+        np.testing.assert_allclose(_alias_probabilities(prob, alias), weights / np.sum(weights), atol=1e-12)
+
+        # this is also the case hit by updating a few entries of a sampler with the default block size.
+        sampler = AliasSampler(np.ones(1 << 16))
+        start_time = time.time()
+        sampler.update(np.arange(0, 1 << 16, 256), 0.5)
+        self.assertLess(time.time() - start_time, 2.)
+        start = 4096 * 3
+        prob, alias = sampler._prob[start: start + 4096], sampler._alias[start: start + 4096] - start
+        w = sampler.weights[start: start + 4096]
+        np.testing.assert_allclose(_alias_probabilities(prob, alias), w / np.sum(w), atol=1e-12)
+
+    def test_sampler(self):
+        """Test sampling and updating the weights."""
+        rs = np.random.RandomState(1234)
+        weights = rs.random_sample(1000)
+        sampler = AliasSampler(weights, block_size=64)
+        counts = np.bincount(sampler.sample(200000, random_state=rs), minlength=1000)
+        expected = weights / np.sum(weights) * 200000
+        self.assertLess(np.sum((counts - expected) ** 2 / expected), 1200)   # chi-square with 999 dof
+
+        sampler.update([3, 500, 999], [100., 0., 50.])
+        blocks = sampler._block_weights
+        np.testing.assert_allclose(blocks, [np.sum(sampler.weights[i: i + 64]) for i in range(0, 1000, 64)])
+        counts = np.bincount(sampler.sample(100000, random_state=rs), minlength=1000)
+        self.assertEqual(counts[500], 0)
+        p = sampler.probabilities()
+        self.assertAlmostEqual(counts[3] / 100000., p[3], delta=0.01)
+        self.assertAlmostEqual(counts[999] / 100000., p[999], delta=0.01)
+
+    def test_sum_tree_sampler(self):
+        """Test sampling and updating the weights by a sum-tree."""
+        rs = np.random.RandomState(1234)
+        weights = rs.random_sample(1000)
+        sampler = SumTreeSampler(weights)
+        self.assertEqual(len(sampler), 1000)
+        self.assertAlmostEqual(sampler.total_weight, np.sum(weights))
+        counts = np.bincount(sampler.sample(200000, random_state=rs), minlength=1000)
+        expected = weights / np.sum(weights) * 200000
+        self.assertLess(np.sum((counts - expected) ** 2 / expected), 1200)   # chi-square with 999 dof
+
+        sampler.update([3, 500, 999, 500], [100., 1., 50., 0.])
+        self.assertAlmostEqual(sampler.total_weight, np.sum(sampler.weights))
+        counts = np.bincount(sampler.sample(100000, random_state=rs), minlength=1000)
+        self.assertEqual(counts[500], 0)
+        p = sampler.probabilities()
+        self.assertAlmostEqual(counts[3] / 100000., p[3], delta=0.01)
+        self.assertAlmostEqual(counts[999] / 100000., p[999], delta=0.01)
+
+        # a single entry, and entries with zero weights.
+        np.testing.assert_array_equal(SumTreeSampler([2.]).sample(10, random_state=rs), np.zeros(10))
+        np.testing.assert_array_equal(SumTreeSampler([0., 0., 1., 0., 0.]).sample(10, random_state=rs), [2] * 10)
+        for weights in ([], [0., 0.], [-1., 2.], [np.nan]):
+            with self.assertRaises(ValueError):
+                SumTreeSampler(weights)
+
+    def test_data_flow(self):
+        """Test the weighted and stratified sampling data flow."""
+        X = np.arange(100, dtype=np.int32)
+        y = (X < 10).astype(np.int32)
+        flow = WeightedSamplingDataFlow([X, y], batch_size=20, weights=np.where(y, 9., 1.))
+        self.assertEqual(flow.num_examples, 100)
+        self.assertEqual(flow.array_count, 2)
+        batches = list(flow.iter_epoch())
+        self.assertEqual(len(batches), 5)
+        ratio = np.mean(np.concatenate([b[1] for b in batches]))
+        self.assertGreater(ratio, 0.3)
+
+        flow = WeightedSamplingDataFlow([X, y], batch_size=8, labels=y, class_quotas={0: 5, 1: 3}, epoch_size=80)
+        batches = list(flow.iter_epoch())
+        self.assertEqual(len(batches), 10)
+        for bX, by in batches:
+            self.assertEqual(np.sum(by), 3)
+            np.testing.assert_array_equal(by, bX < 10)
+
+        # updating weights within the classes.
+        flow.update_weights(np.arange(10), [0.] * 9 + [1.])
+        for bX, by in flow.iter_epoch():
+            np.testing.assert_array_equal(bX[by == 1], [9, 9, 9])
+
+        with self.assertRaises(ValueError):
+            WeightedSamplingDataFlow(X, batch_size=8, labels=y, class_quotas={0: 5, 1: 2})
+        with self.assertRaises(ValueError):
+            WeightedSamplingDataFlow(X, batch_size=8, class_quotas={0: 5, 1: 3})
+
+
+class ImportanceSamplingDataFlowTestCase(unittest.TestCase):
+
+    def test_importance_sampling(self):
+        """Test sampling by priorities with unbiased importance weights."""
+        np.random.seed(1234)
+        X = np.arange(1000, dtype=np.int32)
+        losses = np.random.random_sample(1000) ** 4
+        flow = ImportanceSamplingDataFlow(X, batch_size=50, smoothing=0.2, epoch_size=100000)
+        self.assertEqual(flow.array_count, 2)
+        self.assertEqual(flow.num_examples, 100000)
+
+        # initially the sampling is uniform, thus all the importance weights are 1.
+        bX, bw = next(iter(flow.iter_epoch()))
+        self.assertEqual(bw.dtype, np.float32)
+        np.testing.assert_allclose(bw, 1., rtol=1e-5)
+        np.testing.assert_array_equal(flow.last_indices, bX)
+
+        flow.update_priorities(X, losses)
+        p = flow.probabilities()
+        self.assertAlmostEqual(np.sum(p), 1.)
+        self.assertTrue(np.all(p >= 0.2 / 1000 - 1e-12))
+        estimates, hard = [], []
+        for bX, bw in flow.iter_epoch():
+            estimates.append(np.mean(bw * losses[bX]))
+            hard.append(np.mean(losses[bX] > 0.5))
+        # the reweighted losses should be unbiased, while hard examples are drawn more often.
+        self.assertAlmostEqual(np.mean(estimates), np.mean(losses), delta=0.01)
+        self.assertGreater(np.mean(hard), 2 * np.mean(losses > 0.5))
+
+        with self.assertRaises(ValueError):
+            ImportanceSamplingDataFlow(X, batch_size=50, smoothing=1.5)
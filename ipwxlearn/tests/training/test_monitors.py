@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import re
+import unittest
+
+import numpy as np
+import six
+
+from ipwxlearn import glue
+from ipwxlearn.glue import G
+from ipwxlearn.training import TrainingBatchDataFlow, ValidationMonitor, run_steps
+
+
+class ValidationMonitorTestCase(unittest.TestCase):
+
+    @unittest.skipIf(glue.config.backend == 'tensorflow', 'TensorFlow has not supported async validation yet.')
+    def test_async_validation(self):
+        """Test performing the validation on snapshots of parameters in background."""
+        graph = G.Graph()
+        with graph.as_default():
+            x = G.make_placeholder('x', shape=(None,), dtype=glue.config.floatX)
+            w = G.make_variable('w', (), 0., dtype=glue.config.floatX, trainable=True, persistent=True)
+            inc_fn = G.make_function(updates=G.op.assign(w, w + 1.))
+            valid_fn = G.make_function(inputs=x, outputs=G.op.sum(x) + (w - 5.) ** 2)
+
+        def train_fn(x):
+            inc_fn()
+            return 0.
+
+        with G.Session(graph):
+            log_file = six.StringIO()
+            monitor = ValidationMonitor(valid_fn, np.zeros([1], dtype=glue.config.floatX), steps=2,
+                                        log_file=log_file, async_validation=True)
+            flow = TrainingBatchDataFlow(np.zeros([100], dtype=glue.config.floatX), batch_size=10)
+            run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=19)
+
+            # the parameter is (step + 1) after each step, and the best one is found at step 4.
+            results = re.findall(r'Step (\d+): .* valid loss ([^;]+);', log_file.getvalue())
+            self.assertEqual([int(s) for s, _ in results], list(range(2, 20, 2)))
+            for s, loss in results:
+                self.assertAlmostEqual(float(loss), (int(s) - 4) ** 2, places=5)
+            self.assertAlmostEqual(float(G.get_variable_values(w)), 5.)
+
+    def test_progressive_validation(self):
+        """Test terminating the validation passes early, without changing the best parameters."""
+        np.random.seed(1234)
+        valid_X = np.random.normal(size=[2000]).astype(glue.config.floatX)
+
+        def train(progressive):
+            graph = G.Graph()
+            with graph.as_default():
+                x = G.make_placeholder('x', shape=(None,), dtype=glue.config.floatX)
+                w = G.make_variable('w', (), 3., dtype=glue.config.floatX, trainable=True, persistent=True)
+                dec_fn = G.make_function(updates=G.op.assign(w, w - 0.1))
+                valid_fn = G.make_function(inputs=x, outputs=G.op.mean((x - w) ** 2))
+
+            def train_fn(x):
+                dec_fn()
+                return 0.
+
+            with G.Session(graph):
+                monitor = ValidationMonitor(valid_fn, valid_X, steps=1, validation_batch=50,
+                                            progressive_validation=progressive)
+                flow = TrainingBatchDataFlow(np.zeros([100], dtype=glue.config.floatX), batch_size=10)
+                run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=59)
+                return float(G.get_variable_values(w)), monitor.validated_fraction
+
+        w, fraction = train(False)
+        self.assertEqual(fraction, 1.)
+        progressive_w, progressive_fraction = train(True)
+        self.assertEqual(progressive_w, w)
+        self.assertLess(progressive_fraction, 0.8)
+
+    def test_progressive_validation_batch_order(self):
+        """Test the random order of progressive validation does not affect the order of training batches."""
+        train_X = np.arange(100, dtype=glue.config.floatX)
+        valid_X = np.random.normal(size=[2000]).astype(glue.config.floatX)
+
+        def train(progressive):
+            batches = []
+
+            def train_fn(x):
+                batches.append(np.copy(x))
+                return float(np.mean(x))
+
+            graph = G.Graph()
+            with G.Session(graph):
+                np.random.seed(1234)
+                monitor = ValidationMonitor(lambda x: float(np.mean(x ** 2)), valid_X, params=[], steps=1,
+                                            validation_batch=50, progressive_validation=progressive)
+                flow = TrainingBatchDataFlow(train_X, batch_size=10, shuffle=True)
+                run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=29)
+            return np.asarray(batches)
+
+        batches = train(False)
+        self.assertEqual(batches.shape, (30, 10))
+        np.testing.assert_array_equal(train(True), batches)
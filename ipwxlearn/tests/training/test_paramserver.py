@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import os
+import socket
+import threading
+import time
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from ipwxlearn import glue
+from ipwxlearn.glue import G
+from ipwxlearn.models.optimizers import SGDOptimizer
+from ipwxlearn.training.paramserver import (ParameterServer, ParameterServerWorker, _ACK, _FLAG_FLOAT16, _PUSH,
+                                            _decode_message, _encode_message, _send_message)
+
+
+class WireFormatTestCase(unittest.TestCase):
+
+    def test_roundtrip(self):
+        """Test encoding and decoding the messages."""
+        arrays = OrderedDict([
+            ('layer/W', np.random.normal(size=[3, 4]).astype(np.float32)),
+            ('layer/b', np.arange(4, dtype=np.float64)),
+            (u'计数', np.asarray(7, dtype=np.int64)),
+        ])
+        parts = _encode_message(_PUSH, 12, 0.5, arrays)
+        payload = b''.join(parts[1:])
+        self.assertEqual(len(payload), np.frombuffer(parts[0], dtype='>u8')[0])
+        kind, flags, version, value, decoded = _decode_message(bytearray(payload))
+        self.assertEqual((kind, flags, version, value), (_PUSH, 0, 12, 0.5))
+        self.assertEqual(list(decoded), list(arrays))
+        for k, v in arrays.items():
+            self.assertEqual(decoded[k].dtype, v.dtype)
+            np.testing.assert_array_equal(decoded[k], v)
+
+        # the floating-point arrays are compressed to float16, while the integer arrays are kept.
+        payload = b''.join(_encode_message(_PUSH, 12, 0.5, arrays, flags=_FLAG_FLOAT16)[1:])
+        _, flags, _, _, decoded = _decode_message(bytearray(payload))
+        self.assertEqual(flags, _FLAG_FLOAT16)
+        self.assertEqual(decoded['layer/W'].dtype, np.float16)
+        self.assertEqual(decoded[u'计数'].dtype, np.int64)
+        np.testing.assert_allclose(decoded['layer/W'], arrays['layer/W'], rtol=1e-3, atol=1e-3)
+
+        with self.assertRaises(TypeError):
+            _encode_message(_PUSH, arrays={'x': np.zeros([2], dtype=np.complex64)})
+
+
+@unittest.skipIf(glue.config.backend == 'tensorflow', 'TensorFlow sessions cannot be used in forked processes.')
+class ParameterServerTestCase(unittest.TestCase):
+
+    def test_training(self):
+        """Test training with a worker in another process."""
+        center = np.asarray([-1., 0., 1.], dtype=glue.config.floatX)
+        X = (center + 0.01 * np.random.normal(size=[40, 3])).astype(glue.config.floatX)
+        w0 = np.asarray([1., 2., 3.], dtype=glue.config.floatX)
+
+        graph = G.Graph()
+        with graph.as_default():
+            w = G.make_variable('w', (3,), w0, dtype=glue.config.floatX, trainable=True, persistent=True)
+            server = ParameterServer(SGDOptimizer(learning_rate=0.1), max_staleness=0)
+
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                worker_graph = G.Graph()
+                with worker_graph.as_default():
+                    worker_x = G.make_placeholder('x', shape=(None, 3), dtype=glue.config.floatX)
+                    worker_w = G.make_variable('w', (3,), np.zeros([3]), dtype=glue.config.floatX, trainable=True,
+                                               persistent=True)
+                    worker_loss = G.op.mean(G.op.sum((worker_x - worker_w) ** 2, axis=1))
+                    worker = ParameterServerWorker(server.address, worker_loss, worker_x, float16=True)
+                with G.Session(worker_graph):
+                    worker.run(X, batch_size=5)
+                exit_code = 0 if worker.stopped else 2
+            finally:
+                os._exit(exit_code)
+
+        with G.Session(graph):
+            server.serve(max_steps=100, batch_size=5)
+            np.testing.assert_allclose(G.get_variable_values(w), center, atol=0.05)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertEqual(server.version, 101)
+        self.assertEqual(server.rejected_count, 0)
+
+    def test_idle_timeout(self):
+        """Test the server stops when no worker has connected, or all the workers have gone."""
+        graph = G.Graph()
+        with graph.as_default():
+            G.make_variable('w', (3,), np.zeros([3]), dtype=glue.config.floatX, trainable=True, persistent=True)
+            server = ParameterServer(SGDOptimizer(learning_rate=0.1))
+        with G.Session(graph):
+            start_time = time.time()
+            server.serve(max_steps=100, idle_timeout=0.5)
+            self.assertGreaterEqual(time.time() - start_time, 0.5)
+        self.assertEqual(server.version, 0)
+
+    def test_unexpected_message(self):
+        """Test the connection is dropped if an unexpected kind of message is received."""
+        graph = G.Graph()
+        with graph.as_default():
+            G.make_variable('w', (3,), np.zeros([3]), dtype=glue.config.floatX, trainable=True, persistent=True)
+            server = ParameterServer(SGDOptimizer(learning_rate=0.1))
+        replies = []
+
+        def client():
+            sock = socket.create_connection(server.address)
+            try:
+                _send_message(sock, _encode_message(_ACK))
+                replies.append(sock.recv(1))
+            finally:
+                sock.close()
+
+        thread = threading.Thread(target=client)
+        thread.daemon = True
+        thread.start()
+        with G.Session(graph):
+            server.serve(max_steps=100, idle_timeout=0.5)
+        thread.join(10)
+        self.assertEqual(replies, [b''])
+        self.assertEqual(server.version, 0)
+
+    def test_mismatched_gradient(self):
+        """Test the connection is dropped if the pushed gradient does not match the parameters."""
+        graph = G.Graph()
+        with graph.as_default():
+            w = G.make_variable('w', (3,), np.zeros([3]), dtype=glue.config.floatX, trainable=True, persistent=True)
+            server = ParameterServer(SGDOptimizer(learning_rate=0.1))
+        name = graph.get_variable_info(w).full_name
+        pushes = [
+            OrderedDict([('unknown', np.ones([3], dtype=np.float32))]),
+            OrderedDict([(name, np.ones([4], dtype=np.float32))]),
+            OrderedDict([(name, np.ones([3], dtype=np.float32)), ('unknown', np.ones([3], dtype=np.float32))]),
+        ]
+        replies = []
+
+        def client(arrays):
+            sock = socket.create_connection(server.address)
+            try:
+                _send_message(sock, _encode_message(_PUSH, arrays=arrays))
+                replies.append(sock.recv(1))
+            finally:
+                sock.close()
+
+        threads = [threading.Thread(target=client, args=(arrays,)) for arrays in pushes]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        with G.Session(graph):
+            server.serve(max_steps=100, idle_timeout=0.5)
+            np.testing.assert_array_equal(G.get_variable_values(w), np.zeros([3]))
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(replies, [b''] * 3)
+        self.assertEqual(server.version, 0)
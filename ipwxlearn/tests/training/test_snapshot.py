@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ipwxlearn import glue
+from ipwxlearn.glue import G
+from ipwxlearn.training import ParameterSnapshotStore
+
+
+class ParameterSnapshotStoreTestCase(unittest.TestCase):
+
+    def _check_store(self, mmap_dir):
+        a0 = np.arange(6).reshape([2, 3]).astype(glue.config.floatX)
+        graph = G.Graph()
+        with graph.as_default():
+            a = G.make_variable('a', (2, 3), a0, dtype=glue.config.floatX, trainable=True)
+            b = G.make_variable('b', (), 3., dtype=glue.config.floatX, trainable=True)
+
+        with G.Session(graph):
+            store = ParameterSnapshotStore([a, b], mmap_dir=mmap_dir)
+            self.assertIsNone(store.front)
+            with self.assertRaises(ValueError):
+                store.restore()
+
+            store.capture()
+            front = store.commit()
+            self.assertEqual(sorted(front), ['a', 'b'])
+
+            # capturing another snapshot must not touch the committed one.
+            G.set_variable_values({a: a0 + 10, b: 7.})
+            store.capture()
+            np.testing.assert_array_equal(front['a'], a0)
+            self.assertEqual(front['b'], 3.)
+
+            # the snapshots could be pickled as the values in the session memo.
+            values = pickle.loads(pickle.dumps(front))
+            self.assertIsInstance(values['a'], np.ndarray)
+            np.testing.assert_array_equal(values['a'], a0)
+
+            store.restore()
+            np.testing.assert_array_equal(G.get_variable_values(a), a0)
+            self.assertEqual(G.get_variable_values(b), 3.)
+
+            # the uncommitted snapshot could also be restored, and committed later.
+            store.restore(store.capture())
+            front = store.commit()
+            np.testing.assert_array_equal(front['a'], a0)
+            store.load({'a': a0 * 2, 'b': 5.})
+            store.restore()
+            np.testing.assert_array_equal(G.get_variable_values(a), a0 * 2)
+            store.close()
+
+    def test_in_memory(self):
+        self._check_store(None)
+
+    def test_memory_mapped(self):
+        path = tempfile.mkdtemp()
+        try:
+            self._check_store(path)
+            # the temporary file should be removed from the directory as soon as it is mapped.
+            self.assertEqual(os.listdir(path), [])
+        finally:
+            shutil.rmtree(path)
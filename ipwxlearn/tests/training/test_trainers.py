@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import numpy as np
+
+from ipwxlearn import glue
+from ipwxlearn.glue import G
+from ipwxlearn.models.optimizers import AdamOptimizer, SGDOptimizer
+from ipwxlearn.training import Monitor
+from ipwxlearn.training.trainers import DataParallelTrainer, HogwildTrainer, LossTrainer
+from ipwxlearn.training.utils import _GLOBAL_STEP_KEY
+from ipwxlearn.utils.concurrent import get_fork_context
+
+
+def _build_graph(w0):
+    """Build a graph with the loss of fitting the variable `w` to the examples."""
+    graph = G.Graph()
+    with graph.as_default():
+        x = G.make_placeholder('x', shape=(None, 3), dtype=glue.config.floatX)
+        w = G.make_variable('w', (3,), w0, dtype=glue.config.floatX, trainable=True, persistent=True)
+        example_loss = G.op.sum((x - w) ** 2, axis=1)
+        loss = G.op.mean(example_loss)
+    return graph, x, w, loss, example_loss
+
+
+class LossTrainerTestCase(unittest.TestCase):
+
+    def test_accumulate_steps(self):
+        """Test applying the gradients accumulated over several mini-batches."""
+        X = np.random.normal(size=[20, 3]).astype(glue.config.floatX)
+        w0 = np.asarray([1., 2., 3.], dtype=glue.config.floatX)
+
+        graph, x, w, loss, _ = _build_graph(w0)
+        with graph.as_default():
+            trainer = LossTrainer(optimizer=SGDOptimizer(learning_rate=0.1), batch_size=5, max_epoch=1,
+                                  early_stopping=False, validation_steps=100, verbose=False, accumulate_steps=4)
+            trainer.set_loss(loss, [w], x)
+
+        with G.Session(graph):
+            trainer.fit(X)
+            # the 4 mini-batches of the first epoch are applied as one batch, while the gradient of the
+            # extra mini-batch run by `run_steps` is left in the buffers.
+            expected = w0 - 0.1 * 2. * (w0 - np.mean(X, axis=0))
+            np.testing.assert_allclose(G.get_variable_values(w), expected, rtol=1e-5)
+
+    def test_trainers_in_same_graph(self):
+        """Test setting the loss of several trainers with backend variables in the same graph."""
+        X = np.random.normal(size=[20, 3]).astype(glue.config.floatX)
+        w0 = np.asarray([1., 2., 3.], dtype=glue.config.floatX)
+
+        graph, x, w, loss, _ = _build_graph(w0)
+        with graph.as_default():
+            trainers = []
+            for i in range(2):
+                trainer = LossTrainer(optimizer=SGDOptimizer(learning_rate=0.1), batch_size=5, max_epoch=1,
+                                      early_stopping=False, validation_steps=100, verbose=False,
+                                      accumulate_loss=True, accumulate_steps=2)
+                trainer.set_loss(loss, [w], x)
+                accumulator = trainer._loss_accumulator
+                # setting the loss again should reuse the loss accumulator.
+                trainer.set_loss(loss, [w], x)
+                self.assertIs(trainer._loss_accumulator, accumulator)
+                trainers.append(trainer)
+
+        with G.Session(graph):
+            for trainer in trainers:
+                trainer.fit(X)
+
+    def test_steps_per_call(self):
+        """Test running several training steps in each call to the training function."""
+        X = np.random.normal(size=[20, 3]).astype(glue.config.floatX)
+        w0 = np.asarray([1., 2., 3.], dtype=glue.config.floatX)
+
+        def train(optimizer, steps_per_call):
+            graph, x, w, loss, _ = _build_graph(w0)
+            with graph.as_default():
+                trainer = LossTrainer(optimizer=optimizer, batch_size=5, max_epoch=2, early_stopping=False,
+                                      validation_steps=100, verbose=False, steps_per_call=steps_per_call)
+                trainer.set_loss(loss, [w], x)
+            with G.Session(graph):
+                # the same seed leads to the same order of mini-batches.
+                np.random.seed(1234)
+                trainer.fit(X)
+                return G.get_variable_values(w)
+
+        np.testing.assert_allclose(train(SGDOptimizer(learning_rate=0.1), 4),
+                                   train(SGDOptimizer(learning_rate=0.1), 1), rtol=1e-5)
+        if glue.config.backend == 'tensorflow':
+            with self.assertRaises(NotImplementedError):
+                train(AdamOptimizer(learning_rate=0.1), 4)
+        else:
+            np.testing.assert_allclose(train(AdamOptimizer(learning_rate=0.1), 4),
+                                       train(AdamOptimizer(learning_rate=0.1), 1), rtol=1e-5)
+
+    def test_importance_sampling(self):
+        """Test training on importance-sampled mini-batches with reweighted losses."""
+        X = np.random.normal(size=[20, 3]).astype(glue.config.floatX)
+        w0 = np.asarray([1., 2., 3.], dtype=glue.config.floatX)
+
+        graph, x, w, loss, example_loss = _build_graph(w0)
+        with graph.as_default():
+            # the parameters are kept unchanged, so that the per-example losses are known.
+            trainer = LossTrainer(optimizer=SGDOptimizer(learning_rate=0.), batch_size=5, max_epoch=2,
+                                  early_stopping=False, validation_steps=100, verbose=False, importance_sampling=True)
+            trainer.set_loss(loss, [w], x, example_loss=example_loss)
+
+        # record the arguments and the losses of each call to the training function.
+        calls = []
+        train_fn = trainer._train_fn
+
+        def recording_train_fn(x, weight):
+            ret = train_fn(x, weight)
+            calls.append((np.copy(x), np.copy(weight), ret[0], np.copy(trainer._train_flow.last_indices)))
+            return ret
+        trainer._train_fn = recording_train_fn
+
+        with G.Session(graph):
+            trainer.fit(X)
+
+        example_losses = np.sum((X - w0) ** 2, axis=1)
+        self.assertGreater(len(calls), 0)
+        for batch_x, weight, batch_loss, indices in calls:
+            np.testing.assert_allclose(batch_x, X[indices])
+            np.testing.assert_allclose(batch_loss, np.mean(weight * example_losses[indices]), rtol=1e-5)
+        # the priorities should have become different, so the later mini-batches should be reweighted.
+        self.assertTrue(any(np.any(np.abs(weight - 1.) > 1e-3) for _, weight, _, _ in calls))
+
+        # the priorities of the sampled examples should have been updated from their losses.
+        sampled = np.unique(np.concatenate([indices for _, _, _, indices in calls]))
+        priorities = trainer._train_flow.sampler.weights
+        np.testing.assert_allclose(priorities[sampled], example_losses[sampled] + 1e-6, rtol=1e-5)
+
+
+@unittest.skipIf(glue.config.backend == 'tensorflow', 'TensorFlow has not supported data parallel training yet.')
+class DataParallelTrainerTestCase(unittest.TestCase):
+
+    def test_fit(self):
+        """Test averaging the gradients of the workers."""
+        X = np.random.normal(size=[20, 3]).astype(glue.config.floatX)
+        w0 = np.asarray([1., 2., 3.], dtype=glue.config.floatX)
+
+        graph, x, w, loss, _ = _build_graph(w0)
+        with graph.as_default():
+            # each of the 4 workers has a shard of 5 examples, which is also the batch size.
+            trainer = DataParallelTrainer(optimizer=SGDOptimizer(learning_rate=0.1), batch_size=5, max_epoch=1,
+                                          early_stopping=False, validation_steps=100, verbose=False, workers=4)
+            trainer.set_loss(loss, [w], x)
+
+        with G.Session(graph):
+            # the maximum steps is 20 / 5 / 4 = 1, thus `run_steps` would run 2 steps.
+            trainer.fit(X)
+            w1 = w0 - 0.1 * 2. * (w0 - np.mean(X, axis=0))
+            expected = w1 - 0.1 * 2. * (w1 - np.mean(X, axis=0))
+            np.testing.assert_allclose(G.get_variable_values(w), expected, rtol=1e-5)
+
+    def test_worker_died(self):
+        """Test the death of a worker process is reported instead of blocking forever."""
+        X = np.random.normal(size=[20, 3]).astype(glue.config.floatX)
+
+        graph, x, w, loss, _ = _build_graph(np.zeros([3]))
+        with graph.as_default():
+            trainer = DataParallelTrainer(optimizer=SGDOptimizer(learning_rate=0.1), batch_size=5, max_epoch=1,
+                                          early_stopping=False, validation_steps=100, verbose=False, workers=2)
+            trainer.set_loss(loss, [w], x)
+
+        # kill the worker process without reporting, as if it were killed by the OOM killer.
+        grad_fn = trainer._grad_fn
+        parent_pid = os.getpid()
+
+        def killing_grad_fn(*args):
+            if os.getpid() != parent_pid:
+                os._exit(1)
+            return grad_fn(*args)
+        trainer._grad_fn = killing_grad_fn
+
+        with G.Session(graph):
+            with self.assertRaises(RuntimeError):
+                trainer.fit(X)
+
+
+@unittest.skipIf(glue.config.backend == 'tensorflow', 'TensorFlow has not supported Hogwild training yet.')
+class HogwildTrainerTestCase(unittest.TestCase):
+
+    def test_fit(self):
+        """Test training with asynchronous workers on shared parameters."""
+        center = np.asarray([-1., 0., 1.], dtype=glue.config.floatX)
+        X = (center + 0.01 * np.random.normal(size=[40, 3])).astype(glue.config.floatX)
+        w0 = np.asarray([1., 2., 3.], dtype=glue.config.floatX)
+
+        graph, x, w, loss, _ = _build_graph(w0)
+        with graph.as_default():
+            trainer = HogwildTrainer(optimizer=SGDOptimizer(learning_rate=0.1), batch_size=5, max_epoch=25,
+                                     early_stopping=False, validation_steps=100, verbose=False, workers=2)
+            trainer.set_loss(loss, [w], x)
+
+        with G.Session(graph):
+            trainer.fit(X)
+            np.testing.assert_allclose(G.get_variable_values(w), center, atol=0.05)
+
+    def test_shared_params(self):
+        """Test the parameters are stored at aligned addresses of the shared memory block."""
+        graph = G.Graph()
+        with graph.as_default():
+            x = G.make_placeholder('x', shape=(None, 3), dtype='float64')
+            b = G.make_variable('b', (3,), np.arange(3, dtype=np.float32), dtype='float32', trainable=True)
+            w = G.make_variable('w', (3,), np.arange(3, 6, dtype=np.float64), dtype='float64', trainable=True)
+            loss = G.op.mean(G.op.sum((x - w) ** 2, axis=1)) + G.op.sum(b ** 2)
+            trainer = HogwildTrainer(optimizer=SGDOptimizer(learning_rate=0.1), batch_size=5, verbose=False)
+            trainer.set_loss(loss, [b, w], x)
+
+        with G.Session(graph):
+            views = trainer._make_shared_params(get_fork_context())
+            for view, param, expected in zip(views, [b, w], [np.arange(3), np.arange(3, 6)]):
+                self.assertEqual(view.ctypes.data % 64, 0)
+                np.testing.assert_array_equal(view, expected)
+                self.assertTrue(np.may_share_memory(param.get_value(borrow=True, return_internal_type=True), view))
+
+    def test_resume(self):
+        """Test the global step counter is restored from and written to the session memo."""
+        X = np.random.normal(size=[40, 3]).astype(glue.config.floatX)
+
+        class StepRecorder(Monitor):
+            def start_training(self, G, batch_size, steps_in_epoch, max_steps, initial_step=0):
+                self.initial_step = initial_step
+                self.steps = []
+
+            def end_step(self, step, loss):
+                self.steps.append(step)
+
+        graph, x, w, loss, _ = _build_graph(np.zeros([3]))
+        with graph.as_default():
+            trainer = HogwildTrainer(optimizer=SGDOptimizer(learning_rate=0.1), batch_size=5, max_epoch=2,
+                                     early_stopping=False, validation_steps=100, verbose=False, workers=2)
+            trainer.set_loss(loss, [w], x)
+        recorder = StepRecorder()
+        trainer.add_monitor(recorder)
+
+        with G.Session(graph) as session:
+            # the maximum steps is 40 * 2 / 5 = 16, which is reached after 17 steps.
+            trainer.fit(X)
+            self.assertEqual(recorder.initial_step, 0)
+            self.assertEqual(recorder.steps, list(range(17)))
+            self.assertEqual(session.memo[_GLOBAL_STEP_KEY], 17)
+
+            # resume from a checkpoint saved at the end of step 9.
+            session.memo[_GLOBAL_STEP_KEY] = 10
+            trainer.fit(X)
+            self.assertEqual(recorder.initial_step, 10)
+            self.assertEqual(recorder.steps, list(range(10, 17)))
+            self.assertEqual(session.memo[_GLOBAL_STEP_KEY], 17)
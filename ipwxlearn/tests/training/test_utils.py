@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import six
+
+from ipwxlearn.glue import G
+from ipwxlearn.training import LossAccumulator, Monitor, ProfilerMonitor, TrainingBatchDataFlow, run_steps
+
+
+class _StepRecorder(Monitor):
+
+    def __init__(self):
+        self.steps = []
+        self.losses = []
+
+    def start_step(self, step):
+        self.steps.append(step)
+
+    def end_step(self, step, loss):
+        self.losses.append(loss)
+
+
+class _EpochRecorder(_StepRecorder):
+
+    def __init__(self, stop_step=None):
+        super(_EpochRecorder, self).__init__()
+        self.epochs = []
+        self.stop_step = stop_step
+
+    def start_epoch(self, epoch):
+        self.epochs.append(epoch)
+
+    @property
+    def is_inducing_stopping(self):
+        return self.stop_step is not None and bool(self.steps) and self.steps[-1] >= self.stop_step
+
+
+class RunStepsTestCase(unittest.TestCase):
+
+    def test_resume_at_end_of_epoch(self):
+        """Test resuming the training stopped at the last step of an epoch."""
+        X = np.arange(100, dtype=np.float32)
+        batches = []
+
+        def train_fn(x):
+            batches.append(np.copy(x))
+            return np.mean(x)
+
+        graph = G.Graph()
+        with G.Session(graph):
+            monitor = _EpochRecorder(stop_step=9)
+            flow = TrainingBatchDataFlow(X, batch_size=10, shuffle=False)
+            run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=25)
+            self.assertEqual(monitor.epochs, [0])
+            self.assertEqual(monitor.steps, list(range(10)))
+
+            # resume with a new data flow, as if the session were restored from a checkpoint at the last step.
+            monitor = _EpochRecorder()
+            flow = TrainingBatchDataFlow(X, batch_size=10, shuffle=False)
+            run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=25)
+            self.assertEqual(monitor.epochs, [1, 2])
+            self.assertEqual(monitor.steps, list(range(10, 26)))
+            np.testing.assert_array_equal(batches[10], X[:10])
+
+    def test_run_twice(self):
+        """Test running the training twice in one session, with data flows of different sizes."""
+        X = np.arange(100, dtype=np.float32)
+        batches = []
+
+        def train_fn(x):
+            batches.append(np.copy(x))
+            return np.mean(x)
+
+        graph = G.Graph()
+        with G.Session(graph):
+            monitor = _EpochRecorder()
+            flow = TrainingBatchDataFlow(X, batch_size=10, shuffle=False)
+            run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=4)
+            self.assertEqual(monitor.epochs, [0])
+
+            # the second call should start a fresh epoch, instead of resuming the position of the first data flow.
+            monitor = _EpochRecorder()
+            flow = TrainingBatchDataFlow(X[:60], batch_size=10, shuffle=False)
+            run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=9)
+            self.assertEqual(monitor.epochs, [1])
+            self.assertEqual(monitor.steps, list(range(5, 10)))
+            np.testing.assert_array_equal(batches[5], X[:10])
+
+            # so should it with a data flow of the same size.
+            monitor = _EpochRecorder()
+            flow = TrainingBatchDataFlow(X[:60], batch_size=10, shuffle=False)
+            run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=11)
+            self.assertEqual(monitor.epochs, [2])
+            np.testing.assert_array_equal(batches[10], X[:10])
+
+    def test_steps_per_call(self):
+        """Test running several training steps in each call to the training function."""
+        X = np.arange(100, dtype=np.float32)
+        calls = []
+
+        def train_fn(x):
+            calls.append(x.shape)
+            return np.mean(x, axis=-1)
+
+        graph = G.Graph()
+        with G.Session(graph):
+            monitor = _StepRecorder()
+            flow = TrainingBatchDataFlow(X, batch_size=10, shuffle=False)
+            run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=24, steps_per_call=4)
+
+        # each epoch has 10 mini-batches, which are grouped into 4 + 4 + 2, and the last group is limited
+        # by the maximum steps.
+        self.assertEqual(calls, [(4, 10), (4, 10), (2, 10), (4, 10), (4, 10), (2, 10), (4, 10), (1, 10)])
+        self.assertEqual(monitor.steps, list(range(25)))
+        expected = np.concatenate([np.mean(X.reshape([10, 10]), axis=1)] * 3)[:25]
+        np.testing.assert_allclose(monitor.losses, expected)
+
+    def test_loss_accumulator(self):
+        """Test running training steps with the losses accumulated on the device."""
+        X = np.arange(100, dtype=np.float32)
+
+        graph = G.Graph()
+        with graph.as_default():
+            x = G.make_placeholder('x', shape=(None,), dtype=np.float32)
+            accumulator = LossAccumulator()
+            train_fn = G.make_function(inputs=x, updates=accumulator.get_updates(G.op.mean(x)))
+
+        with G.Session(graph):
+            monitor = _StepRecorder()
+            mark = accumulator.mark()
+            flow = TrainingBatchDataFlow(X, batch_size=10, shuffle=False)
+            run_steps(G, train_fn, flow, monitor=monitor, batch_size=10, max_steps=14,
+                      loss_accumulator=accumulator)
+
+            self.assertEqual(monitor.steps, list(range(15)))
+            self.assertEqual(monitor.losses, [None] * 15)
+            expected = np.concatenate([np.mean(X.reshape([10, 10]), axis=1)] * 2)[:15]
+            avg_loss, mark = accumulator.average_since(mark)
+            self.assertAlmostEqual(avg_loss, np.mean(expected), places=5)
+            self.assertEqual(mark[1], 15)
+            self.assertEqual(accumulator.average_since(mark), (None, mark))
+
+    def test_profiler(self):
+        """Test profiling the phases of training steps."""
+        X = np.arange(100, dtype=np.float32)
+
+        class ValidMonitor(Monitor):
+            phase_name = 'validation'
+
+        graph = G.Graph()
+        with G.Session(graph):
+            log_file = six.StringIO()
+            trace_file = os.path.join(tempfile.mkdtemp(), 'trace.json')
+            try:
+                profiler = ProfilerMonitor(log_file, steps=10, trace_file=trace_file)
+                flow = TrainingBatchDataFlow(X, batch_size=10, shuffle=False)
+                run_steps(G, lambda x: np.mean(x, axis=-1), flow, monitor=[ValidMonitor(), profiler], batch_size=10,
+                          max_steps=24, steps_per_call=4)
+                with open(trace_file) as f:
+                    trace = json.load(f)
+            finally:
+                shutil.rmtree(os.path.dirname(trace_file))
+
+        log = log_file.getvalue()
+        self.assertIn('Step 10: profile of 11 steps', log)
+        self.assertIn('Training: profile of 25 steps', log)
+        for phase in ('data', 'train', 'validation', 'other'):
+            self.assertIn('\n  %s ' % phase, log)
+
+        # the groups of 4 + 4 + 2 mini-batches are fetched and trained by 8 calls, and each step is validated.
+        events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        self.assertEqual(sum(e['name'] == 'data' for e in events), 8)
+        self.assertEqual([e['args']['step'] for e in events if e['name'] == 'train'], [0, 4, 8, 10, 14, 18, 20, 24])
+        self.assertEqual(sum(e['name'] == 'validation' for e in events), 25)
+        self.assertTrue(all(e['dur'] >= 0 for e in events))
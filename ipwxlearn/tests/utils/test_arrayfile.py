@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import pickle
+import unittest
+
+import numpy as np
+
+from ipwxlearn.utils.arrayfile import ArrayFile, ARRAY_FILE_ALIGNMENT, is_array_file, save_array_file
+from ipwxlearn.utils.tempdir import TemporaryDirectory
+
+
+class ArrayFileTestCase(unittest.TestCase):
+
+    def _make_arrays(self):
+        return {
+            'a/W': np.random.normal(size=[3, 5]).astype(np.float32),
+            'a/b': np.float64(3.),
+            'empty': np.arange(0, dtype=np.int64),
+            'fortran': np.asfortranarray(np.arange(12).reshape([3, 4])),
+            'big_endian': np.arange(5, dtype='>i4'),
+        }
+
+    def _check_arrays(self, f, arrays):
+        self.assertEqual(f.keys(), sorted(arrays))
+        for k, v in arrays.items():
+            a = f.get(k, verify=True)
+            self.assertEqual(a.dtype, np.asarray(v).dtype)
+            self.assertEqual(a.shape, np.shape(v))
+            np.testing.assert_array_equal(a, v)
+
+    def test_path(self):
+        """Test memory-mapping the arrays from a file path."""
+        arrays = self._make_arrays()
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'arrays.bin')
+            save_array_file(path, arrays)
+            self.assertEqual(os.listdir(tmpdir), ['arrays.bin'])
+            self.assertTrue(is_array_file(path))
+
+            f = ArrayFile(path)
+            self._check_arrays(f, arrays)
+            a = f['a/W']
+            self.assertFalse(a.flags.writeable)
+            self.assertEqual(a.ctypes.data % ARRAY_FILE_ALIGNMENT, 0)
+            self.assertIsInstance(pickle.loads(pickle.dumps(a)), np.ndarray)
+            self.assertEqual(sorted(f.read(['a/W', 'not_exist'])), ['a/W'])
+
+            # the mapped arrays should still be valid after the file is overwritten.
+            a0 = a.copy()
+            save_array_file(path, {'a/W': np.zeros([3])})
+            np.testing.assert_array_equal(a, a0)
+
+            # corrupted arrays should be detected by the checksums.
+            with open(path, 'rb') as fin:
+                raw = bytearray(fin.read())
+            raw[-1] ^= 1
+            with open(path, 'wb') as fout:
+                fout.write(raw)
+            with self.assertRaises(IOError):
+                ArrayFile(path).get('a/W', verify=True)
+
+    def test_file_object(self):
+        """Test reading the arrays from a file object."""
+        arrays = self._make_arrays()
+        buf = io.BytesIO()
+        buf.write(b'header')
+        save_array_file(buf, arrays)
+        buf.seek(6)
+        self.assertTrue(is_array_file(buf))
+        self.assertEqual(buf.tell(), 6)
+        self._check_arrays(ArrayFile(buf), arrays)
+        self.assertFalse(is_array_file(io.BytesIO(pickle.dumps(arrays))))
+
+        with self.assertRaises(TypeError):
+            save_array_file(io.BytesIO(), {'a': np.array([None])})
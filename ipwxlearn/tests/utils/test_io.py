@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import os
+import pickle
+import unittest
+
+import numpy as np
+import six
+
+from ipwxlearn.utils.io import (get_codec, is_compressed_file, load_object_compressed, save_object_compressed,
+                                GzipCodec, ZlibCodec)
+from ipwxlearn.utils.tempdir import TemporaryDirectory
+
+
+class CompressedObjectTestCase(unittest.TestCase):
+
+    def _make_object(self):
+        return {
+            'W': np.random.normal(size=[100, 50]).astype(np.float32),
+            'b': np.zeros([50]),
+            'memo': list(range(1000)),
+        }
+
+    def _check_object(self, obj, expected):
+        self.assertEqual(sorted(obj), sorted(expected))
+        np.testing.assert_array_equal(obj['W'], expected['W'])
+        np.testing.assert_array_equal(obj['b'], expected['b'])
+        self.assertEqual(obj['memo'], expected['memo'])
+
+    def test_get_codec(self):
+        codec = get_codec('gzip:9')
+        self.assertIsInstance(codec, GzipCodec)
+        self.assertEqual(codec.level, 9)
+        self.assertEqual(get_codec('gzip').level, 6)
+        self.assertIs(get_codec(codec), codec)
+        with self.assertRaises(ValueError):
+            get_codec('not-exist')
+
+    def test_codecs(self):
+        """Test saving and loading objects with each codec, without specifying the codec when loading."""
+        codecs = ['none', 'gzip', 'gzip:1', 'zlib', 'zlib:1',
+                  ZlibCodec(chunk_size=1000, threads=1), ZlibCodec(chunk_size=1000, threads=3)]
+        if six.PY3:
+            codecs.append('lzma:1')
+        obj = self._make_object()
+        for codec in codecs:
+            buf = io.BytesIO()
+            buf.write(b'header')
+            save_object_compressed(buf, obj, codec=codec)
+            buf.seek(6)
+            self.assertTrue(is_compressed_file(buf))
+            self._check_object(load_object_compressed(buf), obj)
+
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'obj.pkl')
+            save_object_compressed(path, obj)
+            self.assertTrue(is_compressed_file(path))
+            self._check_object(load_object_compressed(path), obj)
+
+    def test_legacy_gzip(self):
+        """Test loading the gzip files saved by earlier versions."""
+        obj = self._make_object()
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'obj.pkl.gz')
+            with gzip.open(path, mode='wb', compresslevel=9) as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.assertTrue(is_compressed_file(path))
+            self._check_object(load_object_compressed(path), obj)
+
+        buf = io.BytesIO(pickle.dumps(obj))
+        self.assertFalse(is_compressed_file(buf))
+        with self.assertRaises(IOError):
+            load_object_compressed(buf)
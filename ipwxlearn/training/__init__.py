@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+from .accumulator import *
 from .dataflow import *
 from .monitors import *
+from .paramserver import *
+from .snapshot import *
 from .utils import *
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+
+__all__ = [
+    'LossAccumulator',
+]
+
+
+class LossAccumulator(object):
+    """
+    Accumulate the training losses in backend variables.
+
+    The training function updates the running sum and count of losses on the device, via the updates
+    derived by :method:`get_updates`, instead of returning the loss at every step.  The accumulated values
+    are fetched and reset only when some consumer (e.g., a monitor reporting the average training loss)
+    calls :method:`average_since`.  Thus the host does not need to synchronize with the device at every
+    step, which also allows the backend to pipeline the consecutive steps.
+
+    The fetched values are added to the host-side totals, so that several consumers could each compute
+    the average loss since its own last report, from the marks returned by :method:`average_since`.
+
+    This object must be constructed while the graph of the training function is activated.
+
+    :param name: Name prefix of the backend variables. (Default 'loss_accumulator')
+    :param dtype: Data type of the loss sum.  If not specified, will use floatX.
+    """
+
+    def __init__(self, name='loss_accumulator', dtype=None):
+        from ipwxlearn import glue
+        from ipwxlearn.glue import G
+        self.dtype = dtype or glue.config.floatX
+        self.sum_var = G.make_variable(name + '_sum', (), 0., dtype=self.dtype)
+        self.count_var = G.make_variable(name + '_count', (), 0, dtype=np.int64)
+        self._fetch_fn = self._reset_fn = None
+        # the totals of the losses which have been fetched from the device.
+        self._total_sum = 0.
+        self._total_count = 0
+
+    def get_updates(self, loss):
+        """
+        Derive the updates which add the loss of a step to the accumulated values.
+
+        :param loss: The loss expression.
+        :return: Update operations, to be merged into the updates of the training function.
+        """
+        from ipwxlearn.glue import G
+        return [G.op.assign(self.sum_var, self.sum_var + G.op.cast(loss, self.dtype)),
+                G.op.assign(self.count_var, self.count_var + 1)]
+
+    def flush(self):
+        """Fetch the accumulated values from the device, add them to the host-side totals, and reset them."""
+        from ipwxlearn.glue import G
+        if self._fetch_fn is None:
+            self._fetch_fn = G.make_function(outputs=[self.sum_var, self.count_var])
+            self._reset_fn = G.make_function(updates=[G.op.assign(self.sum_var, np.zeros((), self.dtype)),
+                                                      G.op.assign(self.count_var, np.zeros((), np.int64))])
+        loss_sum, loss_count = self._fetch_fn()
+        if loss_count:
+            # no step is performed between the two calls, thus no loss would be lost.
+            self._reset_fn()
+            self._total_sum += float(loss_sum)
+            self._total_count += int(loss_count)
+
+    def mark(self):
+        """Fetch the accumulated values, and get the mark of current totals."""
+        self.flush()
+        return self._total_sum, self._total_count
+
+    def average_since(self, mark):
+        """
+        Get the average loss since the specified mark.
+
+        :param mark: The mark returned by :method:`mark` or by previous calls to this method.
+        :return: (average loss, or None if there is no step since the mark, new mark)
+        """
+        new_mark = self.mark()
+        loss_sum = new_mark[0] - mark[0]
+        loss_count = new_mark[1] - mark[1]
+        return (loss_sum / loss_count if loss_count else None), new_mark
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+from .assembler import *
+from .augment import *
+from .base import *
+from .bucket import *
+from .memmap import *
+from .multiprocess import *
+from .permutation import *
+from .pipeline import *
+from .prefetch import *
+from .sampling import *
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+import six
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+
+__all__ = [
+    'BatchAssembler',
+    'as_numpy_dtype',
+]
+
+
+def as_numpy_dtype(dtype_or_placeholder):
+    """
+    Get the numpy dtype of a dtype, or a backend placeholder.
+
+    :param dtype_or_placeholder: String, numpy dtype, backend dtype, or an object having `dtype` attribute
+                                 (e.g., backend placeholders made by `G.make_placeholder_for`).
+    :return: numpy dtype.
+    """
+    dtype = dtype_or_placeholder
+    if not isinstance(dtype, six.class_types + six.string_types + (np.dtype,)):
+        dtype = getattr(dtype, 'dtype', dtype)
+    # TensorFlow dtypes could be converted to numpy dtypes via `as_numpy_dtype`.
+    dtype = getattr(dtype, 'as_numpy_dtype', dtype)
+    return np.dtype(dtype)
+
+
+class BatchAssembler(object):
+    """
+    Assemble mini-batches into preallocated, C-contiguous buffers.
+
+    The arrays are converted to the specified dtypes only once, when the assembler is constructed,
+    so that the mini-batches would match the placeholders without further conversion.  After that,
+    each mini-batch is written into a small ring of preallocated buffers, thus the hot loop of training
+    does not allocate new arrays.  The yielded arrays are valid until :param:`buffers` more mini-batches
+    have been assembled.
+
+    :param array_or_arrays: Numpy array, or a list of numpy arrays.
+    :param batch_size: Maximum size of the mini-batches.
+    :param dtypes: The dtype, or list of dtypes for each array.  Backend placeholders are also accepted,
+                   see :func:`as_numpy_dtype`.  None in the list indicates to keep the original dtype.
+    :param buffers: Number of buffers in the ring. (Default 2)
+    """
+
+    def __init__(self, array_or_arrays, batch_size, dtypes=None, buffers=2):
+        arrays = ensure_list_sealed(array_or_arrays)
+        if dtypes is None:
+            dtypes = [None] * len(arrays)
+        else:
+            dtypes = ensure_list_sealed(dtypes)
+            if len(dtypes) != len(arrays):
+                raise ValueError('Got %d dtypes, but there are %d arrays.' % (len(dtypes), len(arrays)))
+        if buffers < 1:
+            raise ValueError('There must be at least 1 buffer.')
+
+        #: Number of arrays converted to another dtype at ingestion.
+        self.conversion_count = 0
+        #: Number of buffers allocated by this assembler.
+        self.allocation_count = 0
+        #: Total bytes of the buffers allocated by this assembler.
+        self.allocated_bytes = 0
+        #: Number of mini-batches assembled.
+        self.batch_count = 0
+
+        converted = []
+        for a, dtype in zip(arrays, dtypes):
+            a = np.asarray(a)
+            if dtype is not None:
+                dtype = as_numpy_dtype(dtype)
+                if a.dtype != dtype:
+                    a = a.astype(dtype)
+                    self.conversion_count += 1
+            converted.append(a)
+        self.arrays = converted
+        self.batch_size = batch_size
+        self.buffers = buffers
+
+        # the ring of buffers would be allocated at the first mini-batch.
+        self._ring = None
+        self._next_slot = 0
+
+    def _allocate(self, shape, dtype):
+        buf = np.empty(shape, dtype=dtype, order='C')
+        self.allocation_count += 1
+        self.allocated_bytes += buf.nbytes
+        return buf
+
+    def _next_buffers(self, size):
+        if size > self.batch_size:
+            raise ValueError('Mini-batch size %d exceeds the capacity %d of the buffers.' % (size, self.batch_size))
+        if self._ring is None:
+            self._ring = [[self._allocate((self.batch_size,) + a.shape[1:], a.dtype) for a in self.arrays]
+                          for _ in range(self.buffers)]
+        slot = self._ring[self._next_slot]
+        self._next_slot = (self._next_slot + 1) % len(self._ring)
+        self.batch_count += 1
+        return slot if size == self.batch_size else [buf[: size] for buf in slot]
+
+    def take(self, indices):
+        """
+        Assemble a mini-batch by gathering the rows at specified indices.
+
+        :param indices: Integer array of row indices.
+        :return: Tuple of arrays.
+        """
+        indices = np.asarray(indices)
+        bufs = self._next_buffers(len(indices))
+        # `out` would be buffered in 'raise' mode, so we use 'clip' mode after checking the indices.
+        if len(indices) and (np.min(indices) < 0 or np.max(indices) >= len(self.arrays[0])):
+            raise IndexError('Indices out of range.')
+        return tuple(np.take(a, indices, axis=0, out=buf, mode='clip') for a, buf in zip(self.arrays, bufs))
+
+    def slice(self, start, stop):
+        """
+        Assemble a mini-batch by slicing the rows in [start, stop).
+
+        Since slices of C-contiguous arrays are already C-contiguous, this method returns views of the
+        arrays in that case, and copies the rows into the buffers otherwise.
+
+        :return: Tuple of arrays.
+        """
+        if all(a.flags.c_contiguous for a in self.arrays):
+            self.batch_count += 1
+            return tuple(a[start: stop] for a in self.arrays)
+        bufs = self._next_buffers(len(self.arrays[0][start: stop]))
+        ret = []
+        for a, buf in zip(self.arrays, bufs):
+            np.copyto(buf, a[start: stop])
+            ret.append(buf)
+        return tuple(ret)
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+
+__all__ = [
+    'ImageOp',
+    'ImageAugmentation',
+    'RandomCrop',
+    'RandomTranslation',
+    'RandomFlip',
+    'IntensityJitter',
+    'Cutout',
+]
+
+
+def _check_images(images):
+    images = np.asarray(images)
+    if images.ndim != 4:
+        raise ValueError('Images must be a 4-D tensor in NHWC format, but got shape %r.' % (images.shape,))
+    return images
+
+
+def _cast_like(values, images):
+    """Cast the float values back to the dtype of images, clipping to the range of integer dtypes."""
+    if np.issubdtype(images.dtype, np.integer):
+        info = np.iinfo(images.dtype)
+        values = np.clip(np.round(values), info.min, info.max)
+    return values.astype(images.dtype, copy=False)
+
+
+def _gather_windows(images, oy, ox, height, width):
+    """
+    Gather a (height, width) window at (oy[i], ox[i]) from each image i.
+
+    The images are viewed as a strided tensor of all the windows, so that the windows could be gathered
+    by one fancy-indexing operation, which copies each window as a contiguous block.
+    """
+    n, h, w, c = images.shape
+    s = images.strides
+    windows = as_strided(images, shape=(n, h - height + 1, w - width + 1, height, width, c),
+                         strides=(s[0], s[1], s[2], s[1], s[2], s[3]), writeable=False)
+    return windows[np.arange(n), oy, ox]
+
+
+class ImageOp(object):
+    """Base class for vectorized augmentation operations on a batch of NHWC images."""
+
+    def __call__(self, images, random_state):
+        """
+        Apply the augmentation to a batch of images.
+
+        :param images: 4-D numpy array in NHWC format.
+        :param random_state: Numpy RandomState, or the `numpy.random` module.
+        :return: The augmented images.
+        """
+        raise NotImplementedError()
+
+
+class RandomCrop(ImageOp):
+    """
+    Randomly crop each image to (height, width), after padding the borders by :param:`padding` pixels.
+
+    All the crops are gathered from the batch by one fancy-indexing operation.
+
+    :param height: Height of the cropped images.
+    :param width: Width of the cropped images.
+    :param padding: Number of pixels to pad on each border before cropping. (Default 0)
+    :param fill: Value of the padded pixels. (Default 0)
+    """
+
+    def __init__(self, height, width, padding=0, fill=0):
+        self.height = height
+        self.width = width
+        self.padding = padding
+        self.fill = fill
+
+    def __call__(self, images, random_state):
+        images = _check_images(images)
+        n, h, w = images.shape[:3]
+        p = self.padding
+        if p > 0:
+            images = np.pad(images, ((0, 0), (p, p), (p, p), (0, 0)), mode='constant', constant_values=self.fill)
+        max_y = h + 2 * p - self.height
+        max_x = w + 2 * p - self.width
+        if max_y < 0 or max_x < 0:
+            raise ValueError('Crop size (%d, %d) is larger than the padded images.' % (self.height, self.width))
+        oy = random_state.randint(0, max_y + 1, size=n)
+        ox = random_state.randint(0, max_x + 1, size=n)
+        return _gather_windows(images, oy, ox, self.height, self.width)
+
+
+class RandomTranslation(ImageOp):
+    """
+    Randomly translate each image by at most (max_dy, max_dx) pixels, keeping the image size.
+
+    :param max_dy: Maximum vertical translation in pixels.
+    :param max_dx: Maximum horizontal translation in pixels.
+    :param fill: Value of the pixels moved in from outside of the images. (Default 0)
+    """
+
+    def __init__(self, max_dy, max_dx, fill=0):
+        self.max_dy = max_dy
+        self.max_dx = max_dx
+        self.fill = fill
+
+    def __call__(self, images, random_state):
+        images = _check_images(images)
+        n, h, w = images.shape[:3]
+        dy, dx = self.max_dy, self.max_dx
+        padded = np.pad(images, ((0, 0), (dy, dy), (dx, dx), (0, 0)), mode='constant', constant_values=self.fill)
+        oy = random_state.randint(0, 2 * dy + 1, size=n)
+        ox = random_state.randint(0, 2 * dx + 1, size=n)
+        return _gather_windows(padded, oy, ox, h, w)
+
+
+class RandomFlip(ImageOp):
+    """
+    Randomly flip the images.
+
+    :param horizontal: Whether or not to flip horizontally? (Default True)
+    :param vertical: Whether or not to flip vertically? (Default False)
+    :param probability: Probability to flip each image along each direction. (Default 0.5)
+    """
+
+    def __init__(self, horizontal=True, vertical=False, probability=0.5):
+        self.horizontal = horizontal
+        self.vertical = vertical
+        self.probability = probability
+
+    def __call__(self, images, random_state):
+        images = _check_images(images)
+        n = len(images)
+        out = np.array(images)
+        if self.horizontal:
+            mask = random_state.rand(n) < self.probability
+            out[mask] = out[mask, :, ::-1]
+        if self.vertical:
+            mask = random_state.rand(n) < self.probability
+            out[mask] = out[mask, ::-1]
+        return out
+
+
+class IntensityJitter(ImageOp):
+    """
+    Randomly jitter the brightness and contrast of each image.
+
+    The contrast factor c is drawn from [1 - contrast, 1 + contrast], and the brightness delta b is drawn
+    from [-brightness, brightness], then each image x is transformed into (x - mean(x)) * c + mean(x) + b.
+
+    :param brightness: Maximum brightness delta. (Default 0.1)
+    :param contrast: Maximum relative change of contrast. (Default 0.1)
+    :param clip: If specified, the (min, max) range to clip the transformed pixels.
+    """
+
+    def __init__(self, brightness=0.1, contrast=0.1, clip=None):
+        self.brightness = brightness
+        self.contrast = contrast
+        self.clip = clip
+
+    def __call__(self, images, random_state):
+        images = _check_images(images)
+        n = len(images)
+        dtype = images.dtype if np.issubdtype(images.dtype, np.floating) else np.float32
+        c = random_state.uniform(1. - self.contrast, 1. + self.contrast, size=(n, 1, 1, 1)).astype(dtype)
+        b = random_state.uniform(-self.brightness, self.brightness, size=(n, 1, 1, 1)).astype(dtype)
+        mean = np.mean(images, axis=(1, 2, 3), keepdims=True, dtype=dtype)
+        values = (images - mean) * c + (mean + b)
+        if self.clip is not None:
+            values = np.clip(values, self.clip[0], self.clip[1])
+        return _cast_like(values, images)
+
+
+class Cutout(ImageOp):
+    """
+    Randomly mask out a square region of each image.
+
+    :param size: Side length of the square region.
+    :param fill: Value of the masked pixels. (Default 0)
+    :param probability: Probability to apply cutout on each image. (Default 1.0)
+    """
+
+    def __init__(self, size, fill=0, probability=1.0):
+        self.size = size
+        self.fill = fill
+        self.probability = probability
+
+    def __call__(self, images, random_state):
+        images = _check_images(images)
+        n, h, w = images.shape[:3]
+        # the center of the region might be anywhere in the image, so the region might be partially outside.
+        cy = random_state.randint(0, h, size=n)
+        cx = random_state.randint(0, w, size=n)
+        top = cy - self.size // 2
+        left = cx - self.size // 2
+        rows = np.arange(h)[None, :] - top[:, None]
+        cols = np.arange(w)[None, :] - left[:, None]
+        mask = ((rows >= 0) & (rows < self.size))[:, :, None] & ((cols >= 0) & (cols < self.size))[:, None, :]
+        if self.probability < 1.0:
+            mask &= (random_state.rand(n) < self.probability)[:, None, None]
+        out = np.array(images)
+        out[mask] = self.fill
+        return out
+
+
+class ImageAugmentation(object):
+    """
+    Chain of vectorized augmentation operations, applied to the images of each mini-batch.
+
+    Instances of this class are callable on the arrays of a mini-batch, thus could be used as the function
+    of :method:`DataFlow.batch_map`, or :class:`MultiProcessDataFlow`.  See :method:`apply_to` for a shortcut.
+
+    :param ops: List of :class:`ImageOp`, the augmentation operations.
+    :param index: Index of the image array in each mini-batch. (Default 0)
+    :param random_state: Numpy RandomState.  If not specified, will use the global numpy random state,
+                         which would be seeded by :class:`MultiProcessDataFlow` for deterministic results.
+    """
+
+    def __init__(self, ops, index=0, random_state=None):
+        self.ops = ensure_list_sealed(ops)
+        self.index = index
+        self.random_state = random_state
+
+    def augment(self, images):
+        """Augment a batch of NHWC images."""
+        random_state = self.random_state if self.random_state is not None else np.random
+        for op in self.ops:
+            images = op(images, random_state)
+        return images
+
+    def __call__(self, *arrays):
+        arrays = list(arrays)
+        arrays[self.index] = self.augment(arrays[self.index])
+        return tuple(arrays)
+
+    def apply_to(self, flow, workers=0, **kwargs):
+        """
+        Apply this augmentation to the mini-batches of a data flow.
+
+        :param flow: The data flow.
+        :param workers: If greater than 0, will augment the mini-batches in this number of worker processes.
+        :param **kwargs: Additional arguments passed to :class:`MultiProcessDataFlow`.
+        :return: The augmented data flow.
+        """
+        if workers > 0:
+            from .multiprocess import MultiProcessDataFlow
+            return MultiProcessDataFlow(flow, fn=self, workers=workers, **kwargs)
+        return flow.batch_map(self)
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+from .assembler import BatchAssembler
+from .permutation import FeistelPermutation
+
+__all__ = [
+    'DataFlow',
+    'OneShotDataFlow',
+    'TrainingBatchDataFlow',
+    'TestingBatchDataFlow',
+    'iterate_training_batches',
+    'iterate_testing_batches',
+]
+
+
+class DataFlow(object):
+    """
+    Abstract interface for all classes that creates iterators for data.
+
+    Derived classes of this would be used in :method:`~ipwxlearn.utils.training.run_steps` and
+    :class:`~ipwxlearn.utils.training.ValidationMonitor`, so as to get iterators of training or
+    validation data.
+    """
+
+    #: Whether or not the arrays yielded by :method:`iter_epoch` might be overwritten when the next
+    #: mini-batch is requested, such that they must be copied if they need to be kept.
+    reuse_buffers = False
+
+    def iter_epoch(self):
+        """
+        Get data iterator for this epoch.
+        Yielding (arr1, arr2, ...) tuples.
+        """
+        raise NotImplementedError()
+
+    @property
+    def num_examples(self):
+        """Get the total number of examples in one batch."""
+        raise NotImplementedError()
+
+    @property
+    def array_count(self):
+        """Get the count of arrays yielded at each mini-batch."""
+        raise NotImplementedError()
+
+    def get_state(self):
+        """
+        Get the serializable iterator state of this data flow, e.g., {'epoch': 1, 'seed': 1234, 'offset': 10}.
+
+        The state describes the position of the current epoch, such that after :method:`set_state` is called
+        with the state, the next call to :method:`iter_epoch` would resume at the next mini-batch.
+        :func:`~ipwxlearn.training.run_steps` saves this state in the session memo, so that a training
+        restored from a checkpoint would resume at the exact next mini-batch.
+
+        :return: A dict of the state, or None if this data flow does not support resuming.
+        """
+        return None
+
+    def set_state(self, state):
+        """
+        Restore the iterator state of this data flow.
+
+        :param state: The state returned by :method:`get_state`.
+        """
+        raise TypeError('%r does not support resuming.' % self)
+
+    def is_epoch_completed(self, state):
+        """
+        Check whether or not the state is at the end of an epoch, such that after :method:`set_state` is called
+        with the state, the next call to :method:`iter_epoch` would start a new epoch.
+
+        :param state: The state returned by :method:`get_state`.
+        """
+        return False
+
+    def map(self, fn, array_count=None):
+        """
+        Lazily transform each example of this data flow.
+
+        Per-example transformations are run in Python loops, thus :method:`batch_map` should be preferred
+        if the transformation could be vectorized.
+
+        :param fn: Function which accepts the arrays of an example as unnamed arguments, and returns the
+                   transformed example (a tuple of arrays, or a single array).
+        :param array_count: Count of arrays returned by :param:`fn`, if it differs from this data flow.
+        :rtype: :class:`PipelineDataFlow`
+        """
+        from .pipeline import PipelineDataFlow
+        return PipelineDataFlow(self).map(fn, array_count)
+
+    def batch_map(self, fn, array_count=None):
+        """
+        Lazily transform each mini-batch of this data flow.
+
+        :param fn: Function which accepts the arrays of a mini-batch as unnamed arguments, and returns the
+                   transformed mini-batch (a tuple of arrays, or a single array).
+        :param array_count: Count of arrays returned by :param:`fn`, if it differs from this data flow.
+        :rtype: :class:`PipelineDataFlow`
+        """
+        from .pipeline import PipelineDataFlow
+        return PipelineDataFlow(self).batch_map(fn, array_count)
+
+    def filter(self, predicate):
+        """
+        Lazily filter the examples of this data flow.
+
+        :param predicate: Function which accepts the arrays of a mini-batch as unnamed arguments, and returns
+                          a boolean mask indicating which examples should be kept.  Mini-batches with no
+                          example left would not be yielded.
+        :rtype: :class:`PipelineDataFlow`
+        """
+        from .pipeline import PipelineDataFlow
+        return PipelineDataFlow(self).filter(predicate)
+
+    def cache(self, path=None, shuffle=False):
+        """
+        Cache the mini-batches of this data flow after the first complete epoch.
+        See :class:`CachedDataFlow` for more details about the arguments.
+
+        :rtype: :class:`CachedDataFlow`
+        """
+        from .pipeline import CachedDataFlow
+        return CachedDataFlow(self, path=path, shuffle=shuffle)
+
+
+class OneShotDataFlow(DataFlow):
+    """Return the given array or arrays as the only data in an epoch."""
+
+    def __init__(self, array_or_arrays):
+        self.arrays = ensure_list_sealed(array_or_arrays)
+
+    def iter_epoch(self):
+        yield tuple(self.arrays)
+
+    @property
+    def num_examples(self):
+        return len(self.arrays[0])
+
+    @property
+    def array_count(self):
+        return len(self.arrays)
+
+
+def _check_state_compatible(flow, state):
+    """
+    Check that the iterator state was produced by a data flow with the same number of examples and batch size,
+    otherwise the restored position would point to wrong examples.
+    """
+    for key in ('num_examples', 'batch_size'):
+        if key in state and state[key] != getattr(flow, key):
+            raise ValueError('The state of data flow has %s %r, but %r has %s %r.' %
+                             (key, state[key], flow, key, getattr(flow, key)))
+
+
+class _BatchDataFlow(DataFlow):
+    """Base class for data flows in mini-batches, which might assemble mini-batches into buffers."""
+
+    def __init__(self, array_or_arrays, batch_size, reuse_buffers=False, dtypes=None):
+        self.arrays = ensure_list_sealed(array_or_arrays)
+        self.batch_size = batch_size
+        self.reuse_buffers = reuse_buffers
+        if reuse_buffers or dtypes is not None:
+            #: The batch assembler, which holds the converted arrays and the reused buffers.
+            self.assembler = BatchAssembler(self.arrays, batch_size, dtypes=dtypes)
+            self.arrays = self.assembler.arrays
+        else:
+            self.assembler = None
+
+    @property
+    def num_examples(self):
+        return len(self.arrays[0])
+
+    @property
+    def array_count(self):
+        return len(self.arrays)
+
+    def _get_reuse_buffers(self):
+        return self.assembler if self.reuse_buffers else False
+
+
+class TrainingBatchDataFlow(_BatchDataFlow):
+    """
+    General training data flow in mini-batches.
+
+    See :func:`iterate_training_batches` for more details about the arguments.
+
+    :param dtypes: If specified, the arrays would be converted to these dtypes only once at construction.
+                   See :class:`BatchAssembler` for more details.
+    """
+
+    def __init__(self, array_or_arrays, batch_size, shuffle=True, reuse_buffers=False, dtypes=None):
+        super(TrainingBatchDataFlow, self).__init__(array_or_arrays, batch_size, reuse_buffers=reuse_buffers,
+                                                    dtypes=dtypes)
+        self.shuffle = shuffle
+
+        # index of the current epoch, the random seed of its permutation, and the number of yielded mini-batches.
+        self._epoch = -1
+        self._seed = None
+        self._offset = 0
+        # whether or not the next epoch should resume from the restored state?
+        self._resuming = False
+
+    def get_state(self):
+        return {'epoch': self._epoch, 'seed': self._seed, 'offset': self._offset,
+                'num_examples': self.num_examples, 'batch_size': self.batch_size}
+
+    def is_epoch_completed(self, state):
+        return state['seed'] is not None and state['offset'] >= len(self.arrays[0]) // self.batch_size
+
+    def set_state(self, state):
+        _check_state_compatible(self, state)
+        epoch, seed, offset = state['epoch'], state['seed'], state['offset']
+        if seed is None or self.is_epoch_completed(state):
+            # the epoch has not started, or has been completed, thus the next epoch would start from scratch.
+            self._epoch, self._seed, self._offset, self._resuming = epoch, None, 0, False
+        else:
+            self._epoch, self._seed, self._offset, self._resuming = epoch, seed, offset, True
+
+    def iter_epoch(self):
+        if not self._resuming:
+            self._epoch += 1
+            # the permutation is not used when not shuffling, but the seed should indicate a started epoch.
+            self._seed = np.random.randint(0, 2147462579) if self.shuffle else 0
+            self._offset = 0
+        self._resuming = False
+        batches = iterate_training_batches(self.arrays, self.batch_size, self.shuffle,
+                                           reuse_buffers=self._get_reuse_buffers(), seed=self._seed,
+                                           start=self._offset * self.batch_size)
+        for batch in batches:
+            self._offset += 1
+            yield batch
+
+
+class TestingBatchDataFlow(_BatchDataFlow):
+    """
+    General testing data flow in mini-batches.
+
+    See :func:`iterate_testing_batches` for more details about the arguments.
+
+    :param dtypes: If specified, the arrays would be converted to these dtypes only once at construction.
+                   See :class:`BatchAssembler` for more details.
+    """
+
+    def __init__(self, array_or_arrays, batch_size, reuse_buffers=False, dtypes=None):
+        super(TestingBatchDataFlow, self).__init__(array_or_arrays, batch_size, reuse_buffers=reuse_buffers,
+                                                   dtypes=dtypes)
+
+    def iter_epoch(self):
+        return iterate_testing_batches(self.arrays, self.batch_size, reuse_buffers=self._get_reuse_buffers())
+
+
+def iterate_training_batches(array_or_arrays, batch_size, shuffle=True, reuse_buffers=False, seed=None, start=0):
+    """
+    Iterate the given array or arrays in mini-batches, for training purpose.
+
+    Yielding (array1, array2, ...) at each mini-batch.  The arrays yielded for training batches
+    would be exactly batch_size, while the tail of the given data might be dropped.
+
+    When shuffling, a random permutation of the examples is drawn at the beginning of each epoch,
+    and only the rows of each mini-batch are gathered from the arrays.  This avoids copying the
+    whole arrays at every epoch, so that the peak memory would be one mini-batch per array.
+
+    :param array_or_arrays: Numpy array, or a list of numpy arrays.
+    :param batch_size: Batch size of the mini-batches.
+    :param shuffle: If True, will shuffle the data before iterating the batches.
+                    If 'copy', will shuffle by copying the whole arrays in permuted order at the
+                    beginning of each epoch, which costs much more memory.  This mode is mainly
+                    kept for comparison.
+                    If 'lazy', will use :class:`FeistelPermutation` instead of materializing the
+                    permutation of indices, which is preferred for very large number of examples.
+    :param reuse_buffers: If True, the mini-batches would be assembled into buffers which are allocated
+                          once and reused at every mini-batch.  The yielded arrays are thus only valid
+                          until the next mini-batch is requested. (Default False)
+                          A :class:`BatchAssembler` could also be specified, so as to reuse its buffers
+                          across epochs.
+    :param seed: Random seed of the permutation.  If not specified, will use the global numpy random state.
+    :param start: Start from this position of the permuted examples, so as to resume an interrupted epoch.
+    """
+    if not isinstance(array_or_arrays, (tuple, list, np.ndarray)):
+        raise TypeError('Given array is neither a numpy array, or a list of numpy arrays.')
+    if shuffle not in (True, False, 'copy', 'lazy'):
+        raise ValueError('Unknown shuffle mode %r.' % (shuffle,))
+
+    direct_value = False
+    if not isinstance(array_or_arrays, (tuple, list)):
+        array_or_arrays = [array_or_arrays]
+        direct_value = True
+
+    num_examples = len(array_or_arrays[0])
+    assert(num_examples >= batch_size)
+
+    if reuse_buffers is True:
+        reuse_buffers = BatchAssembler(array_or_arrays, batch_size, buffers=1)
+    assembler = reuse_buffers or None
+
+    random_state = np.random.RandomState(seed) if seed is not None else np.random
+    if shuffle == 'copy':
+        perm = random_state.permutation(num_examples)
+        array_or_arrays = [arr[perm] for arr in array_or_arrays]
+        get_batch = lambda start, end: tuple(arr[start: end] for arr in array_or_arrays)
+
+    elif shuffle:
+        if shuffle == 'lazy':
+            perm = FeistelPermutation(num_examples, seed=seed)
+        else:
+            perm = random_state.permutation(num_examples)
+
+        def get_batch(start, end):
+            # sorting the indices in a mini-batch would make the memory access more sequential.
+            indices = np.sort(perm[start: end])
+            if assembler is None:
+                return tuple(np.take(arr, indices, axis=0) for arr in array_or_arrays)
+            return assembler.take(indices)
+
+    elif assembler is not None:
+        get_batch = assembler.slice
+
+    else:
+        get_batch = lambda start, end: tuple(arr[start: end] for arr in array_or_arrays)
+
+    index_in_batch = start
+    while True:
+        start = index_in_batch
+        index_in_batch += batch_size
+        if index_in_batch > num_examples:
+            break
+        yield_arrays = get_batch(start, index_in_batch)
+        if direct_value:
+            yield_arrays = yield_arrays[0]
+        yield yield_arrays
+
+
+def iterate_testing_batches(array_or_arrays, batch_size, reuse_buffers=False):
+    """
+    Iterate the given array or arrays in mini-batches, for testing purpose.
+
+    Yielding (array1, array2, ...) at each mini-batch.  The arrays yielded for testing batches
+    would be equal to or less than batch_size, while the tail of the given data might not be dropped.
+
+    :param array_or_arrays: Numpy array, or a list of numpy arrays.
+    :param batch_size: Batch size of the mini-batches.
+    :param reuse_buffers: If True, the mini-batches would be assembled into reused buffers, if the
+                          arrays are not C-contiguous.  A :class:`BatchAssembler` could also be specified.
+                          See :func:`iterate_training_batches` for more details. (Default False)
+    """
+    if not isinstance(array_or_arrays, (tuple, list, np.ndarray)):
+        raise TypeError('Given array is neither a numpy array, or a list of numpy arrays.')
+
+    direct_value = False
+    if not isinstance(array_or_arrays, (tuple, list)):
+        array_or_arrays = [array_or_arrays]
+        direct_value = True
+
+    if reuse_buffers is True:
+        reuse_buffers = BatchAssembler(array_or_arrays, batch_size, buffers=1)
+    if reuse_buffers:
+        get_batch = reuse_buffers.slice
+    else:
+        get_batch = lambda start, end: tuple(arr[start: end] for arr in array_or_arrays)
+
+    num_examples = len(array_or_arrays[0])
+    index_in_batch = 0
+    while index_in_batch < num_examples:
+        start = index_in_batch
+        index_in_batch += batch_size
+        if index_in_batch > num_examples:
+            index_in_batch = num_examples
+        yield_arrays = get_batch(start, index_in_batch)
+        if direct_value:
+            yield_arrays = yield_arrays[0]
+        yield yield_arrays
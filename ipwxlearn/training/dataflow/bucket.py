@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+from .base import DataFlow
+
+__all__ = [
+    'BucketedSequenceDataFlow',
+    'tune_bucket_boundaries',
+]
+
+
+def tune_bucket_boundaries(lengths, max_pad_fraction=0.1):
+    """
+    Choose the bucket boundaries from the histogram of sequence lengths.
+
+    The lengths are scanned in ascending order, and a bucket is extended to the next length as long as the
+    fraction of padding in this bucket (when every sequence is padded to the maximum length of the bucket)
+    does not exceed :param:`max_pad_fraction`.
+
+    :param lengths: Lengths of the sequences.
+    :param max_pad_fraction: Target maximum fraction of padding in each bucket. (Default 0.1)
+    :return: List of the inclusive upper bounds of the buckets, in ascending order.
+    """
+    values, counts = np.unique(np.asarray(lengths, dtype=np.int64), return_counts=True)
+    boundaries = []
+    bucket_count = bucket_total = 0
+    for value, count in zip(values, counts):
+        if bucket_count > 0:
+            new_count = bucket_count + count
+            new_total = bucket_total + value * count
+            if 1.0 - float(new_total) / (new_count * value) > max_pad_fraction:
+                boundaries.append(prev_value)
+                bucket_count = bucket_total = 0
+        bucket_count += count
+        bucket_total += value * count
+        prev_value = value
+    if bucket_count > 0:
+        boundaries.append(prev_value)
+    return [int(b) for b in boundaries]
+
+
+class BucketedSequenceDataFlow(DataFlow):
+    """
+    Data flow of variable-length sequences in mini-batches, with examples of similar lengths bucketed together.
+
+    Each mini-batch only contains sequences from the same bucket, and is padded to the maximum length of the
+    sequences in that mini-batch, which is no longer than the upper bound of the bucket.  The data flow yields
+    (padded_sequences, lengths_or_mask, array1, array2, ...) at each mini-batch, where the padded sequences have
+    shape (batch_size, max_length) (e.g., token ids to be fed into an `EmbeddingLayer`).
+
+    :param sequences: List of 1-D numpy arrays, the sequences.
+    :param batch_size: Batch size of the mini-batches.
+    :param arrays: Numpy array, or a list of numpy arrays, the per-example data to be yielded along with the sequences.
+    :param boundaries: Inclusive upper bounds of the buckets.  If not specified, will choose them automatically by
+                       :func:`tune_bucket_boundaries`.
+    :param max_pad_fraction: Target maximum fraction of padding in each bucket, to tune the boundaries. (Default 0.1)
+    :param shuffle: If True, will shuffle the examples within each bucket, as well as the order of mini-batches
+                    across the buckets, at each epoch. (Default True)
+    :param ignore_tail: If True, the tail of each bucket which is not enough for a mini-batch would be dropped.
+                        (Default False)
+    :param output_mask: If True, will yield a (batch_size, max_length) mask of the valid positions instead of
+                        the lengths. (Default False)
+    :param pad_value: Value used to pad the sequences. (Default 0)
+    :param dtype: Data type of the padded sequences.  If not specified, will use the dtype of the sequences.
+    """
+
+    def __init__(self, sequences, batch_size, arrays=None, boundaries=None, max_pad_fraction=0.1, shuffle=True,
+                 ignore_tail=False, output_mask=False, pad_value=0, dtype=None):
+        sequences = [np.asarray(s) for s in sequences]
+        if not sequences:
+            raise ValueError('No sequence is given.')
+        self.lengths = np.asarray([len(s) for s in sequences], dtype=np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths[:-1], dtype=np.int64)])
+        self.data = np.concatenate(sequences).astype(dtype or sequences[0].dtype, copy=False)
+        self.arrays = ensure_list_sealed(arrays) if arrays is not None else []
+        for a in self.arrays:
+            if len(a) != len(sequences):
+                raise ValueError('Arrays do not have the same number of examples as the sequences.')
+
+        if boundaries is None:
+            boundaries = tune_bucket_boundaries(self.lengths, max_pad_fraction)
+        else:
+            boundaries = sorted(int(b) for b in boundaries)
+            if not boundaries or boundaries[-1] < np.max(self.lengths):
+                boundaries.append(int(np.max(self.lengths)))
+        self.boundaries = boundaries
+
+        # assign each example to the first bucket whose upper bound is no less than its length.
+        bucket_ids = np.searchsorted(np.asarray(boundaries), self.lengths, side='left')
+        self.buckets = [np.where(bucket_ids == i)[0] for i in range(len(boundaries))]
+
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.ignore_tail = ignore_tail
+        self.output_mask = output_mask
+        self.pad_value = pad_value
+
+    @property
+    def num_examples(self):
+        return len(self.lengths)
+
+    @property
+    def array_count(self):
+        return 2 + len(self.arrays)
+
+    @property
+    def pad_fraction(self):
+        """Fraction of padding when every bucket is padded to its upper bound."""
+        padded = sum(len(b) * bound for b, bound in zip(self.buckets, self.boundaries))
+        return 1.0 - float(np.sum(self.lengths)) / padded if padded else 0.0
+
+    def _make_batch(self, indices):
+        lengths = self.lengths[indices]
+        max_length = int(np.max(lengths))
+        mask = np.arange(max_length) < lengths[:, None]
+
+        # gather the tokens of all the sequences in one fancy-indexing operation.
+        starts = self.offsets[indices]
+        ends_before = np.cumsum(lengths, dtype=np.int64) - lengths
+        flat = np.repeat(starts - ends_before, lengths) + np.arange(np.sum(lengths, dtype=np.int64))
+        padded = np.full((len(indices), max_length), self.pad_value, dtype=self.data.dtype)
+        padded[mask] = self.data[flat]
+
+        ret = (padded, mask if self.output_mask else lengths)
+        return ret + tuple(a[indices] for a in self.arrays)
+
+    def iter_epoch(self):
+        batches = []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = np.random.permutation(bucket)
+            for start in range(0, len(bucket), self.batch_size):
+                indices = bucket[start: start + self.batch_size]
+                if len(indices) < self.batch_size and self.ignore_tail:
+                    break
+                batches.append(indices)
+        if self.shuffle:
+            np.random.shuffle(batches)
+        for indices in batches:
+            yield self._make_batch(indices)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import os
+
+import numpy as np
+import six
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+from .base import DataFlow, _check_state_compatible
+
+__all__ = [
+    'MemmapDataFlow',
+    'open_memmap_arrays',
+]
+
+
+def open_memmap_arrays(path_or_arrays):
+    """
+    Open numpy arrays as read-only memory-mapped arrays.
+
+    :param path_or_arrays: Path of a ".npy" file, path of a directory containing ".npy" files (one file for each
+                           array, sorted by the file names), or a list of ".npy" paths and numpy arrays.
+    :return: List of memory-mapped arrays.  Numpy arrays given in :param:`path_or_arrays` will be kept as-is.
+    """
+    if isinstance(path_or_arrays, six.string_types) and os.path.isdir(path_or_arrays):
+        names = sorted(n for n in os.listdir(path_or_arrays) if n.lower().endswith('.npy'))
+        if not names:
+            raise ValueError('No ".npy" file is found in %r.' % path_or_arrays)
+        path_or_arrays = [os.path.join(path_or_arrays, n) for n in names]
+    ret = []
+    for a in ensure_list_sealed(path_or_arrays):
+        if isinstance(a, six.string_types):
+            a = np.load(a, mmap_mode='r')
+        ret.append(a)
+    return ret
+
+
+def _normalize_ranges(ranges):
+    """Sort the (start, stop) ranges and merge the adjacent ones."""
+    ret = []
+    for start, stop in sorted((int(s), int(e)) for s, e in ranges if e > s):
+        if ret and ret[-1][1] >= start:
+            ret[-1] = (ret[-1][0], max(ret[-1][1], stop))
+        else:
+            ret.append((start, stop))
+    return ret
+
+
+class MemmapDataFlow(DataFlow):
+    """
+    Data flow in mini-batches, which reads the arrays from memory-mapped files.
+
+    This data flow is designed for datasets larger than RAM.  The examples are divided into blocks of
+    contiguous rows, and only one block (plus the tail of the previous block) is read into memory at a
+    time.  When shuffling, the order of the blocks and the order of the rows inside each block are
+    shuffled, so that the reads from disk are still sequential.
+
+    The examples taken by this data flow are described by a list of index ranges, so that training and
+    validation data flows split by :method:`split` would share the memory-mapped files without copying.
+
+    The shuffling of each epoch is determined by a random seed, so that an interrupted epoch could be
+    resumed by :method:`set_state`.  The blocks before the resumed position are skipped without being read.
+
+    :param path_or_arrays: See :func:`open_memmap_arrays` for more details.
+    :param batch_size: Batch size of the mini-batches.
+    :param shuffle: If True, will shuffle the blocks and the rows in each block at every epoch. (Default True)
+    :param block_size: Number of rows in each block.  If not specified, will use 64 * batch_size.
+    :param ignore_tail: If True, the tail of the data which is not enough for a mini-batch would be dropped,
+                        as :class:`TrainingBatchDataFlow` does. (Default True)
+    :param ranges: List of (start, stop) index ranges of the examples taken by this data flow.
+                   If not specified, will take all the examples.
+    """
+
+    def __init__(self, path_or_arrays, batch_size, shuffle=True, block_size=None, ignore_tail=True, ranges=None):
+        self.arrays = open_memmap_arrays(path_or_arrays)
+        total = len(self.arrays[0])
+        for a in self.arrays[1:]:
+            if len(a) != total:
+                raise ValueError('Arrays do not have the same number of examples.')
+        if block_size is None:
+            block_size = 64 * batch_size
+        if block_size < batch_size:
+            raise ValueError('Block size should not be less than the batch size.')
+        if ranges is None:
+            ranges = [(0, total)]
+        ranges = _normalize_ranges(ranges)
+        if ranges and (ranges[0][0] < 0 or ranges[-1][1] > total):
+            raise ValueError('Index ranges out of bound.')
+
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.block_size = block_size
+        self.ignore_tail = ignore_tail
+        self.ranges = ranges
+
+        # index of the current epoch, the random seed of its shuffling, and the number of yielded mini-batches.
+        self._epoch = -1
+        self._seed = None
+        self._offset = 0
+        # whether or not the next epoch should resume from the restored state?
+        self._resuming = False
+
+    @property
+    def num_examples(self):
+        return sum(e - s for s, e in self.ranges)
+
+    @property
+    def array_count(self):
+        return len(self.arrays)
+
+    def get_blocks(self):
+        """Get the list of (start, stop) index ranges of the blocks."""
+        return [
+            (s, min(s + self.block_size, stop))
+            for start, stop in self.ranges
+            for s in range(start, stop, self.block_size)
+        ]
+
+    def get_state(self):
+        return {'epoch': self._epoch, 'seed': self._seed, 'offset': self._offset,
+                'num_examples': self.num_examples, 'batch_size': self.batch_size}
+
+    def is_epoch_completed(self, state):
+        num_batches = self.num_examples // self.batch_size
+        if not self.ignore_tail and self.num_examples % self.batch_size:
+            num_batches += 1
+        return state['seed'] is not None and state['offset'] >= num_batches
+
+    def set_state(self, state):
+        _check_state_compatible(self, state)
+        epoch, seed, offset = state['epoch'], state['seed'], state['offset']
+        if seed is None or self.is_epoch_completed(state):
+            # the epoch has not started, or has been completed, thus the next epoch would start from scratch.
+            self._epoch, self._seed, self._offset, self._resuming = epoch, None, 0, False
+        else:
+            self._epoch, self._seed, self._offset, self._resuming = epoch, seed, offset, True
+
+    def iter_epoch(self):
+        if not self._resuming:
+            self._epoch += 1
+            self._seed = np.random.randint(0, 2147462579)
+            self._offset = 0
+        self._resuming = False
+        random_state = np.random.RandomState(self._seed)
+
+        blocks = self.get_blocks()
+        if self.shuffle:
+            random_state.shuffle(blocks)
+
+        # the blocks are concatenated into a stream of examples, which is then cut into mini-batches,
+        # thus the resumed mini-batch starts at this position of the stream.
+        batch_size = self.batch_size
+        skip = self._offset * batch_size
+        position = 0
+        tail = None
+        for start, stop in blocks:
+            # the permutation is drawn even if the block is skipped, so as to keep the random state in sync.
+            perm = random_state.permutation(stop - start) if self.shuffle else None
+            if position + (stop - start) <= skip:
+                position += stop - start
+                continue
+            block = [np.array(a[start: stop]) for a in self.arrays]
+            if perm is not None:
+                block = [np.take(a, perm, axis=0) for a in block]
+            if position < skip:
+                block = [b[skip - position:] for b in block]
+            position += stop - start
+            if tail is not None:
+                block = [np.concatenate([t, b], axis=0) for t, b in zip(tail, block)]
+                tail = None
+            size = len(block[0])
+            end = size - size % batch_size
+            for i in range(0, end, batch_size):
+                self._offset += 1
+                yield tuple(b[i: i + batch_size] for b in block)
+            if end < size:
+                tail = [b[end:] for b in block]
+
+        if tail is not None and not self.ignore_tail:
+            self._offset += 1
+            yield tuple(tail)
+
+    def _derive(self, ranges, **kwargs):
+        """Derive a new data flow sharing the same arrays, but taking different index ranges."""
+        args = {
+            'batch_size': self.batch_size,
+            'shuffle': self.shuffle,
+            'block_size': self.block_size,
+            'ignore_tail': self.ignore_tail,
+        }
+        args.update(kwargs)
+        return MemmapDataFlow(self.arrays, ranges=ranges, **args)
+
+    def split(self, validation_split=None, valid_size=None, shuffle=True, valid_batch_size=None):
+        """
+        Split the examples into training and validation data flows by portion or by size.
+
+        The validation examples are selected in blocks, so that reading them is still sequential.
+        Both of the returned data flows share the memory-mapped files with this data flow.
+
+        :param validation_split: Portion of the validation set.
+                                 Would be ignored if :param:`valid_size` is specified.
+        :param valid_size: Size of the validation set.
+        :param shuffle: Whether or not to select the validation blocks randomly? (Default True)
+                        If False, will select the tail of the data as validation set.
+        :param valid_batch_size: Batch size of the validation data flow.  If not specified, will use
+                                 the batch size of this data flow.
+
+        :return: (train_flow, valid_flow)
+        """
+        num_examples = self.num_examples
+        if valid_size is None:
+            if validation_split is None:
+                raise ValueError('At least one of "validation_split", "valid_size" should be specified.')
+            if validation_split < 0.5:
+                valid_size = num_examples - int(num_examples * (1.0 - validation_split))
+            else:
+                valid_size = int(num_examples * validation_split)
+        if valid_size <= 0 or valid_size >= num_examples:
+            raise ValueError('Estimated size of validation set %r is either too small or too large.' % valid_size)
+
+        blocks = self.get_blocks()
+        if shuffle:
+            np.random.shuffle(blocks)
+        else:
+            blocks.reverse()
+
+        train_ranges = []
+        valid_ranges = []
+        remain = valid_size
+        for start, stop in blocks:
+            if remain <= 0:
+                train_ranges.append((start, stop))
+            elif stop - start <= remain:
+                valid_ranges.append((start, stop))
+                remain -= stop - start
+            else:
+                valid_ranges.append((stop - remain, stop))
+                train_ranges.append((start, stop - remain))
+                remain = 0
+
+        valid_batch_size = valid_batch_size or self.batch_size
+        train_flow = self._derive(train_ranges)
+        valid_flow = self._derive(valid_ranges, batch_size=valid_batch_size, shuffle=False, ignore_tail=False,
+                                  block_size=max(self.block_size, valid_batch_size))
+        return train_flow, valid_flow
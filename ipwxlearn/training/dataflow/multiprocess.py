@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import traceback
+
+import numpy as np
+from six.moves import queue
+
+from ipwxlearn.utils.concurrent import get_fork_context
+from ipwxlearn.utils.misc import ensure_list_sealed
+from .base import DataFlow
+
+__all__ = [
+    'MultiProcessDataFlow',
+]
+
+#: Seconds to wait before checking the abort flag again, when blocked on semaphores or queues.
+_POLL_INTERVAL = 0.1
+
+
+def _call_with_seed(seed, fn, *args):
+    """Call :param:`fn` with the global numpy random state seeded with :param:`seed`."""
+    state = np.random.get_state()
+    try:
+        np.random.seed(seed)
+        return fn(*args)
+    finally:
+        np.random.set_state(state)
+
+
+class _SharedSlot(object):
+    """
+    A slot of shared memory buffers, one buffer for each array in a mini-batch.
+
+    The buffers are allocated before forking the worker processes, so that the worker processes
+    and the trainer process would see the same memory.
+    """
+
+    def __init__(self, ctx, capacities):
+        self.buffers = [ctx.RawArray('b', max(int(c), 1)) for c in capacities]
+        self.capacities = [len(b) for b in self.buffers]
+
+    def fits(self, arrays):
+        return len(arrays) == len(self.buffers) and \
+            all(a.nbytes <= c for a, c in zip(arrays, self.capacities))
+
+    def write(self, arrays):
+        """Copy the arrays into this slot, returning the (shape, dtype) descriptions."""
+        desc = []
+        for buf, a in zip(self.buffers, arrays):
+            dst = np.ndarray(a.shape, dtype=a.dtype, buffer=buf)
+            np.copyto(dst, a)
+            desc.append((a.shape, a.dtype.str))
+        return desc
+
+    def read(self, desc):
+        """Get zero-copy views of the arrays in this slot."""
+        return tuple(np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf)
+                     for buf, (shape, dtype) in zip(self.buffers, desc))
+
+
+class _Worker(object):
+    """Context of a worker process, which produces every `workers`-th mini-batch of each epoch."""
+
+    def __init__(self, ctx, index, workers, slots):
+        self.index = index
+        self.workers = workers
+        self.slots = slots
+        self.free_slots = ctx.Semaphore(len(slots))
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.process = None
+
+    def _acquire_slot(self, abort):
+        while not abort.is_set():
+            if self.free_slots.acquire(timeout=_POLL_INTERVAL):
+                return True
+        return False
+
+    def run(self, flow, fn, abort):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            epoch_seed, batch_index, state = task
+            try:
+                produced = 0
+                if state is not None:
+                    flow.set_state(state)
+                it = _call_with_seed(epoch_seed, lambda: iter(flow.iter_epoch()))
+                while not abort.is_set():
+                    try:
+                        batch = _call_with_seed(epoch_seed + batch_index, next, it)
+                    except StopIteration:
+                        break
+                    if batch_index % self.workers == self.index:
+                        # every worker iterates through the whole epoch, thus the state is the same in all workers.
+                        state = flow.get_state()
+                        batch = tuple(ensure_list_sealed(batch))
+                        if fn is not None:
+                            batch = tuple(ensure_list_sealed(
+                                _call_with_seed(epoch_seed + batch_index, fn, *batch)))
+                        batch = tuple(np.asarray(a) for a in batch)
+                        if not self._acquire_slot(abort):
+                            break
+                        slot_index = produced % len(self.slots)
+                        slot = self.slots[slot_index]
+                        if slot.fits(batch):
+                            self.results.put(('shared', slot_index, slot.write(batch), state))
+                        else:
+                            self.results.put(('pickled', slot_index, batch, state))
+                        produced += 1
+                    batch_index += 1
+                self.results.put(('end', None, None, None))
+            except Exception:
+                self.results.put(('error', None, traceback.format_exc(), None))
+
+
+class MultiProcessDataFlow(DataFlow):
+    """
+    Data flow that produces mini-batches of another data flow in worker processes.
+
+    This data flow is intended for CPU-bound pipelines written in pure Python (e.g., data augmentation
+    or decoding), which cannot be accelerated by threads because of the GIL.  The worker processes are
+    forked from the trainer process, each having a copy of the wrapped data flow.  Every worker iterates
+    the wrapped data flow with the same random seed, but only the mini-batches assigned to it would be
+    passed to :param:`fn`, so the expensive work should be done in :param:`fn` rather than in the
+    wrapped data flow.
+
+    The processed mini-batches are written into a ring of shared memory buffers, and the trainer process
+    receives zero-copy views of these buffers.  As a result, the yielded arrays are only valid until the
+    next mini-batch is requested, and should be copied if they need to be kept.  The worker processes
+    already read ahead up to `workers * buffers` mini-batches, thus more :param:`buffers` should be
+    preferred to wrapping this data flow by :class:`PrefetchDataFlow`, which would have to copy each
+    mini-batch out of the shared memory.  Mini-batches which do not fit into the buffers (whose sizes
+    are determined by the first mini-batch) would be transferred by pickling instead.
+
+    The order of mini-batches, as well as the random numbers drawn from the global numpy random state in
+    the wrapped data flow and :param:`fn`, are deterministic given :param:`seed`.
+
+    If the wrapped data flow supports resuming, the worker processes send its iterator state along with
+    each mini-batch, so that :method:`get_state` would describe the position of the mini-batches actually
+    consumed.  A resumed epoch is continued by the worker processes with the same random seed.
+
+    :param flow: The wrapped data flow.
+    :param fn: Optional function to process each mini-batch, which accepts the arrays in a mini-batch as
+               unnamed arguments, and returns the processed arrays.
+    :param workers: Number of worker processes. (Default 2)
+    :param buffers: Number of shared memory buffers for each worker. (Default 2)
+    :param seed: Random seed for the worker processes.  If not specified, will draw one from the global
+                 numpy random state at construction.
+    """
+
+    reuse_buffers = True
+
+    def __init__(self, flow, fn=None, workers=2, buffers=2, seed=None):
+        if workers < 1:
+            raise ValueError('There must be at least 1 worker process.')
+        if buffers < 1:
+            raise ValueError('There must be at least 1 shared memory buffer for each worker.')
+        self.flow = flow
+        self.fn = fn
+        self.workers = workers
+        self.buffers = buffers
+        self.seed = seed if seed is not None else np.random.randint(0, 2147462579)
+
+        #: Number of mini-batches that are transferred by pickling instead of the shared memory.
+        self.pickled_count = 0
+
+        self._random_state = np.random.RandomState(self.seed)
+        self._workers = None
+        self._abort = None
+
+        # random seed of the current epoch, the number of consumed mini-batches, and the state of the wrapped
+        # data flow after the last consumed mini-batch.
+        self._epoch_seed = None
+        self._offset = 0
+        self._source_state = None
+        # whether or not the next epoch should resume from the restored state?
+        self._resuming = False
+
+    @property
+    def num_examples(self):
+        return self.flow.num_examples
+
+    @property
+    def array_count(self):
+        return self.flow.array_count
+
+    def get_state(self):
+        source_state = self._source_state if self._source_state is not None else self.flow.get_state()
+        if source_state is None:
+            return None
+        return {'seed': self._epoch_seed, 'offset': self._offset, 'source': source_state}
+
+    def is_epoch_completed(self, state):
+        return self.flow.is_epoch_completed(state['source'])
+
+    def set_state(self, state):
+        self.flow.set_state(state['source'])
+        self._source_state = state['source']
+        if state['seed'] is None or self.is_epoch_completed(state):
+            self._epoch_seed, self._offset, self._resuming = None, 0, False
+        else:
+            self._epoch_seed, self._offset, self._resuming = state['seed'], state['offset'], True
+
+    def _start_workers(self):
+        """Allocate the shared memory buffers and fork the worker processes."""
+        ctx = get_fork_context()
+
+        # probe the first mini-batch, so as to determine the capacity of the shared memory buffers.
+        probe_seed = int(self._random_state.randint(0, 2147462579))
+        it = _call_with_seed(probe_seed, lambda: iter(self.flow.iter_epoch()))
+        try:
+            batch = tuple(ensure_list_sealed(_call_with_seed(probe_seed, next, it)))
+        except StopIteration:
+            raise ValueError('The wrapped data flow does not yield any mini-batch.')
+        if self.fn is not None:
+            batch = tuple(ensure_list_sealed(_call_with_seed(probe_seed, self.fn, *batch)))
+        capacities = [np.asarray(a).nbytes for a in batch]
+
+        self._abort = ctx.Event()
+        self._workers = []
+        for i in range(self.workers):
+            slots = [_SharedSlot(ctx, capacities) for _ in range(self.buffers)]
+            self._workers.append(_Worker(ctx, i, self.workers, slots))
+        for w in self._workers:
+            w.process = ctx.Process(target=w.run, args=(self.flow, self.fn, self._abort))
+            w.process.daemon = True
+            w.process.start()
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._workers is not None:
+            for w in self._workers:
+                w.tasks.put(None)
+            for w in self._workers:
+                w.process.join()
+            self._workers = self._abort = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _drain(self, worker):
+        """Drain the results of a worker until the end of epoch."""
+        while True:
+            try:
+                kind, slot_index, _, _ = worker.results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if not worker.process.is_alive():
+                    return
+                continue
+            if kind in ('end', 'error'):
+                return
+            worker.free_slots.release()
+
+    def _get_result(self, worker):
+        """Wait for the next result of the worker, raising error if the worker process has died."""
+        while True:
+            try:
+                return worker.results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if not worker.process.is_alive():
+                    # the worker might have put the last result right before exiting.
+                    try:
+                        return worker.results.get(timeout=_POLL_INTERVAL)
+                    except queue.Empty:
+                        raise RuntimeError('Worker process %d exited unexpectedly with code %r.' %
+                                           (worker.index, worker.process.exitcode))
+
+    def iter_epoch(self):
+        if self._workers is None:
+            self._start_workers()
+        workers = self._workers
+        if self._resuming:
+            # the workers have been forked with their own copies of the wrapped data flow, thus the restored
+            # state must be sent to them.
+            task = (self._epoch_seed, self._offset, self._source_state)
+        else:
+            self._epoch_seed = int(self._random_state.randint(0, 2147462579))
+            self._offset = 0
+            task = (self._epoch_seed, 0, None)
+        self._resuming = False
+        self._abort.clear()
+        for w in workers:
+            w.tasks.put(task)
+
+        finished = [False] * len(workers)
+        batch_index = self._offset
+        try:
+            while True:
+                w = workers[batch_index % len(workers)]
+                kind, slot_index, payload, state = self._get_result(w)
+                if kind == 'end':
+                    finished[w.index] = True
+                    break
+                elif kind == 'error':
+                    finished[w.index] = True
+                    raise RuntimeError('Error in worker process %d:\n%s' % (w.index, payload))
+                self._offset += 1
+                self._source_state = state
+                try:
+                    if kind == 'shared':
+                        yield w.slots[slot_index].read(payload)
+                    else:
+                        self.pickled_count += 1
+                        yield payload
+                finally:
+                    # the consumer has done with this mini-batch, thus the slot could be reused.
+                    w.free_slots.release()
+                batch_index += 1
+        finally:
+            if not all(finished):
+                self._abort.set()
+            for w in workers:
+                if not finished[w.index]:
+                    self._drain(w)
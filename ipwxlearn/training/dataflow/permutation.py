@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+import six
+
+__all__ = [
+    'FeistelPermutation',
+]
+
+# constants of the round function, taken from the finalizer of SplitMix64.
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_SHIFT_1 = np.uint64(30)
+_SHIFT_2 = np.uint64(27)
+_SHIFT_3 = np.uint64(31)
+
+
+class FeistelPermutation(object):
+    """
+    Pseudo-random permutation over [0, n) with O(1) memory.
+
+    Unlike :func:`numpy.random.permutation`, this class does not materialize the permuted indices.
+    Instead, it computes the i-th element of the permutation on demand, by a balanced Feistel network
+    over the smallest domain [0, 4^k) covering [0, n), together with cycle-walking to map the results
+    back into [0, n).  Thus it is suitable for shuffling very large number of examples, and jumping
+    to any position of the permutation is cheap (e.g., for resuming training in the middle of an epoch).
+
+    The permutation is fully determined by :param:`n` and :param:`seed`, and could be changed at
+    each epoch by :method:`reseed`.  It is not intended to be cryptographically secure.
+
+    :param n: Size of the permutation.
+    :param seed: Random seed of the permutation.  If not specified, will draw one from the global
+                 numpy random state.
+    :param rounds: Number of Feistel rounds. (Default 4)
+    """
+
+    def __init__(self, n, seed=None, rounds=4):
+        n = int(n)
+        if n <= 0:
+            raise ValueError('Size of the permutation must be positive.')
+        if rounds < 1:
+            raise ValueError('There must be at least 1 Feistel round.')
+        self.n = n
+        self.rounds = rounds
+        half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+        self._half_bits = np.uint64(half_bits)
+        self._half_mask = np.uint64((1 << half_bits) - 1)
+        self.seed = self._keys = None
+        self.reseed(seed)
+
+    def reseed(self, seed=None):
+        """
+        Change the random seed of this permutation.
+
+        :param seed: The new random seed.  If not specified, will draw one from the global numpy random state.
+        """
+        if seed is None:
+            seed = np.random.randint(0, 2147462579)
+        rs = np.random.RandomState(seed)
+        high = rs.randint(0, 1 << 31, size=self.rounds).astype(np.uint64)
+        low = rs.randint(0, 1 << 31, size=self.rounds).astype(np.uint64)
+        self.seed = seed
+        self._keys = [np.uint64(k) for k in (high << np.uint64(31)) | low]
+
+    def _round(self, r, key):
+        h = r ^ key
+        h = (h ^ (h >> _SHIFT_1)) * _MIX_1
+        h = (h ^ (h >> _SHIFT_2)) * _MIX_2
+        h ^= h >> _SHIFT_3
+        return h & self._half_mask
+
+    def _encrypt(self, x):
+        left = x >> self._half_bits
+        right = x & self._half_mask
+        for key in self._keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self._half_bits) | right
+
+    def permute(self, positions):
+        """
+        Get the elements of the permutation at specified positions.
+
+        :param positions: Integer, or array of integers in [0, n).
+        :return: Integer, or array of int64 integers, the elements at specified positions.
+        """
+        scalar = np.isscalar(positions)
+        x = np.asarray(positions, dtype=np.int64).reshape([-1])
+        if len(x) and (np.min(x) < 0 or np.max(x) >= self.n):
+            raise IndexError('Positions out of range [0, %d).' % self.n)
+
+        # the Feistel network is a bijection over [0, 4^k), thus by walking along the cycle until
+        # we get back into [0, n), we would get a bijection over [0, n).
+        n = np.uint64(self.n)
+        y = self._encrypt(x.astype(np.uint64))
+        outside = np.where(y >= n)[0]
+        while len(outside):
+            walked = self._encrypt(y[outside])
+            y[outside] = walked
+            outside = outside[walked >= n]
+
+        y = y.astype(np.int64)
+        return int(y[0]) if scalar else y.reshape(np.shape(positions))
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.permute(np.arange(*item.indices(self.n), dtype=np.int64))
+        if isinstance(item, six.integer_types + (np.integer,)):
+            if item < 0:
+                item += self.n
+            return self.permute(item)
+        return self.permute(item)
+
+    def __iter__(self):
+        for batch in self.iter_batches(4096, ignore_tail=False):
+            for i in batch:
+                yield int(i)
+
+    def iter_batches(self, batch_size, start=0, ignore_tail=True):
+        """
+        Iterate the permutation in mini-batches of indices.
+
+        :param batch_size: Number of indices in each mini-batch.
+        :param start: Start from this position of the permutation, so as to resume an interrupted epoch.
+        :param ignore_tail: If True, the tail which is not enough for a mini-batch would be dropped. (Default True)
+        :return: Iterator of int64 index arrays.
+        """
+        while start < self.n:
+            stop = start + batch_size
+            if stop > self.n:
+                if ignore_tail:
+                    break
+                stop = self.n
+            yield self[start: stop]
+            start = stop
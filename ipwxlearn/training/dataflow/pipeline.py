@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import os
+
+import numpy as np
+
+from ipwxlearn.utils.misc import ensure_list_sealed, silent_try
+from .base import DataFlow
+
+__all__ = [
+    'PipelineDataFlow',
+    'CachedDataFlow',
+]
+
+
+def _as_arrays(result):
+    """Convert the result of a transformation to a tuple of arrays."""
+    if isinstance(result, (tuple, list)):
+        return tuple(result)
+    return (result,)
+
+
+class PipelineDataFlow(DataFlow):
+    """
+    Data flow that applies a chain of lazy transformations to the mini-batches of another data flow.
+
+    Instances of this class are usually constructed by :method:`DataFlow.map`, :method:`DataFlow.batch_map`
+    and :method:`DataFlow.filter`.  Chaining more transformations onto a pipeline would not nest the data
+    flows, but extend the chain of transformations, so that all the stages are fused and evaluated in one
+    pass over each mini-batch.  Consecutive per-example stages are further fused into one loop.
+
+    :param source: The source data flow.
+    :param stages: List of (kind, function) tuples, where kind is one of 'map', 'batch_map' and 'filter'.
+    :param array_count: Count of arrays yielded at each mini-batch.  If not specified, will use the
+                        count of the source data flow.
+    """
+
+    def __init__(self, source, stages=(), array_count=None):
+        self.source = source
+        self.stages = list(stages)
+        self._array_count = array_count
+        self._fused = self._fuse(self.stages)
+
+    @staticmethod
+    def _fuse(stages):
+        fused = []
+        for kind, fn in stages:
+            if kind == 'map' and fused and fused[-1][0] == 'map':
+                fused[-1][1].append(fn)
+            elif kind == 'map':
+                fused.append(('map', [fn]))
+            else:
+                fused.append((kind, fn))
+        return fused
+
+    @property
+    def num_examples(self):
+        """
+        Get the total number of examples of the source data flow.
+        This might be an upper bound if there is any filter stage.
+        """
+        return self.source.num_examples
+
+    @property
+    def array_count(self):
+        if self._array_count is not None:
+            return self._array_count
+        return self.source.array_count
+
+    @property
+    def reuse_buffers(self):
+        # the batch_map and filter stages might pass through the arrays of the source.
+        return self.source.reuse_buffers
+
+    def get_state(self):
+        # the stages do not read ahead, so the position of the source is exactly the position of the pipeline.
+        return self.source.get_state()
+
+    def set_state(self, state):
+        self.source.set_state(state)
+
+    def is_epoch_completed(self, state):
+        return self.source.is_epoch_completed(state)
+
+    def _chain(self, kind, fn, array_count=None):
+        return PipelineDataFlow(self.source, self.stages + [(kind, fn)],
+                                array_count=array_count if array_count is not None else self._array_count)
+
+    def map(self, fn, array_count=None):
+        return self._chain('map', fn, array_count)
+
+    def batch_map(self, fn, array_count=None):
+        return self._chain('batch_map', fn, array_count)
+
+    def filter(self, predicate):
+        return self._chain('filter', predicate)
+
+    def _apply(self, batch):
+        """Apply the fused stages to a mini-batch, returning None if all the examples are filtered out."""
+        for kind, fn in self._fused:
+            if kind == 'batch_map':
+                batch = _as_arrays(fn(*batch))
+            elif kind == 'filter':
+                mask = np.asarray(fn(*batch), dtype=np.bool_)
+                if not np.all(mask):
+                    if not np.any(mask):
+                        return None
+                    batch = tuple(a[mask] for a in batch)
+            else:
+                rows = []
+                for row in zip(*batch):
+                    for f in fn:
+                        row = _as_arrays(f(*row))
+                    rows.append(row)
+                batch = tuple(np.stack(col) for col in zip(*rows))
+        return batch
+
+    def iter_epoch(self):
+        for batch in self.source.iter_epoch():
+            batch = self._apply(tuple(ensure_list_sealed(batch)))
+            if batch is not None:
+                yield batch
+
+
+class CachedDataFlow(DataFlow):
+    """
+    Data flow that caches the mini-batches of another data flow after the first complete epoch.
+
+    The cached mini-batches are replayed in later epochs without evaluating the source data flow, so the
+    source should be deterministic (e.g., a chain of deterministic transformations over the testing data,
+    or over a data flow without shuffling).  The order of the cached mini-batches could be shuffled at each
+    epoch, but the examples in each mini-batch would not be re-grouped.
+
+    :param source: The source data flow.
+    :param path: If specified, will cache the mini-batches in this file instead of in memory.
+                 The file would be written by :func:`numpy.save`, thus the arrays must not be objects.
+    :param shuffle: Whether or not to shuffle the order of the cached mini-batches at each epoch? (Default False)
+    """
+
+    def __init__(self, source, path=None, shuffle=False):
+        self.source = source
+        self.path = path
+        self.shuffle = shuffle
+        # list of cached mini-batches if cached in memory, or list of (offset, array_count) if cached in file.
+        self._cache = None
+
+    @property
+    def num_examples(self):
+        return self.source.num_examples
+
+    @property
+    def array_count(self):
+        return self.source.array_count
+
+    @property
+    def reuse_buffers(self):
+        # the first epoch cached in file yields the arrays of the source.
+        return self.path is not None and not self.is_cached and self.source.reuse_buffers
+
+    @property
+    def is_cached(self):
+        """Whether or not the mini-batches have been cached?"""
+        return self._cache is not None
+
+    def clear_cache(self):
+        """Clear the cached mini-batches."""
+        self._cache = None
+        if self.path is not None:
+            silent_try(os.remove, self.path)
+
+    def _fill_cache(self):
+        cache = []
+        if self.path is None:
+            for batch in self.source.iter_epoch():
+                # the source might reuse its buffers, so we must copy the arrays.
+                batch = tuple(np.array(a) for a in ensure_list_sealed(batch))
+                cache.append(batch)
+                yield batch
+        else:
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for batch in self.source.iter_epoch():
+                        batch = tuple(ensure_list_sealed(batch))
+                        cache.append((f.tell(), len(batch)))
+                        for a in batch:
+                            np.save(f, a, allow_pickle=False)
+                        yield batch
+                os.rename(tmp_path, self.path)
+            finally:
+                silent_try(os.remove, tmp_path)
+        # the cache is only committed if the whole epoch has been iterated.
+        self._cache = cache
+
+    def _iter_cache(self):
+        order = np.arange(len(self._cache))
+        if self.shuffle:
+            np.random.shuffle(order)
+        if self.path is None:
+            for i in order:
+                yield self._cache[i]
+        else:
+            with open(self.path, 'rb') as f:
+                for i in order:
+                    offset, count = self._cache[i]
+                    f.seek(offset)
+                    yield tuple(np.load(f, allow_pickle=False) for _ in range(count))
+
+    def iter_epoch(self):
+        if self.is_cached:
+            return self._iter_cache()
+        return self._fill_cache()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import sys
+import threading
+import time
+
+import numpy as np
+import six
+from six.moves import queue
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+from .base import DataFlow
+
+__all__ = [
+    'PrefetchDataFlow',
+]
+
+
+class _EndOfEpoch(object):
+    """Marker put into the queue by a worker which has exhausted the epoch iterator."""
+
+
+class _WorkerError(object):
+    """Marker put into the queue by a worker which has encountered an error."""
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+class PrefetchDataFlow(DataFlow):
+    """
+    Data flow that prefetches mini-batches of another data flow in background threads.
+
+    The mini-batches of the wrapped data flow are pulled by background workers, and put into a
+    bounded queue, so that the next :param:`depth` mini-batches would be ready while the compiled
+    training function is running.  The mini-batches are always yielded in the same order as the
+    wrapped data flow, no matter how many workers are used.
+
+    If the wrapped data flow reuses its buffers (e.g., :class:`TrainingBatchDataFlow` with
+    `reuse_buffers=True`), each mini-batch is copied before it is put into the queue, otherwise the
+    prefetched mini-batches would be overwritten before they are consumed.  The mini-batches of other
+    data flows are put into the queue as they are.
+
+    The iterator state of the wrapped data flow is recorded along with each prefetched mini-batch, so that
+    :method:`get_state` would describe the position of the mini-batches actually consumed, rather than the
+    position of the wrapped data flow which has read ahead.
+
+    The time the consumer has spent on waiting for the queue is recorded, which could be used to
+    tell whether or not the training is input-bound.
+
+    :param flow: The wrapped data flow.
+    :param depth: Maximum number of mini-batches to be prefetched. (Default 2)
+    :param workers: Number of background worker threads. (Default 1)
+                    The workers share the iterator of the wrapped data flow, thus more than one
+                    worker is only beneficial if the wrapped data flow spends most of its time
+                    in code which releases the GIL (e.g., reading files, or copying large arrays).
+    """
+
+    def __init__(self, flow, depth=2, workers=1):
+        if depth < 1:
+            raise ValueError('Prefetch depth must be at least 1.')
+        if workers < 1:
+            raise ValueError('There must be at least 1 prefetch worker.')
+        self.flow = flow
+        self.depth = depth
+        self.workers = workers
+
+        #: Total seconds that the consumer has waited on the queue.
+        self.wait_time = 0.
+        #: Total number of mini-batches that the consumer has taken from the queue.
+        self.wait_count = 0
+        #: Seconds that the consumer has waited on the queue in the last epoch.
+        self.epoch_wait_time = 0.
+
+        # state of the wrapped data flow after the last consumed mini-batch, or after :method:`set_state`.
+        self._state = None
+
+    @property
+    def num_examples(self):
+        return self.flow.num_examples
+
+    @property
+    def array_count(self):
+        return self.flow.array_count
+
+    @property
+    def avg_wait_time(self):
+        """Average seconds that the consumer has waited for each mini-batch."""
+        return self.wait_time / float(self.wait_count) if self.wait_count else 0.
+
+    def get_state(self):
+        if self._state is None:
+            return self.flow.get_state()
+        return self._state
+
+    def set_state(self, state):
+        self.flow.set_state(state)
+        self._state = state
+
+    def is_epoch_completed(self, state):
+        return self.flow.is_epoch_completed(state)
+
+    def reset_wait_time(self):
+        """Reset the recorded waiting time."""
+        self.wait_time = self.epoch_wait_time = 0.
+        self.wait_count = 0
+
+    def iter_epoch(self):
+        copy_batches = self.flow.reuse_buffers
+        it = iter(self.flow.iter_epoch())
+        it_lock = threading.Lock()
+        counter = [0]
+        stopped = threading.Event()
+        q = queue.Queue(self.depth)
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def worker():
+            try:
+                while not stopped.is_set():
+                    with it_lock:
+                        try:
+                            batch = next(it)
+                        except StopIteration:
+                            break
+                        # the wrapped data flow would overwrite the arrays of this mini-batch when the
+                        # next one is requested, so we must copy them before releasing the lock.
+                        if copy_batches:
+                            batch = tuple(np.array(a) for a in ensure_list_sealed(batch))
+                        state = self.flow.get_state()
+                        index = counter[0]
+                        counter[0] += 1
+                    if not put((index, batch, state)):
+                        return
+                put(_EndOfEpoch)
+            except Exception:
+                put(_WorkerError(sys.exc_info()))
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        self.epoch_wait_time = 0.
+        try:
+            # the workers might deliver the mini-batches out of order, so we keep them in a pending
+            # dict until all the previous mini-batches have been yielded.
+            pending = {}
+            next_index = 0
+            running = len(threads)
+            while running > 0 or pending:
+                if next_index in pending:
+                    batch, self._state = pending.pop(next_index)
+                    yield batch
+                    next_index += 1
+                    continue
+                if running <= 0:
+                    # should not happen, unless the wrapped iterator is broken.
+                    break
+
+                start_time = time.time()
+                item = q.get()
+                wait_time = time.time() - start_time
+                self.epoch_wait_time += wait_time
+                self.wait_time += wait_time
+
+                if item is _EndOfEpoch:
+                    running -= 1
+                elif isinstance(item, _WorkerError):
+                    six.reraise(*item.exc_info)
+                else:
+                    self.wait_count += 1
+                    pending[item[0]] = item[1:]
+        finally:
+            stopped.set()
+            # drain the queue, so that no worker would be blocked forever.
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+            for t in threads:
+                t.join()
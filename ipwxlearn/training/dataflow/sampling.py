@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+from .base import DataFlow
+
+__all__ = [
+    'AliasSampler',
+    'SumTreeSampler',
+    'ImportanceSamplingDataFlow',
+    'WeightedSamplingDataFlow',
+    'build_alias_table',
+]
+
+
+def build_alias_table(weights):
+    """
+    Build the Walker alias table of a discrete distribution.
+
+    This is a vectorized variant of Vose's algorithm.  The deficits of the under-full entries and the
+    surpluses of the over-full entries are laid along two cumulative sums.  Each under-full entry takes
+    as alias the over-full entry whose surplus covers the start of its deficit.  An over-full entry whose
+    surplus is exhausted in the middle of some deficit becomes under-full by the rest of that deficit, and
+    takes the next over-full entry as alias.  Thus the table is built in one pass, in O(n log n) time.
+
+    :param weights: 1-D array of non-negative weights, which need not be normalized.
+    :return: (prob, alias), where `prob[i]` is the probability to keep entry i once it is chosen uniformly,
+             and `alias[i]` is the entry to pick otherwise.
+    """
+    weights = np.asarray(weights, dtype=np.float64).reshape([-1])
+    n = len(weights)
+    if n == 0:
+        raise ValueError('Weights must not be empty.')
+    if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+        raise ValueError('Weights must be non-negative and finite.')
+    total = np.sum(weights)
+    if total <= 0:
+        raise ValueError('Sum of the weights must be positive.')
+
+    prob = weights * (n / total)
+    alias = np.arange(n, dtype=np.int64)
+    small = np.where(prob < 1.)[0]
+    large = np.where(prob >= 1.)[0]
+    if len(small) and len(large):
+        # the end positions of the deficits and the surpluses along their cumulative sums.
+        deficit_ends = np.cumsum(1. - prob[small])
+        surplus_ends = np.cumsum(prob[large] - 1.)
+        # the i-th small entry is assigned to the large entry whose surplus covers the start of its deficit.
+        owner = np.searchsorted(surplus_ends, deficit_ends - (1. - prob[small]), side='right')
+        alias[small] = large[np.minimum(owner, len(large) - 1)]
+        # the j-th large entry has been given away until the first deficit boundary at or after the end of
+        # its surplus, and the overshoot is taken from the next large entry.
+        boundaries = np.concatenate([[0.], deficit_ends])
+        bounds = np.searchsorted(boundaries, surplus_ends[:-1], side='left')
+        overshoot = boundaries[np.minimum(bounds, len(small))] - surplus_ends[:-1]
+        prob[large[:-1]] = 1. - np.clip(overshoot, 0., 1.)
+        alias[large[:-1]] = large[1:]
+        # the last large entry is full, up to the rounding errors.
+        prob[large[-1]] = 1.
+    else:
+        # all the entries are full, up to the rounding errors.
+        prob[:] = 1.
+    return prob, alias
+
+
+class AliasSampler(object):
+    """
+    Draw indices from a discrete distribution in O(1) time per sample, by Walker's alias method.
+
+    The entries are partitioned into blocks, each with its own alias table, and a top-level alias table
+    is built over the total weights of the blocks.  Each sample first draws a block from the top-level
+    table, then draws an entry from the block's table.  Updating the weights of a few entries would
+    only rebuild the tables of the affected blocks, along with the small top-level table.
+
+    :param weights: 1-D array of non-negative weights.
+    :param block_size: Number of entries in each block. (Default 4096)
+    """
+
+    def __init__(self, weights, block_size=4096):
+        weights = np.array(weights, dtype=np.float64).reshape([-1])
+        if len(weights) == 0:
+            raise ValueError('Weights must not be empty.')
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError('Weights must be non-negative and finite.')
+        self.weights = weights
+        self.block_size = block_size
+        self._block_count = (len(weights) + block_size - 1) // block_size
+        self._block_weights = np.zeros([self._block_count], dtype=np.float64)
+        self._prob = np.ones([len(weights)], dtype=np.float64)
+        self._alias = np.arange(len(weights), dtype=np.int64)
+        self._top_prob = self._top_alias = None
+        self._rebuild_blocks(np.arange(self._block_count))
+
+    def __len__(self):
+        return len(self.weights)
+
+    def _rebuild_blocks(self, blocks):
+        for b in blocks:
+            start = b * self.block_size
+            w = self.weights[start: start + self.block_size]
+            total = np.sum(w)
+            self._block_weights[b] = total
+            if total > 0:
+                prob, alias = build_alias_table(w)
+                self._prob[start: start + len(w)] = prob
+                self._alias[start: start + len(w)] = alias + start
+        self._top_prob, self._top_alias = build_alias_table(self._block_weights)
+
+    def update(self, indices, weights):
+        """
+        Update the weights of some entries.
+
+        :param indices: Indices of the entries.
+        :param weights: New weights of these entries.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape([-1])
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), indices.shape)
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError('Weights must be non-negative and finite.')
+        self.weights[indices] = weights
+        self._rebuild_blocks(np.unique(indices // self.block_size))
+
+    def sample(self, size, random_state=None):
+        """
+        Draw indices according to the weights, with replacement.
+
+        :param size: Number of indices to draw.
+        :param random_state: Numpy RandomState.  If not specified, will use the global numpy random state.
+        :return: int64 array of the drawn indices.
+        """
+        rs = random_state if random_state is not None else np.random
+        # draw the blocks from the top-level table.
+        blocks = rs.randint(0, self._block_count, size=size)
+        blocks = np.where(rs.rand(size) < self._top_prob[blocks], blocks, self._top_alias[blocks])
+        # draw the entries from the tables of the chosen blocks.
+        starts = blocks * self.block_size
+        lengths = np.minimum(len(self.weights) - starts, self.block_size)
+        indices = starts + (rs.rand(size) * lengths).astype(np.int64)
+        return np.where(rs.rand(size) < self._prob[indices], indices, self._alias[indices])
+
+    @property
+    def total_weight(self):
+        """Get the sum of the weights of all entries."""
+        return np.sum(self._block_weights)
+
+    def probabilities(self):
+        """Get the normalized sampling probabilities of all entries."""
+        return self.weights / self.total_weight
+
+
+class SumTreeSampler(object):
+    """
+    Draw indices from a discrete distribution by a sum-tree, in O(log N) time per sample or per update.
+
+    Each internal node of the tree holds the sum of the weights of its two children, and each sample
+    descends from the root to a leaf.  Unlike :class:`AliasSampler`, updating the weights of k entries
+    only touches O(k log N) nodes, thus this sampler is preferred when the weights are updated at every
+    mini-batch, e.g., the priorities of :class:`ImportanceSamplingDataFlow`.
+
+    :param weights: 1-D array of non-negative weights.
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64).reshape([-1])
+        if len(weights) == 0:
+            raise ValueError('Weights must not be empty.')
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError('Weights must be non-negative and finite.')
+        self._depth = (len(weights) - 1).bit_length()
+        self._capacity = capacity = 1 << self._depth
+        # node 1 is the root, and the children of node i are 2i and 2i + 1, where the leaves start at `capacity`.
+        tree = self._tree = np.zeros([2 * capacity], dtype=np.float64)
+        tree[capacity: capacity + len(weights)] = weights
+        level = capacity // 2
+        while level >= 1:
+            tree[level: 2 * level] = tree[2 * level: 4 * level: 2] + tree[2 * level + 1: 4 * level: 2]
+            level //= 2
+        if tree[1] <= 0:
+            raise ValueError('Sum of the weights must be positive.')
+        #: The weights of the entries, which is a view of the leaves.
+        self.weights = self._tree[capacity: capacity + len(weights)]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def update(self, indices, weights):
+        """
+        Update the weights of some entries.
+
+        :param indices: Indices of the entries.
+        :param weights: New weights of these entries.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape([-1])
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), indices.shape)
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError('Weights must be non-negative and finite.')
+        self.weights[indices] = weights
+        # the sums are recomputed from the children, so that the rounding errors would not accumulate.
+        nodes = np.unique((indices + self._capacity) // 2)
+        while len(nodes) and nodes[0] >= 1:
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+            nodes = np.unique(nodes[nodes > 1] // 2)
+
+    def sample(self, size, random_state=None):
+        """
+        Draw indices according to the weights, with replacement.
+
+        :param size: Number of indices to draw.
+        :param random_state: Numpy RandomState.  If not specified, will use the global numpy random state.
+        :return: int64 array of the drawn indices.
+        """
+        rs = random_state if random_state is not None else np.random
+        tree = self._tree
+        values = rs.rand(size) * tree[1]
+        nodes = np.ones([size], dtype=np.int64)
+        for _ in range(self._depth):
+            left = tree[2 * nodes]
+            # never descend into an empty subtree, which might otherwise happen because of the rounding errors.
+            go_right = ((values >= left) & (tree[2 * nodes + 1] > 0)) | (left <= 0)
+            values = np.where(go_right, values - left, values)
+            nodes = 2 * nodes + go_right
+        return nodes - self._capacity
+
+    @property
+    def total_weight(self):
+        """Get the sum of the weights of all entries."""
+        return self._tree[1]
+
+    def probabilities(self):
+        """Get the normalized sampling probabilities of all entries."""
+        return self.weights / self.total_weight
+
+
+class WeightedSamplingDataFlow(DataFlow):
+    """
+    Data flow that samples mini-batches with replacement, according to the weights of examples.
+
+    Examples are drawn by :class:`AliasSampler` in O(1) time per example, thus this data flow is suitable
+    for class-imbalanced data.  If :param:`class_quotas` is specified, each mini-batch would contain exactly
+    the specified number of examples from each class, drawn according to the weights within that class.
+
+    :param array_or_arrays: Numpy array, or a list of numpy arrays.
+    :param batch_size: Batch size of the mini-batches.
+    :param weights: Weights of the examples.  If not specified, all the examples would have equal weights.
+    :param labels: Class labels of the examples, required if :param:`class_quotas` is specified.
+    :param class_quotas: Dict of {label: count}, the number of examples from each class in every mini-batch.
+                         The counts must sum up to :param:`batch_size`.
+    :param epoch_size: Number of examples sampled in each epoch.  If not specified, will use the number of
+                       examples in the arrays.
+    :param block_size: Block size of the alias tables, see :class:`AliasSampler`. (Default 4096)
+    """
+
+    def __init__(self, array_or_arrays, batch_size, weights=None, labels=None, class_quotas=None, epoch_size=None,
+                 block_size=4096):
+        self.arrays = ensure_list_sealed(array_or_arrays)
+        n = len(self.arrays[0])
+        for a in self.arrays[1:]:
+            if len(a) != n:
+                raise ValueError('Arrays do not have the same number of examples.')
+        if weights is None:
+            weights = np.ones([n], dtype=np.float64)
+        elif len(weights) != n:
+            raise ValueError('Weights do not have the same number of examples as the arrays.')
+        self.batch_size = batch_size
+        self.epoch_size = epoch_size if epoch_size is not None else n
+
+        if class_quotas is None:
+            self._classes = None
+            self._samplers = [AliasSampler(weights, block_size=block_size)]
+        else:
+            if labels is None:
+                raise ValueError('`labels` must be specified along with `class_quotas`.')
+            if sum(class_quotas.values()) != batch_size:
+                raise ValueError('Class quotas must sum up to the batch size.')
+            labels = np.asarray(labels)
+            if len(labels) != n:
+                raise ValueError('Labels do not have the same number of examples as the arrays.')
+            weights = np.asarray(weights, dtype=np.float64)
+            # for each class, the indices of its examples and the quota in every mini-batch.
+            self._classes = []
+            self._samplers = []
+            # map each example to its class, and its position among the examples of that class.
+            self._example_class = np.full([n], -1, dtype=np.int64)
+            self._example_pos = np.zeros([n], dtype=np.int64)
+            for label, quota in sorted(class_quotas.items()):
+                members = np.where(labels == label)[0]
+                if len(members) == 0:
+                    raise ValueError('No example of class %r.' % (label,))
+                self._example_class[members] = len(self._classes)
+                self._example_pos[members] = np.arange(len(members))
+                self._classes.append((members, quota))
+                self._samplers.append(AliasSampler(weights[members], block_size=block_size))
+
+    @property
+    def num_examples(self):
+        return self.epoch_size
+
+    @property
+    def array_count(self):
+        return len(self.arrays)
+
+    def update_weights(self, indices, weights):
+        """
+        Update the weights of some examples, without rebuilding the whole alias table.
+
+        :param indices: Indices of the examples.
+        :param weights: New weights of these examples.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape([-1])
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), indices.shape)
+        if self._classes is None:
+            self._samplers[0].update(indices, weights)
+        else:
+            classes = self._example_class[indices]
+            if np.any(classes < 0):
+                raise ValueError('Cannot update the weights of examples not in any class with quota.')
+            for c in np.unique(classes):
+                mask = classes == c
+                self._samplers[c].update(self._example_pos[indices[mask]], weights[mask])
+
+    def sample_indices(self, size=None):
+        """
+        Draw the indices of a mini-batch.
+
+        :param size: Number of indices to draw.  Must not be specified if there are class quotas,
+                     in which case a whole mini-batch would be drawn.
+        :return: int64 array of the example indices.
+        """
+        if self._classes is None:
+            return self._samplers[0].sample(size if size is not None else self.batch_size)
+        if size is not None and size != self.batch_size:
+            raise ValueError('Size of stratified mini-batches must be the batch size.')
+        indices = np.concatenate([members[sampler.sample(quota)]
+                                  for (members, quota), sampler in zip(self._classes, self._samplers)])
+        np.random.shuffle(indices)
+        return indices
+
+    def iter_epoch(self):
+        for _ in range(max(self.epoch_size // self.batch_size, 1)):
+            indices = self.sample_indices()
+            yield tuple(a[indices] for a in self.arrays)
+
+
+class ImportanceSamplingDataFlow(DataFlow):
+    """
+    Data flow that samples mini-batches in proportion to the per-example priorities, with importance weights.
+
+    Each example i is drawn with probability p_i = s / N + (1 - s) * q_i / sum(q), where q_i is the priority
+    of example i, and s is the :param:`smoothing` factor which guarantees every example a chance to be drawn.
+    Along with the arrays, this data flow yields the importance weights 1 / (N * p_i) of the examples as the
+    last array at each mini-batch, so that the weighted mean of per-example losses is an unbiased estimator
+    of the mean loss over all the examples.
+
+    The priorities are usually updated from the per-example losses computed at each training step, by calling
+    :method:`update_priorities` with :attr:`last_indices`.
+
+    :param array_or_arrays: Numpy array, or a list of numpy arrays.
+    :param batch_size: Batch size of the mini-batches.
+    :param smoothing: Fraction of the uniform distribution mixed into the sampling distribution. (Default 0.1)
+    :param alpha: Priorities are computed as (loss + epsilon) ** alpha from the losses. (Default 1.0)
+    :param epsilon: Small constant added to the losses, to keep the priorities positive. (Default 1e-6)
+    :param initial_priority: Initial priority of all examples. (Default 1.0)
+    :param epoch_size: Number of examples sampled in each epoch.  If not specified, will use the number of
+                       examples in the arrays.
+    :param weight_dtype: Data type of the importance weights. (Default 'float32')
+    """
+
+    def __init__(self, array_or_arrays, batch_size, smoothing=0.1, alpha=1.0, epsilon=1e-6, initial_priority=1.0,
+                 epoch_size=None, weight_dtype='float32'):
+        if not 0. <= smoothing <= 1.:
+            raise ValueError('Smoothing factor must be in [0, 1].')
+        self.arrays = ensure_list_sealed(array_or_arrays)
+        n = len(self.arrays[0])
+        for a in self.arrays[1:]:
+            if len(a) != n:
+                raise ValueError('Arrays do not have the same number of examples.')
+        self.batch_size = batch_size
+        self.smoothing = smoothing
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.epoch_size = epoch_size if epoch_size is not None else n
+        self.weight_dtype = np.dtype(weight_dtype)
+        # the priorities are updated at every mini-batch, thus a sum-tree is used instead of the alias tables.
+        self.sampler = SumTreeSampler(np.full([n], initial_priority, dtype=np.float64))
+        #: Indices of the examples in the last yielded mini-batch.
+        self.last_indices = None
+
+    @property
+    def num_examples(self):
+        return self.epoch_size
+
+    @property
+    def array_count(self):
+        return len(self.arrays) + 1
+
+    @property
+    def priorities(self):
+        """Get the priorities of all examples."""
+        return self.sampler.weights
+
+    def probabilities(self, indices=None):
+        """
+        Get the sampling probabilities of the examples.
+
+        :param indices: Indices of the examples.  If not specified, will return the probabilities of all examples.
+        """
+        n = len(self.sampler)
+        priorities = self.sampler.weights if indices is None else self.sampler.weights[indices]
+        return self.smoothing / n + (1. - self.smoothing) * priorities / self.sampler.total_weight
+
+    def update_priorities(self, indices, losses):
+        """
+        Update the priorities of some examples from their losses.
+
+        :param indices: Indices of the examples.
+        :param losses: Per-example losses of these examples.
+        """
+        losses = np.abs(np.asarray(losses, dtype=np.float64).reshape([-1]))
+        priorities = (losses + self.epsilon) ** self.alpha
+        # the same example might appear more than once in a mini-batch, where the last loss would win.
+        self.sampler.update(indices, np.where(np.isfinite(priorities), priorities, 0.))
+
+    def sample_indices(self, size=None):
+        """
+        Draw the indices of a mini-batch.
+
+        :param size: Number of indices to draw.  If not specified, will use the batch size.
+        :return: int64 array of the example indices.
+        """
+        size = size if size is not None else self.batch_size
+        indices = self.sampler.sample(size)
+        if self.smoothing > 0:
+            uniform = np.random.rand(size) < self.smoothing
+            indices[uniform] = np.random.randint(0, len(self.sampler), size=np.sum(uniform))
+        return indices
+
+    def iter_epoch(self):
+        n = len(self.sampler)
+        for _ in range(max(self.epoch_size // self.batch_size, 1)):
+            indices = self.sample_indices()
+            weights = (1. / (n * self.probabilities(indices))).astype(self.weight_dtype)
+            self.last_indices = indices
+            yield tuple(a[indices] for a in self.arrays) + (weights,)
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import six
+from six.moves import queue
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+from .monitors import Monitor, MonitorChain
+from .utils import run_steps
+
+__all__ = [
+    'ParameterServer',
+    'ParameterServerWorker',
+]
+
+# Kinds of the messages between the parameter server and the workers.
+_PULL, _PUSH, _PARAMS, _ACK, _REJECT, _STOP = range(1, 7)
+
+#: Flag indicating that the floating-point tensors should be, or have been, compressed to float16.
+_FLAG_FLOAT16 = 1
+
+# Each message is prefixed with its length, and starts with a header:
+# magic, kind, flags, number of tensors, parameter version, and a scalar value (e.g., the training loss).
+_MAGIC = b'IPS1'
+_LENGTH = struct.Struct('!Q')
+_HEADER = struct.Struct('!4sBBHQd')
+# Each tensor starts with: length of the name, dtype code, number of dimensions.
+_TENSOR_HEADER = struct.Struct('!HBB')
+# The tensor data are stored in little-endian order.
+_DTYPES = [np.dtype(t).newbyteorder('<') for t in ('float16', 'float32', 'float64', 'int32', 'int64')]
+
+# Seconds to wait for the requests before checking whether or not the server should stop.
+_POLL_INTERVAL = 0.1
+
+
+def _encode_message(kind, version=0, value=0., arrays=None, flags=0):
+    """
+    Encode a message into the binary wire format.
+
+    :param kind: Kind of the message.
+    :param version: Version of the parameters.
+    :param value: A scalar value attached to the message.
+    :param arrays: Dict from names to numpy arrays.
+    :param flags: Flags of the message.  If :data:`_FLAG_FLOAT16` is set, the floating-point arrays
+                  would be compressed to float16.
+    :return: List of the binary parts of the message, including the length prefix.
+    """
+    arrays = arrays or {}
+    parts = [None, _HEADER.pack(_MAGIC, kind, flags, len(arrays), version, value)]
+    for name, a in six.iteritems(arrays):
+        a = np.asarray(a)
+        if flags & _FLAG_FLOAT16 and a.dtype.kind == 'f':
+            a = a.astype(np.float16)
+        dtype = a.dtype.newbyteorder('<')
+        try:
+            code = _DTYPES.index(dtype)
+        except ValueError:
+            raise TypeError('Data type %r is not supported by the wire format.' % a.dtype)
+        name = name.encode('utf-8')
+        parts.append(_TENSOR_HEADER.pack(len(name), code, a.ndim))
+        parts.append(name)
+        parts.append(struct.pack('!%dI' % a.ndim, *a.shape))
+        parts.append(np.ascontiguousarray(a, dtype=dtype).tobytes())
+    parts[0] = _LENGTH.pack(sum(len(p) for p in parts[1:]))
+    return parts
+
+
+def _decode_message(payload):
+    """
+    Decode a message from the binary wire format, excluding the length prefix.
+
+    :return: (kind, flags, version, value, OrderedDict of arrays).  The arrays are views of the payload.
+    """
+    magic, kind, flags, count, version, value = _HEADER.unpack_from(payload, 0)
+    if magic != _MAGIC:
+        raise IOError('Not a message of the parameter server.')
+    offset = _HEADER.size
+    arrays = OrderedDict()
+    for i in range(count):
+        name_length, code, ndim = _TENSOR_HEADER.unpack_from(payload, offset)
+        offset += _TENSOR_HEADER.size
+        name = bytes(payload[offset: offset + name_length]).decode('utf-8')
+        offset += name_length
+        shape = struct.unpack_from('!%dI' % ndim, payload, offset)
+        offset += 4 * ndim
+        dtype = _DTYPES[code]
+        size = int(np.prod(shape))
+        arrays[name] = np.frombuffer(payload, dtype=dtype, count=size, offset=offset).reshape(shape)
+        offset += size * dtype.itemsize
+    return kind, flags, version, value, arrays
+
+
+def _send_message(sock, parts):
+    for p in parts:
+        sock.sendall(p)
+
+
+def _recv_exactly(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    pos = 0
+    while pos < n:
+        received = sock.recv_into(view[pos:], n - pos)
+        if not received:
+            raise EOFError('Connection closed.')
+        pos += received
+    return buf
+
+
+def _recv_message(sock):
+    length, = _LENGTH.unpack(bytes(_recv_exactly(sock, _LENGTH.size)))
+    return _decode_message(_recv_exactly(sock, length))
+
+
+def _connect(address):
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def _get_full_names(graph, params):
+    return [graph.get_variable_info(p).full_name for p in params]
+
+
+class ParameterServer(object):
+    """
+    Parameter server that exposes the trainable variables of a graph over TCP.
+
+    The workers (see :class:`ParameterServerWorker`) pull the parameters, and push the gradients computed on
+    their own mini-batches.  The server applies each pushed gradient by the optimizer, as one training step.
+    If the gradient was computed on parameters which are more than :param:`max_staleness` versions older
+    than the current ones, the push would be rejected and the worker must pull the parameters again.
+    The tensors are transferred in a compact binary format, keyed by the full names of the variables, and
+    might be compressed to float16 at the request of each worker.
+
+    The server runs the training steps in :method:`serve`, within the session of its graph, so the session
+    memo, checkpoints and monitors work in the same way as :func:`~ipwxlearn.training.run_steps`, e.g.,
+    :class:`~ipwxlearn.training.CheckpointMonitor` and :class:`~ipwxlearn.training.ValidationMonitor`.
+
+    This object must be constructed while the graph is activated.
+
+    :param optimizer: Optimizer to apply the gradients.
+    :param params: The variables to be trained.  If not specified, will use all the trainable variables.
+    :param address: (host, port) to listen on.  (Default ('127.0.0.1', 0), i.e., a random local port)
+    :param max_staleness: Maximum number of versions a gradient could lag behind.  If not specified,
+                          all the gradients would be accepted.
+    """
+
+    def __init__(self, optimizer, params=None, address=('127.0.0.1', 0), max_staleness=None):
+        from ipwxlearn import glue
+        from ipwxlearn.glue import G
+        graph = G.current_graph()
+        if params is None:
+            params = graph.get_variables(trainable=True)
+        self.params = ensure_list_sealed(params)
+        self.names = _get_full_names(graph, self.params)
+        self.shapes = [tuple(G.utils.get_variable_shape(p)) for p in self.params]
+        self.max_staleness = max_staleness
+
+        grad_vars = [G.make_placeholder('grad_%d' % i, shape=shape, dtype=glue.config.floatX)
+                     for i, shape in enumerate(self.shapes)]
+        self._apply_fn = G.make_function(inputs=grad_vars, updates=optimizer.apply_gradients(grad_vars, self.params))
+
+        #: Version of the parameters, i.e., the number of applied gradients.
+        self.version = 0
+        #: Number of rejected pushes.
+        self.rejected_count = 0
+
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(address)
+        self._listener.listen(64)
+        #: The (host, port) that the server is listening on.
+        self.address = self._listener.getsockname()
+
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._params_cache = {}
+        #: Number of the workers connected to the server.
+        self._connections = 0
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except (socket.error, OSError):
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._connections += 1
+            t = threading.Thread(target=self._handle_connection, args=(conn,))
+            t.daemon = True
+            t.start()
+
+    def _handle_connection(self, conn):
+        """Forward the requests from a worker to :method:`serve`, or tell the worker to stop."""
+        try:
+            while True:
+                message = _recv_message(conn)
+                with self._lock:
+                    if not self._stopped:
+                        self._requests.put((conn, message))
+                        continue
+                _send_message(conn, _encode_message(_STOP, self.version))
+        except (EOFError, socket.error, OSError):
+            pass
+        finally:
+            conn.close()
+            with self._lock:
+                self._connections -= 1
+
+    def _reply_params(self, conn, flags):
+        from ipwxlearn.glue import G
+        flags &= _FLAG_FLOAT16
+        cached = self._params_cache.get(flags)
+        if cached is None or cached[0] != self.version:
+            values = G.get_variable_values(self.params)
+            arrays = OrderedDict(zip(self.names, values))
+            cached = self._params_cache[flags] = (self.version, _encode_message(_PARAMS, self.version, 0., arrays,
+                                                                               flags=flags))
+        _send_message(conn, cached[1])
+
+    def _is_valid_gradient(self, arrays):
+        """Check whether or not the pushed arrays have the same names and shapes as the parameters."""
+        if len(arrays) != len(self.names):
+            return False
+        return all(n in arrays and arrays[n].shape == shape for n, shape in zip(self.names, self.shapes))
+
+    def serve(self, monitors=None, max_steps=1000, batch_size=32, steps_in_epoch=1000, idle_timeout=60.):
+        """
+        Serve the workers, until :param:`max_steps` gradients have been applied, the monitors induce
+        early-stopping, or no worker has been connected for :param:`idle_timeout` seconds.
+        The whole training is reported to the monitors as one epoch.
+
+        :param monitors: Monitor or a list of monitors, to guard the training process.
+        :param max_steps: Maximum steps to run, where each step applies a gradient pushed by some worker.
+        :param batch_size: Mini-batch size of the workers, reported to the monitors.
+        :param steps_in_epoch: Estimated number of steps in one epoch, reported to the monitors.
+        :param idle_timeout: Seconds to wait for the workers to connect, before the server stops.
+                             If None, the server would wait forever. (Default 60)
+        """
+        from ipwxlearn import glue
+        from ipwxlearn.glue import G
+        if monitors is None:
+            monitor = Monitor()
+        else:
+            monitor = MonitorChain(ensure_list_sealed(monitors))
+
+        # restore the version of the parameters from the session, which is also the global step.
+        memo = G.current_session().memo
+        version_key = __name__ + '.ParameterServer:version'
+        self.version = memo.get(version_key, 0)
+
+        accept_thread = threading.Thread(target=self._accept_loop)
+        accept_thread.daemon = True
+        accept_thread.start()
+
+        monitor.start_training(G, batch_size, steps_in_epoch, max_steps, initial_step=self.version)
+        monitor.start_epoch(0)
+        total_loss = 0.
+        n_steps = 0
+        idle_start = time.time()
+        try:
+            while self.version <= max_steps and not monitor.is_inducing_stopping:
+                try:
+                    conn, (kind, flags, version, value, arrays) = self._requests.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    # stop if all the workers have gone, or none of them has ever come.
+                    if self._connections > 0:
+                        idle_start = time.time()
+                    elif idle_timeout is not None and time.time() - idle_start >= idle_timeout:
+                        break
+                    continue
+                idle_start = time.time()
+                try:
+                    if kind == _PULL:
+                        self._reply_params(conn, flags)
+                        continue
+                    if kind != _PUSH or not self._is_valid_gradient(arrays):
+                        # the peer does not speak our protocol, or does not train the same parameters, so drop the
+                        # connection instead of leaving it waiting for a reply, which would also be noticed by the
+                        # connection thread.
+                        conn.shutdown(socket.SHUT_RDWR)
+                        continue
+                    if self.max_staleness is not None and self.version - version > self.max_staleness:
+                        self.rejected_count += 1
+                        _send_message(conn, _encode_message(_REJECT, self.version))
+                        continue
+
+                    step = self.version
+                    monitor.start_step(step)
+                    self._apply_fn(*(np.asarray(arrays[n], dtype=glue.config.floatX) for n in self.names))
+                    self.version += 1
+                    memo[version_key] = self.version
+                    _send_message(conn, _encode_message(_ACK, self.version))
+                    monitor.end_step(step, value)
+                    total_loss += value
+                    n_steps += 1
+                except (socket.error, OSError):
+                    # the worker has gone, which would be noticed by the connection thread.
+                    pass
+        finally:
+            # tell all the pending and future requests to stop.
+            with self._lock:
+                self._stopped = True
+            while True:
+                try:
+                    conn, _ = self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    _send_message(conn, _encode_message(_STOP, self.version))
+                except (socket.error, OSError):
+                    pass
+            self._listener.close()
+
+        monitor.end_epoch(0, total_loss / max(n_steps, 1))
+        monitor.end_training()
+
+
+class _WorkerStoppingMonitor(Monitor):
+    """Monitor to stop the training loop of a worker once the parameter server says so."""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    @property
+    def is_inducing_stopping(self):
+        return self.worker.stopped
+
+
+class ParameterServerWorker(object):
+    """
+    Worker that trains the parameters held by a :class:`ParameterServer`.
+
+    The worker runs the training steps by :func:`~ipwxlearn.training.run_steps`.  At each step, it computes the
+    gradients of the loss on a mini-batch with its local copy of the parameters, and pushes the gradients to the
+    server.  The local parameters are refreshed by pulling from the server every :param:`pull_steps` steps, or
+    whenever a push is rejected because the local parameters are too stale.  The training loop ends when the
+    server stops.
+
+    The graph of the worker should define the parameters with the same full names as the server.  This object
+    must be constructed while the graph is activated.
+
+    :param address: (host, port) of the parameter server.
+    :param loss: The loss expression.
+    :param input_vars: Input placeholder, or a list of input placeholders for the loss.
+    :param params: The variables to be trained.  If not specified, will use all the trainable variables.
+    :param float16: Whether or not to compress the parameters and the gradients to float16? (Default False)
+    :param pull_steps: Pull the parameters every this number of steps. (Default 1)
+    """
+
+    def __init__(self, address, loss, input_vars, params=None, float16=False, pull_steps=1):
+        from ipwxlearn.glue import G
+        graph = G.current_graph()
+        if params is None:
+            params = graph.get_variables(trainable=True)
+        self.address = tuple(address)
+        self.params = ensure_list_sealed(params)
+        self.names = _get_full_names(graph, self.params)
+        self.flags = _FLAG_FLOAT16 if float16 else 0
+        self.pull_steps = pull_steps
+        grads = G.op.gradients(loss, self.params)
+        self._grad_fn = G.make_function(inputs=ensure_list_sealed(input_vars), outputs=[loss] + grads)
+
+        #: Whether or not the server has stopped.
+        self.stopped = False
+        #: Number of rejected pushes.
+        self.rejected_count = 0
+        self._sock = self._version = self._dtypes = None
+
+    def _request(self, parts):
+        _send_message(self._sock, parts)
+        reply = _recv_message(self._sock)
+        if reply[0] == _STOP:
+            self.stopped = True
+        return reply
+
+    def pull(self):
+        """Pull the parameters from the server."""
+        from ipwxlearn.glue import G
+        kind, _, version, _, arrays = self._request(_encode_message(_PULL, flags=self.flags))
+        if kind == _PARAMS:
+            G.set_variable_values({p: np.asarray(arrays[n], dtype=d)
+                                   for p, n, d in zip(self.params, self.names, self._dtypes)})
+            self._version = version
+
+    def run(self, train_data, batch_size=32, max_steps=None, shuffle=True):
+        """
+        Run the training steps, until the server stops, or :param:`max_steps` steps have been done.
+        Must be called within a session of the graph.
+
+        :param train_data: Numpy array, a list of numpy arrays, or a DataFlow object as the training data.
+        :param batch_size: Mini-batch size of training.
+        :param max_steps: Maximum steps to run in this worker.
+        :param shuffle: Whether or not to shuffle the data after each full-pass?
+        """
+        from ipwxlearn.glue import G
+        self._dtypes = [np.asarray(v).dtype for v in G.get_variable_values(self.params)]
+        self.stopped = False
+        counter = [0]
+
+        def train_step(*args):
+            outputs = self._grad_fn(*args)
+            loss = float(outputs[0])
+            if not self.stopped:
+                arrays = OrderedDict(zip(self.names, outputs[1:]))
+                kind, _, version, _, _ = self._request(
+                    _encode_message(_PUSH, self._version, loss, arrays, flags=self.flags))
+                counter[0] += 1
+                if kind == _REJECT:
+                    self.rejected_count += 1
+                    self.pull()
+                elif kind == _ACK and counter[0] % self.pull_steps == 0:
+                    self.pull()
+            return loss
+
+        self._sock = _connect(self.address)
+        try:
+            self.pull()
+            if not self.stopped:
+                run_steps(G, train_step, train_data, monitor=_WorkerStoppingMonitor(self), batch_size=batch_size,
+                          max_steps=max_steps if max_steps is not None else sys.maxsize, shuffle=shuffle)
+        finally:
+            self._sock.close()
+            self._sock = None
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import mmap
+import os
+import tempfile
+
+import numpy as np
+
+from ipwxlearn.utils.misc import ensure_list_sealed
+
+__all__ = [
+    'ParameterSnapshotStore',
+]
+
+#: Alignment of the buffers in the memory-mapped file, in bytes.
+_ALIGNMENT = 64
+
+
+class ParameterSnapshotStore(object):
+    """
+    Double-buffered store of parameter snapshots.
+
+    This store preallocates two buffers for each parameter: the front buffers hold the committed snapshot
+    (e.g., the best parameters found by early-stopping), while the back buffers receive new snapshots.
+    :method:`capture` copies the current parameters into the back buffers in place, and :method:`commit`
+    swaps the two sets of buffers.  Thus taking a snapshot allocates no memory, and the committed snapshot
+    stays intact while another snapshot is being captured or awaiting for commit.
+
+    The snapshots are represented as dicts from the full names of the variables to the buffers, so they
+    could be stored into the session memo just like the values returned by the sessions.  :method:`restore`
+    assigns all the parameters from such a dict, in one call to a compiled backend function.
+
+    This object must be constructed within a session of the graph.
+
+    :param params: The variables to be captured.
+    :param mmap_dir: If specified, the buffers would be allocated in a temporary memory-mapped file under
+                     this directory, instead of the main memory.
+    """
+
+    def __init__(self, params, mmap_dir=None):
+        from ipwxlearn.glue import G
+        session = G.current_session()
+        self.params = ensure_list_sealed(params)
+        self.names = [session.graph.get_variable_info(p).full_name for p in self.params]
+        values = [np.asarray(v) for v in session.get_variable_values(self.params)]
+
+        self._mmap = None
+        if mmap_dir is not None:
+            sizes = [(v.nbytes + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT for v in values]
+            total = max(2 * sum(sizes), 1)
+            fd, path = tempfile.mkstemp(dir=mmap_dir, suffix='.snapshot')
+            try:
+                os.ftruncate(fd, total)
+                self._mmap = mmap.mmap(fd, total)
+            finally:
+                os.close(fd)
+                # the space of the file would be reclaimed once the memory map is released.
+                os.remove(path)
+            offsets = np.cumsum([0] + sizes * 2)
+            buffers = [np.ndarray(v.shape, dtype=v.dtype, buffer=self._mmap, offset=offsets[i])
+                       for i, v in enumerate(values * 2)]
+        else:
+            buffers = [np.empty(v.shape, dtype=v.dtype) for v in values * 2]
+
+        self._front = dict(zip(self.names, buffers[: len(values)]))
+        self._back = dict(zip(self.names, buffers[len(values):]))
+        self._has_front = False
+        self._restore_fn = None
+
+    @property
+    def front(self):
+        """The committed snapshot, or None if no snapshot has been committed."""
+        return self._front if self._has_front else None
+
+    def capture(self):
+        """
+        Copy the current parameters into the back buffers.
+
+        :return: The captured snapshot, which would be overwritten by the next call to this method
+                 unless it is committed.
+        """
+        from ipwxlearn.glue import G
+        G.current_session().copy_variable_values(self.params, [self._back[n] for n in self.names])
+        return self._back
+
+    def commit(self):
+        """
+        Swap the front and back buffers, such that the last captured snapshot becomes the committed one.
+
+        :return: The committed snapshot.
+        """
+        self._front, self._back = self._back, self._front
+        self._has_front = True
+        return self._front
+
+    def load(self, snapshot):
+        """
+        Copy a snapshot from elsewhere (e.g., a checkpoint) into the front buffers.
+
+        :param snapshot: Dict from the full names of the variables to their values.
+        :return: The committed snapshot.
+        """
+        for n in self.names:
+            np.copyto(self._back[n], snapshot[n])
+        return self.commit()
+
+    def restore(self, snapshot=None):
+        """
+        Assign the parameters from a snapshot.
+
+        :param snapshot: Dict from the full names of the variables to their values.
+                         If not specified, will use the committed snapshot.
+        """
+        from ipwxlearn.glue import G
+        if snapshot is None:
+            snapshot = self.front
+            if snapshot is None:
+                raise ValueError('No snapshot has been committed.')
+        if self._restore_fn is None:
+            values = [self._front[n] for n in self.names]
+            placeholders = [G.make_placeholder('snapshot_%d' % i, shape=v.shape, dtype=v.dtype)
+                            for i, v in enumerate(values)]
+            updates = [G.op.assign(p, ph) for p, ph in zip(self.params, placeholders)]
+            self._restore_fn = G.make_function(inputs=placeholders, updates=updates)
+        self._restore_fn(*[snapshot[n] for n in self.names])
+
+    def close(self):
+        """
+        Release the buffers of this store.
+
+        The memory-mapped file has been removed from the directory once created, so its space would be
+        reclaimed as soon as the snapshots returned by this store are no longer referenced.
+        """
+        self._front = self._back = self._mmap = None
+        self._has_front = False
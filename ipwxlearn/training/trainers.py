@@ -1,19 +1,45 @@
 # -*- coding: utf-8 -*-
+import ctypes
+import itertools
 import sys
+import time
+import traceback
+
+import numpy as np
+import six
+from six.moves import queue
 
 from ipwxlearn.datasets.utils import split_train_valid
+from ipwxlearn import glue
 from ipwxlearn.glue import G
 from ipwxlearn.models import ModelWithLoss, SupervisedModel, UnsupervisedModel
-from ipwxlearn.models.optimizers import AdamOptimizer
-from ipwxlearn.training import SummaryMonitor, ValidationMonitor, TrainingLossMonitor, run_steps, OneShotDataFlow, \
-    TestingBatchDataFlow, TrainingBatchDataFlow
+from ipwxlearn.models.optimizers import AdamOptimizer, SGDOptimizer
+from ipwxlearn.training import LossAccumulator, Monitor, MonitorChain, SummaryMonitor, ValidationMonitor, \
+    TrainingLossMonitor, run_steps, OneShotDataFlow, TestingBatchDataFlow, TrainingBatchDataFlow, \
+    ImportanceSamplingDataFlow
+from ipwxlearn.training.utils import _DATA_STATE_KEY, _GLOBAL_STEP_KEY
+from ipwxlearn.utils.concurrent import ProcessBarrier, get_fork_context
+from ipwxlearn.utils.misc import ensure_list_sealed
 
 __all__ = [
     'Trainer',
     'LossTrainer',
+    'DataParallelTrainer',
+    'HogwildTrainer',
 ]
 
 
+def _unique_scope_name(prefix):
+    """Get a name of sub scope under the current name scope, which is not used by any variable in the current graph."""
+    full_names = [info.full_name for info in six.itervalues(G.current_graph().variable_info_dict)]
+    scope = G.current_name_scope()
+    for i in itertools.count():
+        name = prefix if i == 0 else '%s_%d' % (prefix, i)
+        full_name_prefix = scope.resolve_name(name) + '/'
+        if not any(n.startswith(full_name_prefix) for n in full_names):
+            return name
+
+
 class Trainer(object):
     """
     Trainer that optimizes the model parameters.
@@ -86,18 +112,30 @@ class Trainer(object):
         :return: self
         """
         input_data = X if y is None else (X, y)
+        dtypes = self._get_data_dtypes()
         if self.early_stopping:
             # If early stopping is required, we should construct the validation data flow.
             input_data, valid_data = split_train_valid(input_data, validation_split=self.validation_split)
             if self.validation_batch is None:
                 valid_flow = OneShotDataFlow(valid_data)
             else:
-                valid_flow = TestingBatchDataFlow(valid_data, batch_size=self.validation_batch)
+                valid_flow = TestingBatchDataFlow(valid_data, batch_size=self.validation_batch, dtypes=dtypes)
         else:
             valid_flow = None
-        train_flow = TrainingBatchDataFlow(input_data, batch_size=self.batch_size)
+        train_flow = self._make_train_flow(input_data, dtypes)
         return self.set_data_flow(train_flow, valid_flow)
 
+    def _make_train_flow(self, input_data, dtypes):
+        """Make the training data flow in :method:`set_data`."""
+        return TrainingBatchDataFlow(input_data, batch_size=self.batch_size, reuse_buffers=True, dtypes=dtypes)
+
+    def _get_data_dtypes(self):
+        """
+        Get the dtypes of the arrays in mini-batches, so that the data could be converted at ingestion.
+        Derived classes might override this to return the placeholders of the model.
+        """
+        return None
+
     def set_data_flow(self, train_flow, valid_flow=None):
         """
         Set data flow for this trainer.
@@ -145,16 +183,60 @@ class Trainer(object):
 class LossTrainer(Trainer):
     """
     Trainer that optimizes the model parameters by minimizing loss function.
-    See :class:`Trainer` for details of arguments.
+    See :class:`Trainer` for details of other arguments.
+
+    If importance sampling is enabled, the training examples would be drawn in proportion to their most recent
+    losses by :class:`~ipwxlearn.training.dataflow.ImportanceSamplingDataFlow`, and the per-example losses would
+    be reweighted by the importance weights, so that the training loss remains unbiased.  This requires the
+    per-example losses, which are derived automatically by :method:`set_model`, or should be specified to
+    :method:`set_loss`.
+
+    If :param:`steps_per_call` > 1, the training function would be compiled to run K training steps on K stacked
+    mini-batches in one call, within a backend loop, so as to reduce the overhead of Python at small batch sizes.
+    The monitors would still be notified of each step after the K steps have been performed.  On TensorFlow
+    backend, this requires an optimizer without state variables, e.g.,
+    :class:`~ipwxlearn.models.optimizers.SGDOptimizer`.
+
+    If :param:`accumulate_loss` is True, the training losses would be accumulated on the device by
+    :class:`~ipwxlearn.training.LossAccumulator` instead of being fetched at every step, and would only be
+    fetched when the monitors are going to report the average training loss.
+
+    If :param:`accumulate_steps` > 1, the gradients of K consecutive mini-batches would be summed into backend
+    buffers, and the optimizer would be applied on the averaged gradients once every K mini-batches, so that
+    the effective batch size is K * :param:`batch_size`.  Each mini-batch is still counted as a step by the
+    monitors, and the gradients of the last incomplete group of mini-batches are discarded after training.
+
+    :param importance_sampling: Whether or not to sample the training examples by their losses? (Default False)
+    :param importance_smoothing: Fraction of uniform sampling mixed into the importance sampling. (Default 0.1)
+    :param steps_per_call: Number of training steps performed by each call to the training function. (Default 1)
+    :param accumulate_loss: Whether or not to accumulate the training losses on the device? (Default False)
+    :param accumulate_steps: Number of mini-batches whose gradients are accumulated for each update. (Default 1)
     """
 
     def __init__(self, *args, **kwargs):
+        self.importance_sampling = kwargs.pop('importance_sampling', False)
+        self.importance_smoothing = kwargs.pop('importance_smoothing', 0.1)
+        self.steps_per_call = kwargs.pop('steps_per_call', 1)
+        self.accumulate_loss = kwargs.pop('accumulate_loss', False)
+        self.accumulate_steps = kwargs.pop('accumulate_steps', 1)
+        if self.steps_per_call < 1:
+            raise ValueError('`steps_per_call` must be at least 1.')
+        if self.steps_per_call > 1 and self.importance_sampling:
+            raise ValueError('Importance sampling cannot be used along with `steps_per_call` > 1.')
+        if self.accumulate_steps < 1:
+            raise ValueError('`accumulate_steps` must be at least 1.')
+        if self.accumulate_steps > 1 and self.steps_per_call > 1:
+            raise ValueError('`accumulate_steps` > 1 cannot be used along with `steps_per_call` > 1.')
+        if self.accumulate_loss and self.importance_sampling:
+            raise ValueError('Importance sampling cannot be used along with `accumulate_loss`, since it requires '
+                             'the per-example losses at every step.')
         super(LossTrainer, self).__init__(*args, **kwargs)
 
         self._loss = self._train_params = self._input_var = self._target_var = \
-            self._input_vars = self._train_fn = self._summary = None
+            self._input_vars = self._train_fn = self._summary = self._example_loss = self._loss_accumulator = None
+        self._grad_buffers = self._apply_grads_fn = self._reset_grads_fn = None
 
-    def set_loss(self, loss, train_params, input_var, target_var=None):
+    def set_loss(self, loss, train_params, input_var, target_var=None, example_loss=None):
         """
         Set the loss expression that should be minimized.
 
@@ -162,13 +244,18 @@ class LossTrainer(Trainer):
         :param train_params: Parameters that should be trained in the loss.
         :param input_var: Input placeholder.
         :param target_var: Target placeholder, if the loss should be computed along with label.
+        :param example_loss: The per-example loss expression, whose mean is included in :param:`loss`.
+                             Required if importance sampling is enabled.
 
         :return: self
         """
+        if self.importance_sampling and example_loss is None:
+            raise ValueError('Importance sampling requires the per-example loss.')
         self._loss = loss
         self._train_params = train_params
         self._input_var = input_var
         self._target_var = target_var
+        self._example_loss = example_loss
 
         # check the arguments and prepare for training function
         if target_var is None:
@@ -176,16 +263,76 @@ class LossTrainer(Trainer):
         else:
             self._input_vars = [self._input_var, self._target_var]
 
-        # gather summaries
-        loss_summary = G.summary.scalar_summary('training_loss', self._loss)
+        # gather summaries, and compile the training function.
         self._summary = G.summary.merge_summary(G.summary.collect_variable_summaries(self._train_params))
+        self._compile_train_fn()
+        return self
+
+    def _compile_train_fn(self):
+        """Derive the update expressions for training, and compile the training function."""
+        loss_summary = G.summary.scalar_summary('training_loss', self._loss)
         output_vars = [self._loss, loss_summary]
 
-        # derive update expressions for training, and compile the training function.
-        updates = self.optimizer.minimize(self._loss, self._train_params)
-        self._train_fn = G.make_function(inputs=self._input_vars, outputs=output_vars, updates=updates)
+        # the losses are accumulated by the updates of the training function, instead of being fetched.
+        # the accumulator is created only once, and is reused if the loss is set again.
+        if self.accumulate_loss:
+            if self._loss_accumulator is None:
+                with G.name_scope(_unique_scope_name('loss_accumulator')):
+                    self._loss_accumulator = LossAccumulator(name='loss')
+            output_vars = []
+
+        # the gradients are summed into the buffers, and applied every few steps by another function.
+        if self.accumulate_steps > 1:
+            self._build_gradient_accumulation()
+
+        def get_updates(loss):
+            if self._grad_buffers is not None:
+                grads = G.op.gradients(loss, self._train_params)
+                updates = [G.op.assign(b, b + g) for b, g in zip(self._grad_buffers, grads)]
+            else:
+                updates = ensure_list_sealed(self.optimizer.minimize(loss, self._train_params))
+            if self._loss_accumulator is not None:
+                updates += self._loss_accumulator.get_updates(loss)
+            return updates
 
-        return self
+        # derive update expressions for training, and compile the training function.
+        if self.importance_sampling:
+            # the mean of per-example losses in the loss is replaced by the mean of reweighted losses,
+            # and the per-example losses are fetched to update the priorities of examples.
+            weight_var = G.make_placeholder('example_weight', shape=(None,), dtype=glue.config.floatX)
+            train_loss = self._loss + G.op.mean((weight_var - 1) * self._example_loss)
+            loss_summary = G.summary.scalar_summary('training_loss', train_loss)
+            output_vars = [train_loss, loss_summary, self._example_loss]
+            self._train_fn = G.make_function(inputs=ensure_list_sealed(self._input_vars) + [weight_var],
+                                             outputs=output_vars, updates=get_updates(train_loss))
+        elif self.steps_per_call > 1:
+            # TensorFlow cannot create the state variables of optimizers within the backend loop.
+            if glue.config.backend == 'tensorflow' and self.optimizer.has_state:
+                raise NotImplementedError('`steps_per_call` > 1 with an optimizer having state variables (%s) is not '
+                                          'supported by TensorFlow backend yet.' % self.optimizer.__class__.__name__)
+            # the loss is rebuilt on the inputs of each step within the backend loop.
+            input_vars = ensure_list_sealed(self._input_vars)
+
+            def step_fn(*inputs):
+                loss = G.utils.replace_placeholders(self._loss, dict(zip(input_vars, inputs)))
+                return [loss], get_updates(loss)
+            self._train_fn = G.make_multi_step_function(input_vars, step_fn, output_dtypes=[self._loss.dtype])
+        else:
+            self._train_fn = G.make_function(inputs=self._input_vars, outputs=output_vars,
+                                             updates=get_updates(self._loss))
+
+    def _build_gradient_accumulation(self):
+        """Make the gradient buffers, and compile the functions to apply and to reset the gradients."""
+        # the buffers depend on the shapes of the parameters, thus are created each time the loss is set.
+        with G.name_scope(_unique_scope_name('gradient_accumulation')):
+            self._grad_buffers = [
+                G.make_variable('grad_%d' % i, G.utils.get_variable_shape(p), G.init.Constant(0.),
+                                dtype=glue.config.floatX)
+                for i, p in enumerate(self._train_params)
+            ]
+        grads = [b / float(self.accumulate_steps) for b in self._grad_buffers]
+        self._apply_grads_fn = G.make_function(updates=self.optimizer.apply_gradients(grads, self._train_params))
+        self._reset_grads_fn = G.make_function(updates=[G.op.assign(b, b * 0.) for b in self._grad_buffers])
 
     def set_model(self, model, input_var, target_var=None, l1_reg=None, l2_reg=None, **kwargs):
         if not isinstance(model, ModelWithLoss):
@@ -203,7 +350,8 @@ class LossTrainer(Trainer):
         else:
             inputs = G.layers.get_output(model.input_layer, **kwargs)
 
-        loss = G.op.mean(model.get_loss_for(inputs, target=target_var, **kwargs))
+        example_loss = model.get_loss_for(inputs, target=target_var, **kwargs)
+        loss = G.op.mean(example_loss)
         train_params = G.layers.get_all_params(model, trainable=True)
 
         # add the regularization term to the loss if required.
@@ -215,11 +363,26 @@ class LossTrainer(Trainer):
                 loss += l2_reg * G.op.l2_reg(reg_params)
 
         # store the loss and parameters
-        return self.set_loss(loss, train_params, input_var, target_var=target_var)
+        return self.set_loss(loss, train_params, input_var, target_var=target_var, example_loss=example_loss)
+
+    def _make_train_flow(self, input_data, dtypes):
+        if self.importance_sampling:
+            return ImportanceSamplingDataFlow(input_data, batch_size=self.batch_size,
+                                              smoothing=self.importance_smoothing, weight_dtype=glue.config.floatX)
+        return super(LossTrainer, self)._make_train_flow(input_data, dtypes)
+
+    def _get_data_dtypes(self):
+        if self._input_vars is None:
+            return None
+        return ensure_list_sealed(self._input_vars)
 
     def set_data_flow(self, train_flow, valid_flow=None):
+        if self.importance_sampling and not isinstance(train_flow, ImportanceSamplingDataFlow):
+            raise TypeError('Importance sampling requires the training data flow to be %r.' %
+                            ImportanceSamplingDataFlow)
         if valid_flow is not None:
-            if train_flow.array_count != valid_flow.array_count:
+            # the importance weights are yielded as an extra array by the training data flow.
+            if self._data_array_count(train_flow) != valid_flow.array_count:
                 raise ValueError('Number of arrays returned by training and validation data flow at each mini-batch '
                                  'does not agree.')
         return super(LossTrainer, self).set_data_flow(train_flow=train_flow, valid_flow=valid_flow)
@@ -241,10 +404,11 @@ class LossTrainer(Trainer):
             self.set_data(X, y)
 
         # validate whether or not we've got right number of arrays from the data flow.
-        if self._train_flow.array_count == 1:
+        array_count = self._data_array_count(self._train_flow)
+        if array_count == 1:
             if self._target_var is not None:
                 raise ValueError('Supervised model requires target data for training.')
-        elif self._train_flow.array_count == 2:
+        elif array_count == 2:
             if self._target_var is None:
                 raise ValueError('Unsupervised model does not need target data for training.')
         else:
@@ -272,9 +436,478 @@ class LossTrainer(Trainer):
         else:
             monitors.append(TrainingLossMonitor(log_file=log_file, steps=self.validation_steps))
 
+        # clear the gradients left by previous training.
+        if self._grad_buffers is not None:
+            self._reset_grads_fn()
+
         # now it's time to run the training steps.
         max_steps = int(self.max_epoch * len(X) / self.batch_size)
-        run_steps(G, self._train_fn, self._train_flow, monitor=monitors, batch_size=self.batch_size,
-                  max_steps=max_steps, summary_writer=summary_writer)
+        self._run_steps(monitors, max_steps, summary_writer)
 
         return self
+
+    def _run_steps(self, monitors, max_steps, summary_writer):
+        """Run the training steps with the prepared monitors."""
+        run_steps(G, self._get_train_step(), self._train_flow, monitor=monitors, batch_size=self.batch_size,
+                  max_steps=max_steps, summary_writer=summary_writer, steps_per_call=self.steps_per_call,
+                  loss_accumulator=self._loss_accumulator)
+
+    def _data_array_count(self, train_flow):
+        """Get the number of data arrays yielded by the training flow, excluding the importance weights."""
+        return train_flow.array_count - (1 if self.importance_sampling else 0)
+
+    def _get_train_step(self):
+        """Get the function that performs a training step on the arrays yielded by the training flow."""
+        train_fn = self._train_fn
+        train_flow = self._train_flow
+
+        if self.importance_sampling:
+            def train_step(*args):
+                loss, summary, example_loss = train_fn(*args)
+                train_flow.update_priorities(train_flow.last_indices, example_loss)
+                return loss, summary
+        else:
+            train_step = train_fn
+
+        if self.accumulate_steps <= 1:
+            return train_step
+
+        # apply and then reset the accumulated gradients, every few steps.
+        accumulate_steps = self.accumulate_steps
+        apply_grads_fn = self._apply_grads_fn
+        reset_grads_fn = self._reset_grads_fn
+        counter = [0]
+
+        def accumulate_step(*args):
+            ret = train_step(*args)
+            counter[0] += 1
+            if counter[0] >= accumulate_steps:
+                apply_grads_fn()
+                reset_grads_fn()
+                counter[0] = 0
+            return ret
+        return accumulate_step
+
+
+#: Commands from the trainer process to the other workers of :class:`DataParallelTrainer`.
+_CMD_STEP, _CMD_STOP = 0, 1
+
+#: Alignment of the parameters in the shared memory block of :class:`HogwildTrainer`, in bytes.
+_SHARED_PARAM_ALIGNMENT = 64
+
+
+class _GradientAllReduce(object):
+    """
+    Shared memory buffers for averaging the losses and gradients of the workers in :class:`DataParallelTrainer`.
+
+    At each step, every worker writes its flattened gradients into its own row of the gradient buffer.  After
+    all the workers have done so, each worker sums up a distinct chunk of the columns into the result buffer,
+    so that the reduction is shared among the workers.  Then every worker reads the averaged gradients from
+    the result buffer.  The buffers must be allocated before forking the worker processes.
+    """
+
+    def __init__(self, ctx, workers, param_shapes, dtype):
+        self.workers = workers
+        self.shapes = [tuple(s) for s in param_shapes]
+        self.offsets = [0]
+        for shape in self.shapes:
+            self.offsets.append(self.offsets[-1] + int(np.prod(shape)))
+        total = self.offsets[-1]
+        dtype = np.dtype(dtype)
+
+        self._grads = np.ndarray((workers, total), dtype=dtype,
+                                 buffer=ctx.RawArray('b', max(workers * total * dtype.itemsize, 1)))
+        self._result = np.ndarray((total,), dtype=dtype, buffer=ctx.RawArray('b', max(total * dtype.itemsize, 1)))
+        self._losses = np.ndarray((workers,), dtype=np.float64, buffer=ctx.RawArray('d', workers))
+        bounds = np.linspace(0, total, workers + 1).astype(np.int64)
+        self._chunks = list(zip(bounds[:-1], bounds[1:]))
+
+        self.command = ctx.RawValue('i', _CMD_STEP)
+        self.barrier = ProcessBarrier(ctx, workers)
+        self.abort = ctx.Event()
+        self.errors = ctx.Queue()
+        # the worker processes watched by the trainer process, which are set after forking.
+        self.processes = None
+
+    def wait(self):
+        """Wait at the barrier, returning False if aborted or if any of the watched processes has exited."""
+        return self.barrier.wait(self.abort, processes=self.processes)
+
+    def reduce(self, rank, loss, grads):
+        """
+        Average the losses and the gradients of all the workers.
+
+        :param rank: Rank of this worker.
+        :param loss: Training loss of this worker.
+        :param grads: Gradients of this worker, one array for each parameter.
+        :return: (average loss, list of averaged gradients), or None if aborted.
+        """
+        row = self._grads[rank]
+        for g, start, end in zip(grads, self.offsets[:-1], self.offsets[1:]):
+            row[start: end] = np.ravel(g)
+        self._losses[rank] = loss
+        if not self.wait():
+            return None
+
+        start, end = self._chunks[rank]
+        if end > start:
+            np.sum(self._grads[:, start: end], axis=0, out=self._result[start: end])
+            self._result[start: end] *= 1. / self.workers
+        if not self.wait():
+            return None
+
+        # the results would not be overwritten until every worker has started the next step.
+        grads = [self._result[start: end].reshape(shape)
+                 for start, end, shape in zip(self.offsets[:-1], self.offsets[1:], self.shapes)]
+        return float(np.mean(self._losses)), grads
+
+
+def _raise_worker_error(errors, processes, poll_interval=0.1):
+    """
+    Raise the error reported by a worker process.
+
+    The worker processes might have been killed (e.g., by the OOM killer) without reporting any error,
+    thus an error would also be raised if any of them has exited.
+
+    :param errors: Queue of (rank, error message) reported by the worker processes.
+    :param processes: List of (rank, process) of the worker processes.
+    """
+    while True:
+        # the errors reported by the exited processes must have been flushed into the queue.
+        dead = [(rank, p.exitcode) for rank, p in processes if not p.is_alive()]
+        try:
+            rank, message = errors.get(timeout=poll_interval)
+        except queue.Empty:
+            if dead:
+                raise RuntimeError('Worker processes exited unexpectedly: %s.' %
+                                   ', '.join('%d (exit code %r)' % d for d in dead))
+        else:
+            raise RuntimeError('Error in worker process %d:\n%s' % (rank, message))
+
+
+def _iter_batches_forever(flow):
+    """Iterate through the mini-batches of a data flow, epoch after epoch."""
+    while True:
+        empty = True
+        for args in flow.iter_epoch():
+            empty = False
+            yield args
+        if empty:
+            raise ValueError('The training data flow does not yield any mini-batch.')
+
+
+class DataParallelTrainer(LossTrainer):
+    """
+    Trainer that optimizes the model parameters with several worker processes on a single node.
+
+    The trainer process is the worker of rank 0, and the other workers are forked from it when :method:`fit`
+    is called, each having a copy of the compiled functions and the model parameters.  At each step, every
+    worker computes the gradients on its own mini-batch, then the gradients are averaged through a shared
+    memory all-reduce, and every worker applies the same update by the optimizer, so that the replicas of the
+    parameters stay in sync.  The effective batch size is thus :param:`workers` * :param:`batch_size`, and the
+    maximum number of steps is divided by :param:`workers` accordingly.
+
+    The monitors, including validation, summaries and checkpoints, are only run in the trainer process.
+    The monitors should not change the parameters during training, otherwise the replicas would diverge.
+
+    If the data is set by :method:`set_data` (or :method:`fit`), the training data would be divided into
+    :param:`workers` shards, one for each worker.  If a data flow is set by :method:`set_data_flow`, each of
+    the other workers would iterate through its own copy of the data flow, with a different random seed.
+    When resuming from a checkpoint, only the position of the data flow in the trainer process is restored.
+
+    The worker processes might compete for the CPU cores with the multi-threaded BLAS libraries, thus it is
+    recommended to limit the BLAS threads, e.g., by setting `OMP_NUM_THREADS`.  Since the worker processes
+    are forked, this trainer is only supported by the Theano backend.
+
+    :param workers: Number of worker processes, including the trainer process. (Default 2)
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.workers = kwargs.pop('workers', 2)
+        super(DataParallelTrainer, self).__init__(*args, **kwargs)
+        if self.workers < 1:
+            raise ValueError('There must be at least 1 worker process.')
+        if self.importance_sampling or self.steps_per_call > 1 or self.accumulate_loss or \
+                self.accumulate_steps > 1:
+            raise ValueError('Data parallel training cannot be used along with importance sampling, '
+                             '`steps_per_call`, `accumulate_loss` or `accumulate_steps`.')
+        if glue.config.backend == 'tensorflow':
+            raise NotImplementedError('Data parallel training is not supported by TensorFlow backend yet.')
+
+        self._grad_fn = self._apply_grads_fn = None
+        self._shard_flows = None
+        self._all_reduce = None
+
+    def _compile_train_fn(self):
+        params = ensure_list_sealed(self._train_params)
+        grads = G.op.gradients(self._loss, params)
+        self._grad_fn = G.make_function(inputs=self._input_vars, outputs=[self._loss] + grads)
+        grad_vars = [G.make_placeholder('grad_%d' % i, shape=G.utils.get_variable_shape(p), dtype=glue.config.floatX)
+                     for i, p in enumerate(params)]
+        self._apply_grads_fn = G.make_function(inputs=grad_vars,
+                                               updates=self.optimizer.apply_gradients(grad_vars, params))
+
+    def _make_train_flow(self, input_data, dtypes):
+        arrays = input_data if isinstance(input_data, (tuple, list)) else [input_data]
+        bounds = np.linspace(0, len(arrays[0]), self.workers + 1).astype(np.int64)
+        if bounds[1] - bounds[0] < self.batch_size:
+            raise ValueError('Too few data such that some worker would not get a mini-batch.')
+        flows = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            shard = [a[start: end] for a in arrays]
+            flows.append(super(DataParallelTrainer, self)._make_train_flow(
+                shard if isinstance(input_data, (tuple, list)) else shard[0], dtypes))
+        self._shard_flows = flows
+        return flows[0]
+
+    def _parallel_step(self, rank, args):
+        """Perform a training step in the worker of :param:`rank`, returning the average loss or None if aborted."""
+        outputs = self._grad_fn(*args)
+        reduced = self._all_reduce.reduce(rank, outputs[0], outputs[1:])
+        if reduced is None:
+            return None
+        loss, grads = reduced
+        self._apply_grads_fn(*grads)
+        return loss
+
+    def _worker_main(self, rank, flow, seed):
+        """Run the training steps in a forked worker process, until stopped by the trainer process."""
+        all_reduce = self._all_reduce
+        try:
+            np.random.seed(seed)
+            batches = _iter_batches_forever(flow)
+            while all_reduce.wait() and all_reduce.command.value == _CMD_STEP:
+                if self._parallel_step(rank, next(batches)) is None:
+                    break
+        except Exception:
+            all_reduce.errors.put((rank, traceback.format_exc()))
+            all_reduce.abort.set()
+
+    def _raise_worker_error(self):
+        _raise_worker_error(self._all_reduce.errors, list(enumerate(self._all_reduce.processes, 1)))
+
+    def _get_train_step(self):
+        def train_step(*args):
+            if not self._all_reduce.wait():
+                self._raise_worker_error()
+            loss = self._parallel_step(0, args)
+            if loss is None:
+                self._raise_worker_error()
+            return loss
+        return train_step
+
+    def _run_steps(self, monitors, max_steps, summary_writer):
+        ctx = get_fork_context()
+        param_shapes = [G.utils.get_variable_shape(p) for p in ensure_list_sealed(self._train_params)]
+        self._all_reduce = _GradientAllReduce(ctx, self.workers, param_shapes, glue.config.floatX)
+
+        # each of the other workers iterates through its own shard, or its own copy of the data flow.
+        if self._shard_flows is not None and self._train_flow is self._shard_flows[0]:
+            worker_flows = self._shard_flows[1:]
+        else:
+            worker_flows = [self._train_flow] * (self.workers - 1)
+        processes = []
+        for rank, flow in enumerate(worker_flows, 1):
+            seed = np.random.randint(0, 2147462579)
+            p = ctx.Process(target=self._worker_main, args=(rank, flow, seed))
+            p.daemon = True
+            p.start()
+            processes.append(p)
+        self._all_reduce.processes = processes
+
+        completed = False
+        try:
+            super(DataParallelTrainer, self)._run_steps(monitors, max(max_steps // self.workers, 0),
+                                                        summary_writer)
+            completed = True
+        finally:
+            if completed:
+                self._all_reduce.command.value = _CMD_STOP
+                self._all_reduce.wait()
+            else:
+                self._all_reduce.abort.set()
+            for p in processes:
+                p.join()
+            self._all_reduce = None
+
+
+class _HogwildWorkerMonitor(Monitor):
+    """Monitor of a worker in :class:`HogwildTrainer`, which counts the steps and stops when required."""
+
+    def __init__(self, rank, step_counts, loss_sums, stop):
+        self.rank = rank
+        self.step_counts = step_counts
+        self.loss_sums = loss_sums
+        self.stop = stop
+
+    def end_step(self, step, loss):
+        # the loss sum must be updated before the step count, since the coordinator reads them in reverse order.
+        self.loss_sums[self.rank] += loss
+        self.step_counts[self.rank] += 1
+
+    @property
+    def is_inducing_stopping(self):
+        return self.stop.is_set()
+
+
+class HogwildTrainer(DataParallelTrainer):
+    """
+    Trainer that optimizes the model parameters by asynchronous SGD with several worker processes.
+
+    The trainable parameters are moved into a shared memory block before the worker processes are forked,
+    so that every worker sees the same parameters.  Each worker runs its own :func:`run_steps` loop on its own
+    shard of training data, computes the gradients of its mini-batch, and updates the shared parameters in place
+    without any lock (Hogwild!).  For the parameters with two or more dimensions, only the rows with non-zero
+    gradients are written, so the workers rarely interfere with each other on sparse models, e.g., large
+    embedding tables.
+
+    The trainer process acts as the coordinator, which does not train the model.  It watches the steps done by
+    the workers, reports them to the monitors with the average loss of the steps since last check, and stops the
+    workers when the maximum steps have been reached or the monitors induce early-stopping.  Thus validation,
+    early-stopping and checkpoints are all done in the trainer process, on the shared parameters which are
+    being updated by the workers.  Unlike :class:`DataParallelTrainer`, the maximum number of steps is not
+    divided by :param:`workers`, since each step is performed on one mini-batch.
+
+    The global step counter is kept in the session memo as :func:`run_steps` does, thus the training can be
+    resumed from a checkpoint.  However, the positions of the workers in their data flows are not restored.
+
+    Only :class:`~ipwxlearn.models.optimizers.SGDOptimizer` is supported, and only on the Theano backend.
+
+    :param workers: Number of worker processes, not including the trainer process. (Default 2)
+    :param poll_interval: Seconds to wait before checking the progress of the workers again. (Default 0.01)
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.poll_interval = kwargs.pop('poll_interval', 0.01)
+        super(HogwildTrainer, self).__init__(*args, **kwargs)
+        if not isinstance(self.optimizer, SGDOptimizer):
+            raise TypeError('Hogwild training only supports %r.' % SGDOptimizer)
+
+    def _compile_train_fn(self):
+        grads = G.op.gradients(self._loss, ensure_list_sealed(self._train_params))
+        self._grad_fn = G.make_function(inputs=self._input_vars, outputs=[self._loss] + grads)
+
+    def _make_shared_params(self, ctx):
+        """Copy the trainable parameters into a shared memory block, and let the backend variables use it."""
+        def align(offset):
+            return (offset + _SHARED_PARAM_ALIGNMENT - 1) // _SHARED_PARAM_ALIGNMENT * _SHARED_PARAM_ALIGNMENT
+
+        params = ensure_list_sealed(self._train_params)
+        values = [np.asarray(v) for v in G.get_variable_values(params)]
+        # each parameter starts at an aligned address, since Theano refuses unaligned arrays.
+        size = sum(align(v.nbytes) for v in values)
+        # the views keep the shared memory block alive.
+        block = ctx.RawArray('b', max(size, 1) + _SHARED_PARAM_ALIGNMENT)
+        base = ctypes.addressof(block)
+        offset = align(base) - base
+        views = []
+        for p, v in zip(params, values):
+            view = np.ndarray(v.shape, dtype=v.dtype, buffer=block, offset=offset)
+            np.copyto(view, v)
+            # the Theano shared variables would use the buffer as their storage if borrowed, unless the
+            # value has to be copied (e.g., onto a GPU device), in which case the workers would update
+            # buffers that are never read by the gradient function.
+            p.set_value(view, borrow=True)
+            if not np.may_share_memory(p.get_value(borrow=True, return_internal_type=True), view):
+                raise RuntimeError('Hogwild training requires the parameter %r to be stored in the shared memory, '
+                                   'but the backend has copied its value.' % p)
+            views.append(view)
+            offset += align(v.nbytes)
+        return views
+
+    def _worker_main(self, rank, flow, seed, views, step_counts, loss_sums, stop, errors):
+        """Run the training steps in a forked worker process, until stopped by the coordinator."""
+        learning_rate = self.optimizer.learning_rate
+
+        def train_step(*args):
+            outputs = self._grad_fn(*args)
+            for view, grad in zip(views, outputs[1:]):
+                if view.ndim >= 2:
+                    rows = np.flatnonzero(np.any(grad.reshape([len(grad), -1]) != 0, axis=1))
+                    if len(rows) < len(grad):
+                        view[rows] -= learning_rate * grad[rows]
+                        continue
+                view -= learning_rate * grad
+            return outputs[0]
+
+        try:
+            np.random.seed(seed)
+            monitor = _HogwildWorkerMonitor(rank, step_counts, loss_sums, stop)
+            # the position of the trainer's data flow inherited through fork does not belong to this worker.
+            G.current_session().memo[_DATA_STATE_KEY] = None
+            run_steps(G, train_step, flow, monitor=monitor, batch_size=self.batch_size, max_steps=sys.maxsize)
+        except Exception:
+            errors.put((rank, traceback.format_exc()))
+            stop.set()
+
+    def _run_steps(self, monitors, max_steps, summary_writer):
+        ctx = get_fork_context()
+        views = self._make_shared_params(ctx)
+        step_counts = np.ndarray((self.workers,), dtype=np.int64, buffer=ctx.RawArray('b', 8 * self.workers))
+        loss_sums = np.ndarray((self.workers,), dtype=np.float64, buffer=ctx.RawArray('d', self.workers))
+        stop = ctx.Event()
+        errors = ctx.Queue()
+
+        # each worker iterates through its own shard, or its own copy of the data flow.
+        if self._shard_flows is not None and self._train_flow is self._shard_flows[0]:
+            worker_flows = self._shard_flows
+        else:
+            worker_flows = [self._train_flow] * self.workers
+        num_examples = sum(f.num_examples for f in worker_flows)
+        processes = []
+        for rank, flow in enumerate(worker_flows):
+            seed = np.random.randint(0, 2147462579)
+            p = ctx.Process(target=self._worker_main,
+                            args=(rank, flow, seed, views, step_counts, loss_sums, stop, errors))
+            p.daemon = True
+            p.start()
+            processes.append(p)
+
+        # the workers count their steps from zero, while the coordinator restores the global step counter from
+        # the session memo, so that the monitors would continue from where the last training stopped.
+        memo = G.current_session().memo
+        initial_step = memo.get(_GLOBAL_STEP_KEY, 0)
+        monitor = MonitorChain(monitors)
+        steps_in_epoch = max(num_examples // self.batch_size, 1)
+        monitor.start_training(G, self.batch_size, steps_in_epoch, max_steps, initial_step=initial_step)
+        try:
+            step = initial_step
+            loss_sum = 0.
+            epoch_loss = 0.
+            epoch_steps = 0
+            while step <= max_steps and not monitor.is_inducing_stopping:
+                if stop.is_set() or not all(p.is_alive() for p in processes):
+                    _raise_worker_error(errors, list(enumerate(processes)))
+                total_steps = initial_step + int(np.sum(step_counts))
+                total_loss = float(np.sum(loss_sums))
+                if total_steps <= step:
+                    time.sleep(self.poll_interval)
+                    continue
+
+                # report the new steps to the monitors, with the average loss of these steps.
+                loss = (total_loss - loss_sum) / (total_steps - step)
+                loss_sum = total_loss
+                while step < total_steps and step <= max_steps and not monitor.is_inducing_stopping:
+                    if epoch_steps == 0:
+                        monitor.start_epoch(step // steps_in_epoch)
+                    monitor.start_step(step)
+                    # record the progress before the monitors, so that a checkpoint would resume at the next step.
+                    memo[_GLOBAL_STEP_KEY] = step + 1
+                    monitor.end_step(step, loss)
+                    epoch_loss += loss
+                    epoch_steps += 1
+                    step += 1
+                    if step % steps_in_epoch == 0:
+                        monitor.end_epoch(step // steps_in_epoch - 1, epoch_loss / epoch_steps)
+                        epoch_loss = 0.
+                        epoch_steps = 0
+            if epoch_steps > 0:
+                monitor.end_epoch(step // steps_in_epoch, epoch_loss / epoch_steps)
+        finally:
+            stop.set()
+            for p in processes:
+                p.join()
+            # move the parameters out of the shared memory block.
+            for param, view in zip(ensure_list_sealed(self._train_params), views):
+                param.set_value(np.copy(view), borrow=True)
+        monitor.end_training()
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+from timeit import default_timer
+
+import numpy as np
+
 from ipwxlearn.training.dataflow import DataFlow, TrainingBatchDataFlow
 from ipwxlearn.utils.misc import maybe_iterable_to_list
 from .monitors import Monitor, MonitorChain
@@ -9,6 +13,12 @@ __all__ = [
     'run_steps'
 ]
 
+# key of the global step counter in the session memo, which is also used by the trainers running their own loops.
+_GLOBAL_STEP_KEY = __name__ + '.run_steps:global_step'
+
+# key of the training data flow position in the session memo, which should not be restored by forked workers.
+_DATA_STATE_KEY = __name__ + '.run_steps:data_state'
+
 
 def _check_monitor(monitor):
     if monitor is None:
@@ -19,7 +29,56 @@ def _check_monitor(monitor):
     return monitor
 
 
-def run_steps(G, train_fn, train_data, monitor=None, batch_size=32, max_steps=1000, shuffle=True, summary_writer=None):
+def _get_data_fingerprint(flow, batch_size):
+    """Get the fingerprint of a training data flow, to check whether or not a saved position belongs to it."""
+    return type(flow).__name__, flow.num_examples, flow.array_count, batch_size
+
+
+def _stack_batches(batches, steps_per_call, get_limit):
+    """
+    Stack every :param:`steps_per_call` mini-batches into arrays of shape (K, batch_size, ...).
+
+    The last group of an epoch might contain less mini-batches, and each group would contain no more than
+    `get_limit()` mini-batches.  The mini-batches are copied as soon as they are yielded, since the data
+    flows might reuse their buffers.
+    """
+    it = iter(batches)
+    while True:
+        limit = min(steps_per_call, get_limit())
+        bufs = None
+        count = 0
+        for args in it:
+            if bufs is None:
+                bufs = [np.empty((limit,) + np.shape(a), dtype=np.asarray(a).dtype) for a in args]
+            elif any(np.shape(a) != b.shape[1:] for a, b in zip(args, bufs)):
+                raise ValueError('Mini-batches of different shapes cannot be stacked.')
+            for a, b in zip(args, bufs):
+                b[count] = a
+            count += 1
+            if count >= limit:
+                break
+        if not count:
+            break
+        yield tuple(b[: count] for b in bufs)
+        if count < limit:
+            break
+
+
+def _profile_batches(batches, monitor, get_step):
+    """Report the time spent on fetching each mini-batch (or group of mini-batches) as the 'data' phase."""
+    it = iter(batches)
+    while True:
+        start_time = default_timer()
+        try:
+            args = next(it)
+        except StopIteration:
+            break
+        monitor.end_phase(get_step(), 'data', start_time, default_timer())
+        yield args
+
+
+def run_steps(G, train_fn, train_data, monitor=None, batch_size=32, max_steps=1000, shuffle=True, summary_writer=None,
+              steps_per_call=1, loss_accumulator=None):
     """
     Run determined steps to train with :param:`train_fn` and :param:`train_data`.
 
@@ -28,6 +87,9 @@ def run_steps(G, train_fn, train_data, monitor=None, batch_size=32, max_steps=10
                      This function should either return a scalar which indicates the training loss,
                      or return a tuple which contains not only the training loss, but also the summary object
                      for the loss.
+                     If :param:`steps_per_call` > 1, this function should accept the arrays of K mini-batches
+                     stacked into shape (K, batch_size, ...), perform K training steps, and return the K losses
+                     (or a tuple whose first element is the K losses).  See `G.make_multi_step_function`.
     :param train_data: Numpy array, a list of numpy arrays, or a DataFlow object as the training data.
     :param monitor: Monitor or a list of monitors, to guard the training process.
     :param batch_size: Mini-batch size of training.
@@ -35,6 +97,17 @@ def run_steps(G, train_fn, train_data, monitor=None, batch_size=32, max_steps=10
                       take less steps than this number.
     :param shuffle: Whether or not to shuffle the data after each full-pass?
     :param summary_writer: If specified, will try to output the summary of training loss.
+    :param steps_per_call: Number of training steps performed by each call to :param:`train_fn`. (Default 1)
+                           The monitors would still be notified of every step, after :param:`train_fn` returns.
+                           The mini-batches must have the same shape in this case.
+    :param loss_accumulator: If specified, the training losses are accumulated on the device by this
+                             :class:`LossAccumulator`, via the updates of :param:`train_fn`, and the outputs of
+                             :param:`train_fn` are ignored.  The monitors would receive None as the loss of each
+                             step, and the summary of training loss would not be written.
+
+    If any of the monitors is profiling (see :class:`~ipwxlearn.training.ProfilerMonitor`), the time spent on
+    fetching the mini-batches, calling :param:`train_fn` and writing the summaries of training loss would be
+    reported to the monitors, as the phases 'data', 'train' and 'loss_summary'.
     """
     # check the arguments.
     monitor = _check_monitor(monitor)
@@ -44,13 +117,27 @@ def run_steps(G, train_fn, train_data, monitor=None, batch_size=32, max_steps=10
     if num_examples < batch_size:
         raise ValueError('Too few data such that no training step would be performed.')
 
-    # restore the global step counter from the session.
+    # restore the global step counter, the epoch counter and the data flow position from the session.
     ns = __name__ + '.run_steps:'
-    step_key = ns + 'global_step'
-    step = G.current_session().memo.get(step_key, 0)
+    step_key = _GLOBAL_STEP_KEY
+    epoch_key = ns + 'epoch'
+    data_state_key = _DATA_STATE_KEY
+    memo = G.current_session().memo
+    step = memo.get(step_key, 0)
+    resumable = train_data.get_state() is not None
+    fingerprint = _get_data_fingerprint(train_data, batch_size) if resumable else None
+    saved = memo.get(data_state_key, None)
+    if resumable and isinstance(saved, dict) and saved.get('flow') == fingerprint:
+        train_data.set_state(saved['state'])
+    elif saved is not None:
+        # the saved position belongs to another data flow, thus we start a fresh epoch instead.
+        memo[data_state_key] = None
 
     # prepare for the training.
+    if loss_accumulator is not None:
+        monitor.set_loss_accumulator(loss_accumulator)
     monitor.start_training(G, batch_size, num_examples // batch_size, max_steps, initial_step=step)
+    profiling = monitor.is_profiling
 
     # in case that `train_fn` returns only the loss value, we need to compose summary by ourself.
     from ipwxlearn import glue
@@ -58,36 +145,75 @@ def run_steps(G, train_fn, train_data, monitor=None, batch_size=32, max_steps=10
     summary_op = G.summary.scalar_summary('training_loss', loss_var)
 
     # the out loop indicates the pass of data (or to say, the epochs)
-    epoch = 0
+    epoch = memo.get(epoch_key, 0)
     while True:
+        memo[epoch_key] = epoch
         monitor.start_epoch(epoch)
         n_batches = 0
         total_loss = 0
-
-        # the inner loop indicates the mini-batches of data.
-        for args in train_data.iter_epoch():
-            monitor.start_step(step)
+        if loss_accumulator is not None:
+            loss_mark = loss_accumulator.mark()
+
+        # the inner loop indicates the mini-batches of data, or the groups of mini-batches.
+        batches = train_data.iter_epoch()
+        if steps_per_call > 1:
+            batches = _stack_batches(batches, steps_per_call, lambda: max_steps + 1 - step)
+        if profiling:
+            batches = _profile_batches(batches, monitor, lambda: step)
+        for args in batches:
+            if steps_per_call <= 1:
+                monitor.start_step(step)
+            if profiling:
+                start_time = default_timer()
             result = train_fn(*args)
-            if isinstance(result, (tuple, list)):
-                loss, summary = result[0], result[1]
+            if profiling:
+                monitor.end_phase(step, 'train', start_time, default_timer())
+
+            if loss_accumulator is not None:
+                results = [(None, None)] * (len(args[0]) if steps_per_call > 1 else 1)
+            elif steps_per_call > 1:
+                losses = result[0] if isinstance(result, (tuple, list)) else result
+                results = [(loss, summary_op) for loss in np.asarray(losses).reshape([-1])]
+            elif isinstance(result, (tuple, list)):
+                results = [(result[0], result[1])]
             else:
-                loss = result
-                summary = summary_op
-            monitor.end_step(step, loss)
-
-            # try to add the summary of training loss
-            if summary is not None and summary_writer is not None:
-                summary_writer.write(summary, global_step=step, givens={loss_var: loss})
-
-            n_batches += 1
-            total_loss += loss
-            step += 1
-            G.current_session().memo[step_key] = step
+                results = [(result, summary_op)]
+
+            # record the progress before the monitors, so that a checkpoint saved by the monitors
+            # would resume at the next step and the next mini-batch.
+            memo[step_key] = step + len(results)
+            if resumable:
+                data_state = train_data.get_state()
+                memo[data_state_key] = {'flow': fingerprint, 'state': data_state}
+                # the data flow would start the next epoch when resumed from the end of this epoch.
+                if train_data.is_epoch_completed(data_state):
+                    memo[epoch_key] = epoch + 1
+
+            for loss, summary in results:
+                if steps_per_call > 1:
+                    monitor.start_step(step)
+                monitor.end_step(step, loss)
+
+                # try to add the summary of training loss
+                if summary is not None and summary_writer is not None:
+                    if profiling:
+                        start_time = default_timer()
+                    summary_writer.write(summary, global_step=step, givens={loss_var: loss})
+                    if profiling:
+                        monitor.end_phase(step, 'loss_summary', start_time, default_timer())
+
+                n_batches += 1
+                if loss is not None:
+                    total_loss += loss
+                step += 1
 
             if step > max_steps or monitor.is_inducing_stopping:
                 break
 
-        monitor.end_epoch(epoch, float(total_loss) / n_batches)
+        if loss_accumulator is not None:
+            total_loss = loss_accumulator.average_since(loss_mark)[0] or 0.
+            n_batches = 1
+        monitor.end_epoch(epoch, float(total_loss) / max(n_batches, 1))
         epoch += 1
 
         if step > max_steps or monitor.is_inducing_stopping:
@@ -95,3 +221,8 @@ def run_steps(G, train_fn, train_data, monitor=None, batch_size=32, max_steps=10
 
     # complete the training.
     monitor.end_training()
+
+    # forget the data flow position, so that only a session restored from a checkpoint would resume from it,
+    # while the next call to this method would start a fresh epoch.
+    memo[data_state_key] = None
+    memo[epoch_key] = epoch
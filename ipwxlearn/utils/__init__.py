@@ -1,3 +1,3 @@
 # -*- coding: utf-8 -*-
 
-from . import concurrent, io, misc, predicting, tempdir
+from . import arrayfile, concurrent, io, misc, predicting, tempdir
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+import six
+
+from .misc import silent_try
+
+__all__ = [
+    'ArrayFile',
+    'is_array_file',
+    'save_array_file',
+]
+
+#: Magic bytes at the beginning of an array file.
+ARRAY_FILE_MAGIC = b'IPWXARR\x01'
+
+#: Alignment of the array payloads in an array file, in bytes.
+ARRAY_FILE_ALIGNMENT = 64
+
+# The magic bytes are followed by the length of the JSON index, as a little-endian unsigned 64-bit integer.
+_INDEX_LENGTH = struct.Struct('<Q')
+
+
+def _align(offset):
+    return (offset + ARRAY_FILE_ALIGNMENT - 1) // ARRAY_FILE_ALIGNMENT * ARRAY_FILE_ALIGNMENT
+
+
+def _get_payload_start(index_length):
+    return _align(len(ARRAY_FILE_MAGIC) + _INDEX_LENGTH.size + index_length)
+
+
+def _as_contiguous(a):
+    # `np.ascontiguousarray` would turn 0-d arrays into 1-d ones.
+    a = np.asarray(a)
+    return a if a.flags.c_contiguous else np.ascontiguousarray(a)
+
+
+def _crc32(a):
+    return zlib.crc32(_as_contiguous(a).data) & 0xffffffff
+
+
+def is_array_file(path_or_file):
+    """
+    Check whether or not a file is an array file.
+
+    :param path_or_file: Path of the file, or a seekable file object.  The position of the file object
+                         would be restored after checking.
+    """
+    if isinstance(path_or_file, six.string_types):
+        with open(path_or_file, 'rb') as f:
+            return is_array_file(f)
+    position = path_or_file.tell()
+    try:
+        return path_or_file.read(len(ARRAY_FILE_MAGIC)) == ARRAY_FILE_MAGIC
+    finally:
+        path_or_file.seek(position)
+
+
+def save_array_file(path_or_file, arrays, crc=True):
+    """
+    Save numpy arrays into an array file.
+
+    An array file starts with an index of the arrays, which maps the names of the arrays to their dtypes,
+    shapes, and the offsets of their payloads.  The payloads are stored uncompressed, each aligned to
+    :data:`ARRAY_FILE_ALIGNMENT` bytes, so that they could be memory-mapped by :class:`ArrayFile`.
+
+    When saving to a path, the arrays would be written into a temporary file, which then replaces the
+    target file, so that the arrays memory-mapped from the previous file would still be valid.
+
+    :param path_or_file: Path of the file, or a file object.
+    :param arrays: Dict from names to numpy arrays.
+    :param crc: Whether or not to store the CRC32 checksum of each array? (Default True)
+    """
+    if isinstance(path_or_file, six.string_types):
+        tmp_path = ''.join((path_or_file, '.tmp'))
+        try:
+            with open(tmp_path, 'wb') as f:
+                save_array_file(f, arrays, crc=crc)
+            os.rename(tmp_path, path_or_file)
+        except:
+            silent_try(os.remove, tmp_path)
+            raise
+        return
+
+    # compose the index.  The offsets are relative to the beginning of the payloads, which is the first
+    # aligned position after the index.
+    arrays = [(name, _as_contiguous(a)) for name, a in sorted(six.iteritems(arrays))]
+    entries = []
+    offset = 0
+    for name, a in arrays:
+        if a.dtype.hasobject:
+            raise TypeError('Array %r of dtype %r cannot be saved into an array file.' % (name, a.dtype))
+        offset = _align(offset)
+        entries.append({
+            'name': name,
+            'dtype': a.dtype.str,
+            'shape': list(a.shape),
+            'offset': offset,
+            'crc32': _crc32(a) if crc else None,
+        })
+        offset += a.nbytes
+    index = json.dumps({'arrays': entries}).encode('utf-8')
+
+    path_or_file.write(ARRAY_FILE_MAGIC)
+    path_or_file.write(_INDEX_LENGTH.pack(len(index)))
+    path_or_file.write(index)
+    position = 0
+    start = _get_payload_start(len(index))
+    path_or_file.write(b'\0' * (start - len(ARRAY_FILE_MAGIC) - _INDEX_LENGTH.size - len(index)))
+    for e, (_, a) in zip(entries, arrays):
+        path_or_file.write(b'\0' * (e['offset'] - position))
+        path_or_file.write(a.data)
+        position = e['offset'] + a.nbytes
+
+
+class ArrayFile(object):
+    """
+    Reader of an array file.
+
+    The arrays read from a file path are read-only views of the memory-mapped file, thus no data would be read
+    until the arrays are accessed, and no copy would be made.  The arrays read from a file object would be read
+    into memory on request.
+
+    :param path_or_file: Path of the file, or a seekable file object.
+    """
+
+    def __init__(self, path_or_file):
+        if isinstance(path_or_file, six.string_types):
+            with open(path_or_file, 'rb') as f:
+                self._read_index(f)
+                self._file = None
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._read_index(path_or_file)
+            self._file = path_or_file
+            self._mmap = None
+
+    def _read_index(self, f):
+        base = f.tell()
+        if f.read(len(ARRAY_FILE_MAGIC)) != ARRAY_FILE_MAGIC:
+            raise IOError('Not an array file.')
+        index_length, = _INDEX_LENGTH.unpack(f.read(_INDEX_LENGTH.size))
+        index = json.loads(f.read(index_length).decode('utf-8'))
+        start = base + _get_payload_start(index_length)
+        self._entries = {}
+        for e in index['arrays']:
+            e['dtype'] = np.dtype(str(e['dtype']))
+            e['shape'] = tuple(e['shape'])
+            e['offset'] += start
+            self._entries[e['name']] = e
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(sorted(self._entries))
+
+    def keys(self):
+        """Get the sorted names of the arrays."""
+        return list(self)
+
+    def get_info(self, name):
+        """Get the (dtype, shape) of specified array."""
+        e = self._entries[name]
+        return e['dtype'], e['shape']
+
+    def get(self, name, verify=False):
+        """
+        Get the specified array.
+
+        :param name: Name of the array.
+        :param verify: Whether or not to verify the CRC32 checksum of the array, if it has been stored?
+                       This would read the whole array.  (Default False)
+        :raise IOError: If the checksum does not match.
+        """
+        e = self._entries[name]
+        count = int(np.prod(e['shape']))
+        if self._mmap is not None:
+            a = np.frombuffer(self._mmap, dtype=e['dtype'], count=count, offset=e['offset'])
+        else:
+            self._file.seek(e['offset'])
+            a = np.empty([count], dtype=e['dtype'])
+            if self._file.readinto(a.data) != a.nbytes:
+                raise IOError('Array %r is truncated.' % name)
+        a = a.reshape(e['shape'])
+        if verify and e['crc32'] is not None and _crc32(a) != e['crc32']:
+            raise IOError('Checksum of array %r does not match.' % name)
+        return a
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def read(self, names=None, verify=False):
+        """
+        Read the specified arrays.
+
+        :param names: Names of the arrays.  The names absent from this file would be ignored.
+                      If not specified, will read all the arrays.
+        :param verify: Whether or not to verify the CRC32 checksums?  (Default False)
+        :return: Dict from names to arrays.
+        """
+        if names is None:
+            names = self._entries
+        return {n: self.get(n, verify=verify) for n in names if n in self._entries}
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import multiprocessing
 import threading
+import time
+
+import six
 
 
 class ThreadLocalStack(threading.local):
@@ -29,3 +33,62 @@ class ThreadLocalStack(threading.local):
     @property
     def empty(self):
         return not self._stack
+
+
+def get_fork_context():
+    """Get the multiprocessing context that forks the child processes."""
+    if six.PY2:
+        return multiprocessing
+    return multiprocessing.get_context('fork')
+
+
+class ProcessBarrier(object):
+    """
+    Barrier shared by a fixed number of processes, which could be aborted by an event.
+
+    The processes spin for a short while before sleeping, since the barrier is intended for synchronizing
+    the processes at every training step, where the waiting time is usually short.  The barrier must be
+    constructed before forking the processes.
+
+    :param ctx: The multiprocessing context.
+    :param parties: Number of processes that should wait at the barrier.
+    :param spin_time: Seconds to spin before sleeping. (Default 0.001)
+    :param poll_interval: Seconds to sleep before checking again, after spinning. (Default 0.0001)
+    """
+
+    def __init__(self, ctx, parties, spin_time=0.001, poll_interval=0.0001):
+        self.parties = parties
+        self.spin_time = spin_time
+        self.poll_interval = poll_interval
+        self._lock = ctx.Lock()
+        self._count = ctx.RawValue('i', 0)
+        self._generation = ctx.RawValue('i', 0)
+
+    def wait(self, abort=None, processes=None):
+        """
+        Wait until all the processes have reached the barrier.
+
+        :param abort: Optional multiprocessing event.  If it is set, the waiting would be interrupted.
+        :param processes: Optional list of child processes.  If any of them has exited, the waiting would be
+                          interrupted, since it might have been killed without setting :param:`abort`.
+        :return: True if all the processes have reached the barrier, or False if interrupted.
+        """
+        with self._lock:
+            generation = self._generation.value
+            self._count.value += 1
+            if self._count.value >= self.parties:
+                self._count.value = 0
+                self._generation.value = generation + 1
+                return True
+        spin_until = time.time() + self.spin_time
+        while self._generation.value == generation:
+            if time.time() < spin_until:
+                time.sleep(0)
+            else:
+                if abort is not None and abort.is_set():
+                    return False
+                if processes is not None and not all(p.is_alive() for p in processes):
+                    # the process might have passed the barrier right before exiting.
+                    return self._generation.value != generation
+                time.sleep(self.poll_interval)
+        return True
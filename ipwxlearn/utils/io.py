@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import collections
 import gzip
 import io
+import multiprocessing
 import os
+import struct
+import zlib
+from multiprocessing.pool import ThreadPool
 
 import six
 
@@ -17,6 +22,14 @@ else:
 __all__ = [
     'file_redirected',
     'file_muted',
+    'Codec',
+    'NoneCodec',
+    'GzipCodec',
+    'LzmaCodec',
+    'ZlibCodec',
+    'register_codec',
+    'get_codec',
+    'is_compressed_file',
     'load_object_compressed',
     'save_object_compressed',
     'write_string',
@@ -58,25 +71,366 @@ def file_muted(file):
             yield
 
 
-def load_object_compressed(path):
+#: Magic bytes at the beginning of a file saved by :func:`save_object_compressed`.
+COMPRESSED_FILE_MAGIC = b'IPWXOBJ\x01'
+
+#: Default codec of :func:`save_object_compressed`.
+DEFAULT_CODEC = 'zlib'
+
+# Files saved by earlier versions are plain gzip files, starting with these bytes.
+_GZIP_MAGIC = b'\x1f\x8b'
+
+# The magic bytes are followed by the length of the codec name, and then the codec name.
+_CODEC_NAME_LENGTH = struct.Struct('<B')
+
+# Each chunk of :class:`ZlibCodec` is preceded by its compressed length, and the stream ends with a zero length.
+_CHUNK_LENGTH = struct.Struct('<I')
+
+#: Dict from codec names to codec classes.
+_codecs = {}
+
+
+class _FileView(io.RawIOBase):
+    """Unbuffered view of a binary file, which would not close the file when closed."""
+
+    def __init__(self, file):
+        self._file = file
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._file.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def write(self, b):
+        self._file.write(b)
+        return len(b)
+
+
+class Codec(object):
+    """
+    Base class for the compression codecs of :func:`save_object_compressed`.
+
+    A codec wraps a binary file into a writable stream which compresses the written data, or into a readable
+    stream which decompresses the data.  Closing these streams must not close the wrapped file.
+
+    The name of the codec is recorded in the header of the saved files, so that the files could be loaded
+    without knowing the codec in advance.  Thus the codec classes must be registered by :func:`register_codec`.
+
+    :param level: Compression level of this codec.
+    """
+
+    #: Name of this codec.
+    name = None
+
+    def __init__(self, level=None):
+        self.level = level
+
+    def __repr__(self):
+        return '%s(level=%r)' % (self.__class__.__name__, self.level)
+
+    def open_writer(self, file):
+        """Open a writable stream on binary :param:`file`, which compresses the written data."""
+        raise NotImplementedError()
+
+    def open_reader(self, file):
+        """Open a readable stream on binary :param:`file`, which decompresses the data."""
+        raise NotImplementedError()
+
+
+def register_codec(codec_class):
+    """
+    Register a codec class by its name.
+
+    This method could be used as a class decorator.
+    """
+    _codecs[codec_class.name] = codec_class
+    return codec_class
+
+
+def get_codec(codec):
+    """
+    Get the codec object.
+
+    :param codec: A codec object, or the name of a registered codec.  The name might be followed by
+                  the compression level, e.g., "gzip:9".
+    :rtype: :class:`Codec`
+    """
+    if isinstance(codec, Codec):
+        return codec
+    name, _, level = codec.partition(':')
+    if name not in _codecs:
+        raise ValueError('Unknown codec %r.' % name)
+    if level:
+        return _codecs[name](int(level))
+    return _codecs[name]()
+
+
+@register_codec
+class NoneCodec(Codec):
+    """Codec which stores the data uncompressed."""
+
+    name = 'none'
+
+    def open_writer(self, file):
+        return io.BufferedWriter(_FileView(file))
+
+    def open_reader(self, file):
+        return io.BufferedReader(_FileView(file))
+
+
+@register_codec
+class GzipCodec(Codec):
+    """
+    Codec which compresses the data in gzip format.
+
+    :param level: Compression level from 1 to 9.  (Default 6)
+    """
+
+    name = 'gzip'
+
+    def __init__(self, level=6):
+        super(GzipCodec, self).__init__(level)
+
+    def open_writer(self, file):
+        return gzip.GzipFile(fileobj=file, mode='wb', compresslevel=self.level)
+
+    def open_reader(self, file):
+        return gzip.GzipFile(fileobj=file, mode='rb')
+
+
+@register_codec
+class LzmaCodec(Codec):
+    """
+    Codec which compresses the data in xz format, with the "lzma" module from the standard library.
+
+    :param level: Compression preset from 0 to 9.  (Default 6)
+    """
+
+    name = 'lzma'
+
+    def __init__(self, level=6):
+        super(LzmaCodec, self).__init__(level)
+
+    def open_writer(self, file):
+        import lzma
+        return lzma.LZMAFile(file, mode='wb', preset=self.level)
+
+    def open_reader(self, file):
+        import lzma
+        return lzma.LZMAFile(file, mode='rb')
+
+
+class _ChunkedZlibWriter(io.RawIOBase):
+
+    def __init__(self, file, level, chunk_size, threads):
+        self._file = file
+        self._level = level
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._pool = ThreadPool(threads) if threads > 1 else None
+        self._max_pending = threads * 2
+        self._pending = collections.deque()
+
+    def writable(self):
+        return True
+
+    def _write_chunk(self, data):
+        self._file.write(_CHUNK_LENGTH.pack(len(data)))
+        self._file.write(data)
+
+    def _submit(self, chunk):
+        if self._pool is None:
+            self._write_chunk(zlib.compress(chunk, self._level))
+        else:
+            # zlib releases the GIL during compression, so the chunks are compressed in parallel.
+            self._pending.append(self._pool.apply_async(zlib.compress, (chunk, self._level)))
+            while len(self._pending) > self._max_pending:
+                self._write_chunk(self._pending.popleft().get())
+
+    def write(self, b):
+        size = len(self._buffer)
+        self._buffer += b
+        written = len(self._buffer) - size
+        start = 0
+        while len(self._buffer) - start >= self._chunk_size:
+            self._submit(bytes(self._buffer[start: start + self._chunk_size]))
+            start += self._chunk_size
+        if start:
+            del self._buffer[: start]
+        return written
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            while self._pending:
+                self._write_chunk(self._pending.popleft().get())
+            self._file.write(_CHUNK_LENGTH.pack(0))
+        finally:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+            super(_ChunkedZlibWriter, self).close()
+
+
+class _ChunkedZlibReader(io.RawIOBase):
+
+    def __init__(self, file, threads):
+        self._file = file
+        self._pool = ThreadPool(threads) if threads > 1 else None
+        self._max_pending = threads * 2
+        self._pending = collections.deque()
+        self._eof = False
+        self._chunk = b''
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def _read_chunk(self):
+        size, = _CHUNK_LENGTH.unpack(self._file.read(_CHUNK_LENGTH.size))
+        if not size:
+            self._eof = True
+            return None
+        data = self._file.read(size)
+        if len(data) != size:
+            raise IOError('Compressed chunk is truncated.')
+        return data
+
+    def _next_chunk(self):
+        if self._pool is None:
+            data = None if self._eof else self._read_chunk()
+            return zlib.decompress(data) if data is not None else None
+        while not self._eof and len(self._pending) < self._max_pending:
+            data = self._read_chunk()
+            if data is not None:
+                self._pending.append(self._pool.apply_async(zlib.decompress, (data,)))
+        return self._pending.popleft().get() if self._pending else None
+
+    def readinto(self, b):
+        while self._offset >= len(self._chunk):
+            chunk = self._next_chunk()
+            if chunk is None:
+                return 0
+            self._chunk, self._offset = chunk, 0
+        size = min(len(b), len(self._chunk) - self._offset)
+        b[: size] = memoryview(self._chunk)[self._offset: self._offset + size]
+        self._offset += size
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+        finally:
+            super(_ChunkedZlibReader, self).close()
+
+
+@register_codec
+class ZlibCodec(Codec):
+    """
+    Codec which splits the data into independent chunks, and compresses the chunks with zlib in parallel.
+
+    :param level: Compression level from 1 to 9.  (Default 6)
+    :param chunk_size: Number of uncompressed bytes in each chunk.  (Default 4MB)
+    :param threads: Number of threads to compress or decompress the chunks.
+                    If not specified, will use the number of CPU cores.
+    """
+
+    name = 'zlib'
+
+    def __init__(self, level=6, chunk_size=4 * 1024 * 1024, threads=None):
+        super(ZlibCodec, self).__init__(level)
+        self.chunk_size = chunk_size
+        self.threads = threads or multiprocessing.cpu_count()
+
+    def __repr__(self):
+        return 'ZlibCodec(level=%r, threads=%r)' % (self.level, self.threads)
+
+    def open_writer(self, file):
+        return _ChunkedZlibWriter(file, self.level, self.chunk_size, self.threads)
+
+    def open_reader(self, file):
+        return io.BufferedReader(_ChunkedZlibReader(file, self.threads), buffer_size=self.chunk_size)
+
+
+def is_compressed_file(path_or_file):
+    """
+    Check whether or not a file is saved by :func:`save_object_compressed`, including the gzip files
+    saved by earlier versions.
+
+    :param path_or_file: Path of the file, or a seekable file object.  The position of the file object
+                         would be restored after checking.
+    """
+    if isinstance(path_or_file, six.string_types):
+        with open(path_or_file, 'rb') as f:
+            return is_compressed_file(f)
+    position = path_or_file.tell()
+    try:
+        magic = path_or_file.read(len(COMPRESSED_FILE_MAGIC))
+        return magic == COMPRESSED_FILE_MAGIC or magic[: len(_GZIP_MAGIC)] == _GZIP_MAGIC
+    finally:
+        path_or_file.seek(position)
+
+
+def load_object_compressed(path_or_file):
     """
     Load object from compressed file.
 
-    :param path: Path to the file.
+    The codec is detected from the header of the file.  Plain gzip files saved by earlier versions
+    could also be loaded.
+
+    :param path_or_file: Path to the file, or a seekable file object.
     :return: Whatever object loaded from the file.
     """
-    with gzip.open(path, mode='rb') as f:
+    if isinstance(path_or_file, six.string_types):
+        with open(path_or_file, 'rb') as f:
+            return load_object_compressed(f)
+
+    position = path_or_file.tell()
+    magic = path_or_file.read(len(COMPRESSED_FILE_MAGIC))
+    if magic == COMPRESSED_FILE_MAGIC:
+        name_length, = _CODEC_NAME_LENGTH.unpack(path_or_file.read(_CODEC_NAME_LENGTH.size))
+        codec = get_codec(path_or_file.read(name_length).decode('ascii'))
+    elif magic[: len(_GZIP_MAGIC)] == _GZIP_MAGIC:
+        path_or_file.seek(position)
+        codec = GzipCodec()
+    else:
+        raise IOError('Not a compressed file.')
+    with codec.open_reader(path_or_file) as f:
         return pkl.load(f)
 
 
-def save_object_compressed(path, obj):
+def save_object_compressed(path_or_file, obj, codec=None):
     """
     Save object to compressed file.
 
-    :param path: Path to the file.
+    :param path_or_file: Path to the file, or a file object.
     :param obj: Object to be saved.
+    :param codec: Codec object or name, see :func:`get_codec`.  If not specified, use :data:`DEFAULT_CODEC`.
     """
-    with gzip.open(path, mode='wb', compresslevel=9) as f:
+    if isinstance(path_or_file, six.string_types):
+        with open(path_or_file, 'wb') as f:
+            return save_object_compressed(f, obj, codec=codec)
+
+    codec = get_codec(codec or DEFAULT_CODEC)
+    name = codec.name.encode('ascii')
+    path_or_file.write(COMPRESSED_FILE_MAGIC)
+    path_or_file.write(_CODEC_NAME_LENGTH.pack(len(name)))
+    path_or_file.write(name)
+    with codec.open_writer(path_or_file) as f:
         pkl.dump(obj, f, protocol=pkl.HIGHEST_PROTOCOL)
 
 